@@ -1,5 +1,8 @@
 from django.contrib import admin
+from django.utils import timezone
 from django.utils.html import format_html
+from apps.products.popularity import record_status_change
+from .cache import invalidate_user_order_stats
 from .models import City, Order
 
 
@@ -75,14 +78,30 @@ class OrderAdmin(admin.ModelAdmin):
     
     actions = ['mark_as_completed', 'mark_as_cancelled']
     
+    def _record_popularity(self, queryset, new_status):
+        """update() ne declenche pas post_save : reporter le changement de
+        statut sur le score de popularite des produits concernes"""
+        rows = queryset.exclude(status=new_status).values_list('product_id', 'quantity', 'status')
+        for product_id, quantity, old_status in rows:
+            record_status_change(product_id, quantity, old_status, new_status)
+    
     def mark_as_completed(self, request, queryset):
         """Marquer les commandes comme complétées"""
-        updated = queryset.update(status='completed')
+        user_ids = set(queryset.values_list('user_id', flat=True))
+        self._record_popularity(queryset, 'completed')
+        # updated_at explicite : update() ignore auto_now, or les agregats de
+        # ventes reperent les commandes modifiees par ce champ
+        updated = queryset.update(status='completed', updated_at=timezone.now())
+        # update() ne declenche pas post_save : invalider les stats a la main
+        invalidate_user_order_stats(*user_ids)
         self.message_user(request, f'{updated} commande(s) marquée(s) comme complétée(s).')
     mark_as_completed.short_description = "Marquer comme complétée"
     
     def mark_as_cancelled(self, request, queryset):
         """Marquer les commandes comme annulées"""
-        updated = queryset.update(status='cancelled')
+        user_ids = set(queryset.values_list('user_id', flat=True))
+        self._record_popularity(queryset, 'cancelled')
+        updated = queryset.update(status='cancelled', updated_at=timezone.now())
+        invalidate_user_order_stats(*user_ids)
         self.message_user(request, f'{updated} commande(s) annulée(s).')
     mark_as_cancelled.short_description = "Marquer comme annulée"
\ No newline at end of file
@@ -0,0 +1,51 @@
+"""Per-user order statistics, computed in one aggregate query and cached.
+
+Both /api/orders/stats/ and /api/users/stats/ read the same numbers, so they
+share one cache entry per user. Any Order write for that user (creation,
+status change, deletion) simply drops the entry — see signals.py — and the
+next read recomputes it with a single conditional-aggregation query served
+by the (user, status) index.
+"""
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+
+TTL_USER_STATS = 60 * 60  # 1 h : filet de securite, l'invalidation est explicite
+
+
+def user_stats_key(user_id) -> str:
+    return f'orders:stats:user:{user_id}'
+
+
+def _compute_user_order_stats(user_id) -> dict:
+    from .models import Order
+
+    line_total = ExpressionWrapper(
+        F('product_price') * F('quantity'),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+    row = Order.objects.filter(user_id=user_id).aggregate(
+        total_orders=Count('id'),
+        redirected=Count('id', filter=Q(status='redirected')),
+        completed=Count('id', filter=Q(status='completed')),
+        cancelled=Count('id', filter=Q(status='cancelled')),
+        total_spent=Sum(line_total, filter=~Q(status='cancelled')),
+    )
+    row['total_spent'] = row['total_spent'] or Decimal('0')
+    return row
+
+
+def get_user_order_stats(user_id) -> dict:
+    key = user_stats_key(user_id)
+    stats = cache.get(key)
+    if stats is None:
+        stats = _compute_user_order_stats(user_id)
+        cache.set(key, stats, TTL_USER_STATS)
+    return stats
+
+
+def invalidate_user_order_stats(*user_ids) -> None:
+    keys = [user_stats_key(user_id) for user_id in user_ids if user_id is not None]
+    if keys:
+        cache.delete_many(keys)
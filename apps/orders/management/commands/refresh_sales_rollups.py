@@ -0,0 +1,27 @@
+"""Integre les commandes nouvelles/modifiees dans les agregats journaliers
+de ventes (produit, categorie, quartier) lus par /api/orders/analytics/.
+
+A lancer periodiquement (cron toutes les 5-15 min), par ex. sur le VPS :
+    */10 * * * * docker exec erols_web python manage.py refresh_sales_rollups
+"""
+from django.core.management.base import BaseCommand
+
+from apps.orders.rollups import refresh_sales_rollups
+
+
+class Command(BaseCommand):
+    help = "Met a jour les agregats de ventes journaliers a partir du dernier point de reprise."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help="Reconstruit tous les agregats depuis zero (apres suppression de commandes).",
+        )
+
+    def handle(self, *args, **options):
+        report = refresh_sales_rollups(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Termine : {report['days']} jour(s) recalcule(s), {report['rows']} ligne(s) "
+            f"ecrite(s). Point de reprise : {report['watermark']}"
+        ))
@@ -0,0 +1,92 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_user_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('redirected', 'Redirigé vers WhatsApp'), ('completed', 'Complétée'), ('cancelled', 'Annulée')], max_length=20)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('category_id', models.BigIntegerField(null=True)),
+                ('category_name', models.CharField(max_length=100)),
+            ],
+            options={
+                'verbose_name': 'Ventes journalières (catégorie)',
+                'verbose_name_plural': 'Ventes journalières (catégories)',
+            },
+        ),
+        migrations.CreateModel(
+            name='CityDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('redirected', 'Redirigé vers WhatsApp'), ('completed', 'Complétée'), ('cancelled', 'Annulée')], max_length=20)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('city_name', models.CharField(max_length=100)),
+            ],
+            options={
+                'verbose_name': 'Ventes journalières (quartier)',
+                'verbose_name_plural': 'Ventes journalières (quartiers)',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('redirected', 'Redirigé vers WhatsApp'), ('completed', 'Complétée'), ('cancelled', 'Annulée')], max_length=20)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product_id', models.BigIntegerField(null=True)),
+                ('product_name', models.CharField(max_length=255)),
+            ],
+            options={
+                'verbose_name': 'Ventes journalières (produit)',
+                'verbose_name_plural': 'Ventes journalières (produits)',
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_updated_at', models.DateTimeField(blank=True, null=True)),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['updated_at'], name='order_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at'], name='order_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='productdailysales',
+            constraint=models.UniqueConstraint(fields=('date', 'product_id', 'product_name', 'status'), name='product_daily_sales_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='citydailysales',
+            constraint=models.UniqueConstraint(fields=('date', 'city_name', 'status'), name='city_daily_sales_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='categorydailysales',
+            constraint=models.UniqueConstraint(fields=('date', 'category_id', 'category_name', 'status'), name='category_daily_sales_uniq'),
+        ),
+    ]
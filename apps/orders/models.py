@@ -66,6 +66,91 @@ class Order(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Commande'
         verbose_name_plural = 'Commandes'
+        indexes = [
+            # Couvre les statistiques par utilisateur (un seul COUNT ... FILTER
+            # par statut au lieu d'une requete par statut).
+            models.Index(fields=['user', 'status'], name='order_user_status_idx'),
+            # Couvre l'historique pagine par curseur (user = X ORDER BY
+            # created_at DESC, id DESC) sans tri ni parcours d'OFFSET.
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+            # Couvrent le recalcul incremental des agregats de ventes
+            # (voir rollups.py) : lignes modifiees depuis le dernier passage,
+            # puis toutes les commandes des jours concernes.
+            models.Index(fields=['updated_at'], name='order_updated_idx'),
+            models.Index(fields=['created_at'], name='order_created_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.user.username} - {self.product_name} - {self.city_name}"
\ No newline at end of file
+        return f"{self.user.username} - {self.product_name} - {self.city_name}"
+
+
+class SalesRollup(models.Model):
+    """Agregat journalier des commandes (base commune aux trois dimensions).
+
+    Une ligne par (jour, cle de dimension, statut). Maintenu par
+    rollups.refresh_sales_rollups() ; les endpoints d'analytics ne lisent
+    que ces tables, jamais la table des commandes.
+    """
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    order_count = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        abstract = True
+
+
+class ProductDailySales(SalesRollup):
+    # Pas de ForeignKey : un produit supprime garde son historique de ventes.
+    product_id = models.BigIntegerField(null=True)
+    product_name = models.CharField(max_length=255)
+
+    class Meta:
+        verbose_name = 'Ventes journalières (produit)'
+        verbose_name_plural = 'Ventes journalières (produits)'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'product_id', 'product_name', 'status'],
+                name='product_daily_sales_uniq',
+            ),
+        ]
+
+
+class CategoryDailySales(SalesRollup):
+    category_id = models.BigIntegerField(null=True)
+    category_name = models.CharField(max_length=100)
+
+    class Meta:
+        verbose_name = 'Ventes journalières (catégorie)'
+        verbose_name_plural = 'Ventes journalières (catégories)'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'category_id', 'category_name', 'status'],
+                name='category_daily_sales_uniq',
+            ),
+        ]
+
+
+class CityDailySales(SalesRollup):
+    city_name = models.CharField(max_length=100)
+
+    class Meta:
+        verbose_name = 'Ventes journalières (quartier)'
+        verbose_name_plural = 'Ventes journalières (quartiers)'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'city_name', 'status'],
+                name='city_daily_sales_uniq',
+            ),
+        ]
+
+
+class RollupWatermark(models.Model):
+    """Dernier Order.updated_at deja integre dans les agregats."""
+    name = models.CharField(max_length=50, unique=True)
+    last_updated_at = models.DateTimeField(null=True, blank=True)
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_updated_at}"
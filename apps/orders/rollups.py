@@ -0,0 +1,152 @@
+"""Incremental daily sales rollups (product / category / city).
+
+Each run only looks at orders whose updated_at moved past the stored
+watermark, collects the calendar days those orders belong to, and rebuilds
+just those days in the three rollup tables from the orders of that day.
+Rebuilding a whole day (instead of applying +1/-1 deltas) keeps status
+changes correct without having to know an order's previous status, and
+makes every run idempotent — re-processing a day twice gives the same rows.
+Only the rows that differ from the stored ones are rewritten, so a run with
+no changes (which still re-scans the overlap window) writes nothing.
+
+Order deletions don't move any watermark: use full=True (or --full on the
+management command) after a bulk purge.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    CategoryDailySales,
+    CityDailySales,
+    Order,
+    ProductDailySales,
+    RollupWatermark,
+)
+
+WATERMARK_NAME = 'sales'
+
+# Re-scan a small window behind the watermark: a transaction that started
+# before the previous run but committed after it can carry an updated_at
+# slightly older than the watermark. Rebuilding a day is idempotent, so the
+# overlap costs a few extra rows, never double counting.
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+# (rollup model, Order fields grouped on -> rollup fields)
+DIMENSIONS = [
+    (ProductDailySales, {'product_id': 'product_id', 'product_name': 'product_name'}),
+    (CategoryDailySales, {'product__category_id': 'category_id', 'product__category__name': 'category_name'}),
+    (CityDailySales, {'city_name': 'city_name'}),
+]
+
+_line_total = ExpressionWrapper(
+    F('product_price') * F('quantity'),
+    output_field=DecimalField(max_digits=14, decimal_places=2),
+)
+
+
+def _dimension_values(row, fields) -> dict:
+    values = {}
+    for src, dst in fields.items():
+        value = row[src]
+        if value is None and dst.endswith('_name'):
+            # Produit supprime : plus de categorie connue.
+            value = '(inconnue)'
+        values[dst] = value
+    return values
+
+
+def _rebuild_days(days) -> int:
+    """Recomputes every rollup row of the given days and rewrites those that
+    changed. Returns rows written."""
+    if not days:
+        return 0
+    # Borne created_at (index order_created_idx) avant de filtrer sur le jour
+    # local, qui est une expression et ne peut pas utiliser l'index seule.
+    start = timezone.make_aware(datetime.combine(min(days), time.min))
+    end = timezone.make_aware(datetime.combine(max(days) + timedelta(days=1), time.min))
+    orders = (
+        Order.objects
+        .filter(created_at__gte=start, created_at__lt=end)
+        .annotate(day=TruncDate('created_at'))
+        .filter(day__in=days)
+    )
+    written = 0
+    for model, fields in DIMENSIONS:
+        rows = (
+            orders
+            .values('day', 'status', *fields.keys())
+            .annotate(n=Count('id'), u=Sum('quantity'), r=Sum(_line_total))
+            .order_by()
+        )
+        dimensions = list(fields.values())
+        fresh = {}
+        for row in rows:
+            values = _dimension_values(row, fields)
+            key = (row['day'], row['status'], *(values[name] for name in dimensions))
+            fresh[key] = (row['n'], row['u'] or 0, row['r'] or 0)
+        stored = {
+            (row['date'], row['status'], *(row[name] for name in dimensions)):
+                (row['id'], (row['order_count'], row['units'], row['revenue']))
+            for row in model.objects.filter(date__in=days).values(
+                'id', 'date', 'status', 'order_count', 'units', 'revenue', *dimensions,
+            )
+        }
+        # Lignes identiques gardees telles quelles
+        model.objects.filter(id__in=[
+            pk for key, (pk, totals) in stored.items() if fresh.get(key) != totals
+        ]).delete()
+        objs = [
+            model(
+                date=key[0],
+                status=key[1],
+                order_count=totals[0],
+                units=totals[1],
+                revenue=totals[2],
+                **dict(zip(dimensions, key[2:])),
+            )
+            for key, totals in fresh.items()
+            if key not in stored or stored[key][1] != totals
+        ]
+        model.objects.bulk_create(objs, batch_size=500)
+        written += len(objs)
+    return written
+
+
+def refresh_sales_rollups(full: bool = False) -> dict:
+    """Folds new/changed orders into the daily rollups.
+
+    Returns a small report: number of days rebuilt, rows written and the new
+    watermark.
+    """
+    with transaction.atomic():
+        watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(name=WATERMARK_NAME)
+
+        changed = Order.objects.all()
+        if not full and watermark.last_updated_at is not None:
+            changed = changed.filter(updated_at__gte=watermark.last_updated_at - WATERMARK_OVERLAP)
+
+        new_watermark = changed.aggregate(m=Max('updated_at'))['m']
+        days = sorted(set(
+            changed.annotate(day=TruncDate('created_at'))
+            .values_list('day', flat=True)
+            .distinct()
+            .order_by()
+        ))
+        if full:
+            # Jours qui n'ont plus aucune commande (suppressions) : vider aussi.
+            for model, _fields in DIMENSIONS:
+                model.objects.exclude(date__in=days).delete()
+
+        written = _rebuild_days(days)
+
+        if new_watermark is not None:
+            watermark.last_updated_at = max(
+                filter(None, [watermark.last_updated_at, new_watermark])
+            )
+        watermark.save()
+
+    return {'days': len(days), 'rows': written, 'watermark': watermark.last_updated_at}
@@ -0,0 +1,28 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from apps.products.popularity import record_status_change
+from .cache import invalidate_user_order_stats
+from .models import Order
+
+
+@receiver(post_init, sender=Order)
+def remember_order_status(sender, instance, **kwargs):
+    """Keeps the status as loaded, so post_save can tell what changed.
+    Read through __dict__ so a deferred status field isn't fetched here."""
+    instance._loaded_status = instance.__dict__.get('status')
+
+
+@receiver([post_save, post_delete], sender=Order)
+def invalidate_order_stats_cache(sender, instance, **kwargs):
+    """A new order or a status change makes the owner's cached stats stale."""
+    invalidate_user_order_stats(instance.user_id)
+
+
+@receiver(post_save, sender=Order)
+def update_product_popularity(sender, instance, created, **kwargs):
+    """Feeds the sales-driven popularity score (see products/popularity.py)."""
+    old_status = None if created else instance._loaded_status
+    if old_status != instance.status:
+        record_status_change(instance.product_id, instance.quantity, old_status, instance.status)
+    instance._loaded_status = instance.status
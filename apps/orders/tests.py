@@ -1,3 +1,100 @@
+from datetime import timedelta
+from decimal import Decimal
+
 from django.test import TestCase
+from django.utils import timezone
+
+from apps.products.models import Category, Product
+from apps.users.models import User
+from .models import CategoryDailySales, CityDailySales, Order, ProductDailySales
+from .rollups import refresh_sales_rollups
+
+
+class SalesRollupTests(TestCase):
+    """Agregats journaliers : seuls les jours des commandes modifiees sont
+    reconstruits."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='john', email='john@example.com')
+        category = Category.objects.create(name='TV', slug='tv')
+        cls.product = Product.objects.create(name='OSCAR TV', slug='oscar-tv', category=category, price=Decimal('50000'))
+        # Midi, heure locale : loin des bords du jour
+        noon = timezone.localtime().replace(hour=12, minute=0, second=0, microsecond=0)
+        cls.day_one, cls.day_two = noon - timedelta(days=3), noon - timedelta(days=2)
+        cls.orders = [
+            cls.order(cls.day_one, quantity=2),
+            cls.order(cls.day_one, city_name='Bonamoussadi'),
+            cls.order(cls.day_two),
+        ]
+
+    @classmethod
+    def order(cls, created_at, quantity=1, city_name='Akwa'):
+        order = Order.objects.create(
+            user=cls.user, product=cls.product, product_name=cls.product.name,
+            product_price=cls.product.price, quantity=quantity, city_name=city_name,
+            whatsapp_number='237690000000',
+        )
+        # update() ne touche pas aux champs auto_now : commande ancienne
+        Order.objects.filter(pk=order.pk).update(created_at=created_at, updated_at=created_at)
+        return order
+
+    def rows(self, model=ProductDailySales):
+        return sorted(
+            model.objects.values_list('id', 'date', 'status', 'order_count', 'units', 'revenue'),
+            key=lambda row: (row[1], row[2]),
+        )
+
+    def test_first_run_folds_every_day(self):
+        report = refresh_sales_rollups()
+        self.assertEqual((report['days'], report['rows']), (2, 7))
+        self.assertEqual(
+            [row[1:] for row in self.rows()],
+            [(self.day_one.date(), 'redirected', 2, 3, Decimal('150000')),
+             (self.day_two.date(), 'redirected', 1, 1, Decimal('50000'))],
+        )
+        self.assertEqual(CityDailySales.objects.filter(date=self.day_one.date()).count(), 2)
+        self.assertEqual(CategoryDailySales.objects.get(date=self.day_two.date()).category_name, 'TV')
+
+    def test_status_change_refolds_its_day(self):
+        refresh_sales_rollups()
+        day_two_rows = [row for row in self.rows() if row[1] == self.day_two.date()]
+        order = Order.objects.get(pk=self.orders[0].pk)
+        order.status = 'completed'
+        order.save()
+
+        report = refresh_sales_rollups()
+        # Jour de la commande, et celui du watermark (fenetre de recouvrement)
+        self.assertEqual(report['days'], 2)
+        # Produit et categorie : completed + redirected ; quartier : Akwa completed
+        self.assertEqual(report['rows'], 5)
+        self.assertEqual(
+            [row[1:] for row in self.rows() if row[1] == self.day_one.date()],
+            [(self.day_one.date(), 'completed', 1, 2, Decimal('100000')),
+             (self.day_one.date(), 'redirected', 1, 1, Decimal('50000'))],
+        )
+        # L'autre jour n'est pas reecrit
+        self.assertEqual([row for row in self.rows() if row[1] == self.day_two.date()], day_two_rows)
+        self.assertEqual(report['watermark'], Order.objects.get(pk=order.pk).updated_at)
+
+    def test_rerun_without_changes_is_a_no_op(self):
+        first = refresh_sales_rollups()
+        rows = self.rows()
+        second = refresh_sales_rollups()
+        self.assertEqual(second['rows'], 0)
+        self.assertEqual(second['watermark'], first['watermark'])
+        self.assertEqual(self.rows(), rows)
+
+    def test_full_refresh_drops_days_without_orders(self):
+        refresh_sales_rollups()
+        Order.objects.filter(pk=self.orders[2].pk).delete()
+        # Une suppression ne deplace pas le watermark
+        refresh_sales_rollups()
+        self.assertTrue(ProductDailySales.objects.filter(date=self.day_two.date()).exists())
 
-# Create your tests here.
+        report = refresh_sales_rollups(full=True)
+        self.assertEqual((report['days'], report['rows']), (1, 0))
+        for model in (ProductDailySales, CategoryDailySales, CityDailySales):
+            with self.subTest(model=model.__name__):
+                self.assertFalse(model.objects.filter(date=self.day_two.date()).exists())
+                self.assertTrue(model.objects.filter(date=self.day_one.date()).exists())
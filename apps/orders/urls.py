@@ -1,10 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CityViewSet, OrderViewSet
+from .views import CityViewSet, OrderViewSet, SalesAnalyticsViewSet
 
 router = DefaultRouter()
 router.register(r'cities', CityViewSet, basename='city')
 router.register(r'orders', OrderViewSet, basename='order')
+router.register(r'analytics', SalesAnalyticsViewSet, basename='sales-analytics')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -15,4 +16,8 @@ urlpatterns = [
 # POST   /api/orders/initiate/        - Initier une commande (obtenir URL WhatsApp)
 # GET    /api/orders/history/         - Historique des commandes
 # GET    /api/orders/stats/           - Statistiques
-# PATCH  /api/orders/{id}/update_status/ - Mettre à jour le statut
\ No newline at end of file
+# PATCH  /api/orders/{id}/update_status/ - Mettre à jour le statut
+# GET    /api/orders/analytics/top-products/    - Classement produits (staff)
+# GET    /api/orders/analytics/top-categories/  - Classement catégories (staff)
+# GET    /api/orders/analytics/revenue-by-city/ - CA par quartier (staff)
+# GET    /api/orders/analytics/timeseries/      - Série journalière (staff)
\ No newline at end of file
@@ -1,8 +1,15 @@
+from datetime import date, timedelta
+
+from django.db.models import Sum
+from django.utils import timezone
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
 from rest_framework.response import Response
-from .models import City, Order
+from apps.products.counters import record_whatsapp_click
+from core.pagination import OrderHistoryCursorPagination
+from .cache import get_user_order_stats
+from .models import CategoryDailySales, City, CityDailySales, Order, ProductDailySales
 from .serializers import CitySerializer, InitiateOrderSerializer, OrderHistorySerializer
 
 
@@ -28,6 +35,7 @@ class OrderViewSet(viewsets.GenericViewSet):
     - GET /api/orders/stats/ : Statistiques
     """
     permission_classes = [IsAuthenticated]
+    pagination_class = OrderHistoryCursorPagination
     
     def get_queryset(self):
         return Order.objects.filter(user=self.request.user)
@@ -59,6 +67,7 @@ class OrderViewSet(viewsets.GenericViewSet):
         )
         serializer.is_valid(raise_exception=True)
         result = serializer.save()
+        record_whatsapp_click(serializer.validated_data['product_id'])
         
         return Response(result, status=status.HTTP_201_CREATED)
     
@@ -93,15 +102,22 @@ class OrderViewSet(viewsets.GenericViewSet):
         )
         serializer.is_valid(raise_exception=True)
         result = serializer.save()
+        for item in serializer.validated_data['items']:
+            record_whatsapp_click(int(item['product_id']))
         
         return Response(result, status=status.HTTP_201_CREATED)
     
     @action(detail=False, methods=['get'])
     def history(self, request):
-        """Historique des commandes de l'utilisateur"""
-        orders = self.get_queryset().order_by('-created_at')
+        """
+        Historique des commandes de l'utilisateur (pagination par curseur)
+        
+        GET /api/orders/history/?cursor=...&page_size=20
+        Response: {"next": url|null, "previous": url|null, "results": [...]}
+        """
+        orders = self.get_queryset()
         
-        # Pagination optionnelle
+        # Le tri (-created_at, -id) est impose par la pagination par curseur
         page = self.paginate_queryset(orders)
         if page is not None:
             serializer = OrderHistorySerializer(page, many=True)
@@ -112,16 +128,16 @@ class OrderViewSet(viewsets.GenericViewSet):
     
     @action(detail=False, methods=['get'])
     def stats(self, request):
-        """Statistiques des commandes"""
-        orders = self.get_queryset()
-        
+        """Statistiques des commandes (une seule requete agregee, mise en cache)"""
+        data = get_user_order_stats(request.user.id)
+
         stats = {
-            'total_orders': orders.count(),
-            'redirected': orders.filter(status='redirected').count(),
-            'completed': orders.filter(status='completed').count(),
-            'cancelled': orders.filter(status='cancelled').count(),
+            'total_orders': data['total_orders'],
+            'redirected': data['redirected'],
+            'completed': data['completed'],
+            'cancelled': data['cancelled'],
         }
-        
+
         return Response(stats)
     
     @action(detail=True, methods=['patch'])
@@ -147,4 +163,112 @@ class OrderViewSet(viewsets.GenericViewSet):
         order.save(update_fields=['status', 'updated_at'])
         
         serializer = OrderHistorySerializer(order)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+
+
+class SalesAnalyticsViewSet(viewsets.ViewSet):
+    """
+    Analytics des ventes pour le staff, lues uniquement dans les agregats
+    journaliers (voir rollups.py) — jamais de parcours de la table Order.
+    
+    Endpoints:
+    - GET /api/orders/analytics/top-products/  : Produits les plus vendus
+    - GET /api/orders/analytics/top-categories/ : Categories les plus vendues
+    - GET /api/orders/analytics/revenue-by-city/ : Chiffre d'affaires par quartier
+    - GET /api/orders/analytics/timeseries/ : Serie journaliere
+    
+    Parametres communs (optionnels):
+    - date_from, date_to : AAAA-MM-JJ (defaut : les 30 derniers jours)
+    - status : liste separee par des virgules (defaut : redirected,completed)
+    - limit : nombre de lignes pour les classements (defaut 10, max 100)
+    """
+    permission_classes = [IsAdminUser]
+
+    DEFAULT_STATUSES = ['redirected', 'completed']
+    VALID_STATUSES = {choice for choice, _label in Order.STATUS_CHOICES}
+
+    def _filters(self, request):
+        params = request.query_params
+        try:
+            date_to = date.fromisoformat(params['date_to']) if params.get('date_to') else timezone.localdate()
+            date_from = (
+                date.fromisoformat(params['date_from']) if params.get('date_from')
+                else date_to - timedelta(days=29)
+            )
+        except ValueError:
+            return None, Response({'error': 'Date invalide (format AAAA-MM-JJ)'}, status=400)
+
+        statuses = self.DEFAULT_STATUSES
+        if params.get('status'):
+            statuses = [s.strip() for s in params['status'].split(',') if s.strip()]
+            if not set(statuses) <= self.VALID_STATUSES:
+                return None, Response({'error': 'Statut invalide'}, status=400)
+
+        return {'date__gte': date_from, 'date__lte': date_to, 'status__in': statuses}, None
+
+    def _limit(self, request):
+        try:
+            return max(1, min(int(request.query_params.get('limit', 10)), 100))
+        except ValueError:
+            return 10
+
+    def _ranking(self, request, model, group_by):
+        filters, error = self._filters(request)
+        if error:
+            return error
+        rows = (
+            model.objects.filter(**filters)
+            .values(*group_by)
+            .annotate(order_count=Sum('order_count'), units=Sum('units'), revenue=Sum('revenue'))
+            .order_by('-revenue')[:self._limit(request)]
+        )
+        return Response(list(rows))
+
+    @action(detail=False, methods=['get'], url_path='top-products')
+    def top_products(self, request):
+        return self._ranking(request, ProductDailySales, ['product_id', 'product_name'])
+
+    @action(detail=False, methods=['get'], url_path='top-categories')
+    def top_categories(self, request):
+        return self._ranking(request, CategoryDailySales, ['category_id', 'category_name'])
+
+    @action(detail=False, methods=['get'], url_path='revenue-by-city')
+    def revenue_by_city(self, request):
+        return self._ranking(request, CityDailySales, ['city_name'])
+
+    @action(detail=False, methods=['get'])
+    def timeseries(self, request):
+        """
+        Serie journaliere (commandes, unites, CA), globale ou restreinte a un
+        produit (product_id), une categorie (category_id) ou un quartier (city).
+        """
+        filters, error = self._filters(request)
+        if error:
+            return error
+
+        params = request.query_params
+        try:
+            product_id = int(params['product_id']) if params.get('product_id') else None
+            category_id = int(params['category_id']) if params.get('category_id') else None
+        except ValueError:
+            return Response({'error': 'product_id ou category_id invalide'}, status=400)
+
+        # Chaque commande a exactement un quartier : la table par quartier
+        # sert aussi de total global.
+        model = CityDailySales
+        if product_id is not None:
+            model = ProductDailySales
+            filters['product_id'] = product_id
+        elif category_id is not None:
+            model = CategoryDailySales
+            filters['category_id'] = category_id
+        elif params.get('city'):
+            filters['city_name'] = params['city']
+
+        rows = (
+            model.objects.filter(**filters)
+            .values('date')
+            .annotate(order_count=Sum('order_count'), units=Sum('units'), revenue=Sum('revenue'))
+            .order_by('date')
+        )
+        return Response(list(rows))
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Category, Product, ProductImage
+from .models import Category, Product, ProductImage, ProductStats
 
 
 class ProductImageInline(admin.TabularInline):
@@ -92,4 +92,19 @@ class ProductAdmin(admin.ModelAdmin):
     class Media:
         css = {
             'all': ('admin/css/products_admin.css',)
-        }
\ No newline at end of file
+        }
+
+
+@admin.register(ProductStats)
+class ProductStatsAdmin(admin.ModelAdmin):
+    """Lecture seule : alimente par flush_product_stats"""
+    list_display = ['product', 'view_count', 'whatsapp_click_count', 'updated_at']
+    search_fields = ['product__name']
+    ordering = ['-view_count']
+    list_select_related = ['product']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,71 @@
+"""Fast-path entry points for the cached catalog reads (async under ASGI).
+
+Each function returns the versioned key the DRF action caches its payload
+under with cache_payload() (see views.py); core/async_views.py serves the
+pre-compressed body stored next to it without going through DRF, or falls
+back to the DRF view on a miss. urls.py swaps them in for the router's
+callbacks by URL name.
+"""
+from core.async_views import read_view
+from .cache import versioned_key
+from .counters import record_view
+
+
+def homepage(**kwargs):
+    return versioned_key('products', 'homepage')
+
+
+def featured(**kwargs):
+    return versioned_key('products', 'featured')
+
+
+def popular(**kwargs):
+    return versioned_key('products', 'popular')
+
+
+def featured_per_category(**kwargs):
+    return versioned_key('products', 'featured-per-category')
+
+
+def brands(**kwargs):
+    return versioned_key('products', 'brands')
+
+
+def categories(**kwargs):
+    return versioned_key('categories', 'list')
+
+
+def product_detail(slug, **kwargs):
+    return versioned_key('product', 'detail', slug)
+
+
+def product_related(slug, **kwargs):
+    return versioned_key('product', 'related', slug)
+
+
+def _count_view(data):
+    record_view(data['id'])
+
+
+# nom d'URL du routeur -> (cle du cache, callback apres un hit servi)
+ASYNC_READS = {
+    'product-homepage': (homepage, None),
+    'product-featured': (featured, None),
+    'product-popular': (popular, None),
+    'product-featured-per-category': (featured_per_category, None),
+    'product-brands': (brands, None),
+    'category-list': (categories, None),
+    'product-detail': (product_detail, _count_view),
+    'product-related': (product_related, None),
+}
+
+
+def with_async_reads(urlpatterns):
+    """Wraps the router's callbacks listed in ASYNC_READS, keeping the URL
+    patterns, their order and their names unchanged."""
+    for pattern in urlpatterns:
+        read = ASYNC_READS.get(pattern.name)
+        if read is not None:
+            cache_key, on_hit = read
+            pattern.callback = read_view(cache_key, pattern.callback, on_hit=on_hit)
+    return urlpatterns
@@ -8,15 +8,21 @@ delete anything. Simple, race-safe (INCR is atomic in Redis), no key drift.
 """
 from django.core.cache import cache
 
+from core import metrics
+
 VERSION_KEY = 'products:cache_version'
 
 # Read-heavy, stable-shape endpoints only — the filterable /products/ list has
-# too many query-param combinations to cache usefully and isn't included here.
+# too many query-param combinations to cache usefully and isn't included here
+# (it is served from the in-memory catalog snapshot instead, see snapshot.py).
 TTL_SHORT = 60 * 5      # 5 min: homepage aggregate, featured/popular
 TTL_MEDIUM = 60 * 15    # 15 min: categories, brands (change rarely)
 TTL_DETAIL = 60 * 10    # 10 min: single product detail
 
 
+CACHE_BUMPS = metrics.counter('products_cache_bumps_total', 'Increments de products:cache_version')
+
+
 def get_cache_version() -> int:
     version = cache.get(VERSION_KEY)
     if version is None:
@@ -26,6 +32,7 @@ def get_cache_version() -> int:
 
 
 def bump_cache_version() -> None:
+    CACHE_BUMPS.inc()
     try:
         cache.incr(VERSION_KEY)
     except ValueError:
@@ -35,3 +42,6 @@ def bump_cache_version() -> None:
 
 def versioned_key(*parts: str) -> str:
     return 'products:v{}:{}'.format(get_cache_version(), ':'.join(parts))
+
+
+metrics.callback_gauge('products_cache_version', 'Valeur courante de products:cache_version', get_cache_version)
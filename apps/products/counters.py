@@ -0,0 +1,174 @@
+"""Buffered engagement counters (product views, WhatsApp clicks).
+
+The request path only does one HINCRBY in Redis — never a database write.
+The flush_product_stats command (cron, every minute) moves the pending hash
+aside with an atomic RENAME and folds it into ProductStats with one batched
+UPSERT. Events recorded during a flush land in a fresh pending hash and are
+picked up by the next run.
+
+The batch moved aside gets an id (a field of the hash, set once), recorded
+in ProductStatsFlush in the same transaction as the UPSERT. If a flush dies
+after the commit but before deleting the batch, the next run finds the id
+already recorded and only deletes it: no count is added twice.
+
+Without Redis (DEBUG, see core/redis.py) the counts are kept in a
+per-process buffer that a daemon thread flushes every FLUSH_INTERVAL seconds.
+"""
+import logging
+import threading
+import uuid
+from collections import Counter
+from datetime import timedelta
+
+import redis
+
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from core.redis import get_redis, redis_key
+from .models import Product, ProductStats, ProductStatsFlush
+
+logger = logging.getLogger(__name__)
+
+VIEW = 'v'
+WHATSAPP_CLICK = 'c'
+FIELDS = {VIEW: 'view_count', WHATSAPP_CLICK: 'whatsapp_click_count'}
+
+FLUSH_INTERVAL = 30  # secondes, repli en memoire uniquement
+UPSERT_BATCH_SIZE = 500
+BATCH_FIELD = 'batch'
+# Les lots plus anciens ne peuvent plus etre rejoues
+FLUSH_RETENTION = timedelta(days=1)
+
+_local_buffer = Counter()
+_local_lock = threading.Lock()
+_flusher = None
+
+
+def _pending_key():
+    return redis_key('productstats', 'pending')
+
+
+def _processing_key():
+    return redis_key('productstats', 'processing')
+
+
+def record(kind: str, product_id, amount: int = 1) -> None:
+    """Counts one event for a product. Never raises, never touches the DB."""
+    if not product_id:
+        return
+    field = f'{kind}:{product_id}'
+    client = get_redis()
+    if client is not None:
+        try:
+            client.hincrby(_pending_key(), field, amount)
+            return
+        except Exception:
+            logger.warning("Redis indisponible pour les compteurs produits", exc_info=True)
+
+    with _local_lock:
+        _local_buffer[field] += amount
+    _ensure_local_flusher()
+
+
+def record_view(product_id) -> None:
+    record(VIEW, product_id)
+
+
+def record_whatsapp_click(product_id, amount: int = 1) -> None:
+    record(WHATSAPP_CLICK, product_id, amount)
+
+
+def _upsert(counts, batch_id=None) -> int:
+    """Adds {'v:12': 3, 'c:12': 1, ...} to ProductStats in one batched
+    INSERT ... ON CONFLICT DO UPDATE (Postgres, and SQLite in dev), unless
+    batch_id was already added. Returns rows touched."""
+    per_product = {}
+    for field, amount in counts.items():
+        kind, _, product_id = field.partition(':')
+        if kind not in FIELDS or not product_id.isdigit():
+            continue
+        row = per_product.setdefault(int(product_id), dict.fromkeys(FIELDS.values(), 0))
+        row[FIELDS[kind]] += int(amount)
+
+    # Produits supprimes entre-temps : leurs compteurs sont abandonnes.
+    valid_ids = set(Product.objects.filter(id__in=per_product).values_list('id', flat=True))
+    if not valid_ids:
+        return 0
+
+    table = connection.ops.quote_name(ProductStats._meta.db_table)
+    now = timezone.now()
+    rows = [
+        (pk, per_product[pk]['view_count'], per_product[pk]['whatsapp_click_count'], now)
+        for pk in sorted(valid_ids)  # ordre stable : evite les interblocages entre flushs
+    ]
+    with transaction.atomic(), connection.cursor() as cursor:
+        if batch_id is not None:
+            _, created = ProductStatsFlush.objects.get_or_create(batch_id=batch_id)
+            if not created:
+                return 0  # lot deja ajoute par un flush interrompu
+        for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+            batch = rows[i:i + UPSERT_BATCH_SIZE]
+            cursor.execute(
+                f'INSERT INTO {table} (product_id, view_count, whatsapp_click_count, updated_at) '
+                f'VALUES {", ".join(["(%s, %s, %s, %s)"] * len(batch))} '
+                f'ON CONFLICT (product_id) DO UPDATE SET '
+                f'view_count = {table}.view_count + EXCLUDED.view_count, '
+                f'whatsapp_click_count = {table}.whatsapp_click_count + EXCLUDED.whatsapp_click_count, '
+                f'updated_at = EXCLUDED.updated_at',
+                [value for row in batch for value in row],
+            )
+    return len(rows)
+
+
+def flush() -> int:
+    """Writes every pending count to ProductStats. Returns rows touched."""
+    client = get_redis()
+    if client is None:
+        return _flush_local()
+
+    pending, processing = _pending_key(), _processing_key()
+    # Un flush precedent interrompu a pu laisser un lot "processing" : le
+    # traiter d'abord, sinon le RENAME l'ecraserait.
+    if not client.exists(processing):
+        try:
+            client.rename(pending, processing)
+        except redis.ResponseError:
+            return 0  # "no such key" : rien en attente
+    # Meme identifiant si ce lot est rejoue
+    client.hsetnx(processing, BATCH_FIELD, uuid.uuid4().hex)
+    counts = {k.decode(): v for k, v in client.hgetall(processing).items()}
+    batch_id = counts.pop(BATCH_FIELD).decode()
+    touched = _upsert({field: int(amount) for field, amount in counts.items()}, batch_id)
+    client.delete(processing)
+    ProductStatsFlush.objects.filter(flushed_at__lt=timezone.now() - FLUSH_RETENTION).delete()
+    return touched
+
+
+def _flush_local() -> int:
+    with _local_lock:
+        counts = dict(_local_buffer)
+        _local_buffer.clear()
+    return _upsert(counts)
+
+
+def _ensure_local_flusher():
+    global _flusher
+    if _flusher is not None:
+        return
+    with _local_lock:
+        if _flusher is not None:
+            return
+        _flusher = threading.Thread(target=_local_flush_loop, name='product-stats-flush', daemon=True)
+        _flusher.start()
+
+
+def _local_flush_loop():
+    stop = threading.Event()
+    while not stop.wait(FLUSH_INTERVAL):
+        try:
+            _flush_local()
+        except Exception:
+            logger.exception("Echec du flush des compteurs produits")
+        finally:
+            close_old_connections()
@@ -0,0 +1,128 @@
+"""Facet counts of the product list: per category, price bucket, brand and stock.
+
+GET /api/products/?facets=true (with any of the list's filters, search
+included) adds a "facets" object to the paginated response:
+
+    categories  [{slug, name, count}]         active categories, count > 0
+    price       [{min_price, max_price_exclusive, count}]
+                                              one bucket per tier of the
+                                              resale bareme (PRICE_TIERS),
+                                              [min_price, next tier's
+                                              min_price), empty buckets
+                                              included
+    brands      [{name, count}]               KNOWN_BRANDS found in the
+                                              product name, count > 0
+    stock       {in_stock, out_of_stock}
+
+Each facet honors every active filter except its own, so that the sidebar
+shows what selecting another value would return: the category counts
+ignore ?category=, the price buckets ignore min_price/max_price, the stock
+counts ignore ?in_stock=. The brand counts honor them all (there is no
+brand filter).
+
+Two implementations with the same output: one pass over the in-memory
+catalog (CatalogSnapshot.facets, snapshot.py), and for searches or without
+a snapshot, a single aggregate query with one filtered COUNT per value
+(aggregate() below).
+"""
+from django.db.models import Count, Q
+
+from .pricing import PRICE_TIERS
+
+# Vraies marques presentes dans le catalogue (pas de "partenariat" invente) :
+# on ne montre que celles ayant au moins un produit reel en stock.
+KNOWN_BRANDS = [
+    'OSCAR', 'HISENSE', 'MIDEA', 'INNOVA', 'TOBI', 'FODEG Star', 'GIFTMAX',
+    'Sylver Crest', 'STAR-X', 'STARX', 'Light Wave', 'JBL', 'Grious', 'DORAGYM',
+    'RMG', 'VISION', 'SAMSUNG', 'LG', 'SONAR', 'Hoffmans',
+]
+
+# Une marque par nom en majuscules (comme _brands_data)
+BRANDS = [
+    brand for index, brand in enumerate(KNOWN_BRANDS)
+    if brand.upper() not in {seen.upper() for seen in KNOWN_BRANDS[:index]}
+]
+
+# Bornes basses des tranches de prix : les paliers du bareme
+PRICE_BOUNDS = [min_price for min_price, _, _ in PRICE_TIERS]
+
+# Tranches [min, min du palier suivant) : pas le max inclus du bareme, qui
+# laisserait 499,50 hors de la tranche 0-499 affichee
+PRICE_RANGES = list(zip(PRICE_BOUNDS, [*PRICE_BOUNDS[1:], None]))
+
+
+def brand_mask(name):
+    """Bit i set when BRANDS[i] is in the name (name__icontains)."""
+    name = name.lower()
+    mask = 0
+    for bit, brand in enumerate(BRANDS):
+        if brand.lower() in name:
+            mask |= 1 << bit
+    return mask
+
+
+def price_buckets(counts):
+    return [
+        {'min_price': low, 'max_price_exclusive': high, 'count': count}
+        for (low, high), count in zip(PRICE_RANGES, counts)
+    ]
+
+
+def response(categories, buckets, brands, in_stock, out_of_stock):
+    """The facets object from raw counts: categories [(slug, name, count)],
+    buckets [count per tier], brands [(name, count)]."""
+    return {
+        'categories': [
+            {'slug': slug, 'name': name, 'count': count}
+            for slug, name, count in sorted(categories, key=lambda c: (-c[2], c[1]))
+            if count
+        ],
+        'price': price_buckets(buckets),
+        'brands': [
+            {'name': name, 'count': count}
+            for name, count in sorted(brands, key=lambda b: -b[1])
+            if count
+        ],
+        'stock': {'in_stock': in_stock, 'out_of_stock': out_of_stock},
+    }
+
+
+def brand_counts(queryset):
+    """[(brand, count)] for BRANDS in one query (name__icontains)."""
+    result = queryset.order_by().aggregate(**{
+        f'brand_{index}': Count('id', filter=Q(name__icontains=brand)) for index, brand in enumerate(BRANDS)
+    })
+    return [(brand, result[f'brand_{index}']) for index, brand in enumerate(BRANDS)]
+
+
+def aggregate(queryset, filters, categories):
+    """Facets of queryset (available products, search applied) in one query.
+
+    filters: {'category', 'price', 'stock'} -> Q of the active filter of
+    that facet (Q() if none); categories: [(id, slug, name)]."""
+    def others(*excluded):
+        q = Q()
+        for name, condition in filters.items():
+            if name not in excluded:
+                q &= condition
+        return q
+
+    counts = {}
+    for category_id, _, _ in categories:
+        counts[f'category_{category_id}'] = Count('id', filter=others('category') & Q(category_id=category_id))
+    for index, (low, high) in enumerate(PRICE_RANGES):
+        bucket = Q(price__gte=low) & (Q(price__lt=high) if high is not None else Q())
+        counts[f'price_{index}'] = Count('id', filter=others('price') & bucket)
+    for index, brand in enumerate(BRANDS):
+        counts[f'brand_{index}'] = Count('id', filter=others() & Q(name__icontains=brand))
+    counts['in_stock'] = Count('id', filter=others('stock') & Q(stock__gt=0))
+    counts['out_of_stock'] = Count('id', filter=others('stock') & Q(stock__lte=0))
+
+    result = queryset.order_by().aggregate(**counts)
+    return response(
+        [(slug, name, result[f'category_{category_id}']) for category_id, slug, name in categories],
+        [result[f'price_{index}'] for index in range(len(PRICE_RANGES))],
+        [(brand, result[f'brand_{index}']) for index, brand in enumerate(BRANDS)],
+        result['in_stock'],
+        result['out_of_stock'],
+    )
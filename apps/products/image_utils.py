@@ -2,12 +2,16 @@
 photo at upload time (no external CDN/service — see the explicit decision to
 stay local-only). Served directly by nginx/whitenoise like the originals.
 """
+import functools
 import os
+import time
 from io import BytesIO
 
 from django.core.files.base import ContentFile
 from PIL import Image
 
+from core import metrics
+
 MAX_DIMENSION = 1600  # product photos rarely need to be larger client-side
 WEBP_QUALITY = 82
 JPEG_QUALITY = 85
@@ -15,7 +19,26 @@ JPEG_QUALITY = 85
 # on images that don't need it (and makes this a no-op on second save calls).
 OPTIMIZE_SIZE_THRESHOLD = 400 * 1024
 
+IMAGE_JOB_SECONDS = metrics.histogram(
+    'image_job_duration_seconds', 'Duree des traitements d\'image (optimize, webp)', ['job'],
+    buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30),
+)
+
+
+def _timed(job):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                IMAGE_JOB_SECONDS.labels(job).observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
 
+@_timed('optimize')
 def optimize_original_image(image_field) -> None:
     """Resizes/re-compresses the uploaded file itself in place (same path, same
     format) so a 2-4MB phone photo doesn't sit on disk at full size forever —
@@ -85,6 +108,7 @@ def webp_path_for(image_field) -> str | None:
     return f'{root}.webp'
 
 
+@_timed('webp')
 def generate_webp_variant(image_field) -> None:
     """Creates a resized WebP sibling next to the original image (same path,
     .webp extension) if one doesn't already exist. Safe to call repeatedly —
@@ -0,0 +1,23 @@
+"""Construit le snapshot du catalogue de la version courante du cache
+(apps/products/snapshot.py), sans attendre une requete.
+
+A lancer apres un deploiement, par ex. sur le VPS :
+    docker exec erols_web python manage.py build_catalog_snapshot
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.products import snapshot
+
+
+class Command(BaseCommand):
+    help = "Construit le snapshot du catalogue (tmpfs partage par les workers)."
+
+    def handle(self, *args, **options):
+        if not settings.CATALOG_SNAPSHOT:
+            raise CommandError('CATALOG_SNAPSHOT est desactive.')
+        catalog = snapshot.rebuild()
+        if catalog is None:
+            self.stdout.write("Construction deja en cours dans un autre processus.")
+            return
+        self.stdout.write(self.style.SUCCESS(f"Termine : {catalog.name}, {catalog.count} produit(s)."))
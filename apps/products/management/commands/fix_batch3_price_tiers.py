@@ -1,4 +1,4 @@
-"""Applique le barème de revente confirmé (erols_frontend/src/lib/priceTiers.ts)
+"""Applique le barème de revente confirmé (apps/products/pricing.py)
 aux 22 produits importés par import_visiontech_batch3, qui avaient été crees
 avec leur prix d'achat brut au lieu du prix de vente.
 
@@ -13,24 +13,7 @@ from decimal import Decimal
 from django.core.management.base import BaseCommand
 
 from apps.products.models import Product
-
-# Barème confirmé (identique à PRICE_TIERS côté frontend) : bonus fixe par
-# palier de prix d'achat.
-PRICE_TIERS = [
-    (0, 499, 300),
-    (500, 1499, 500),
-    (1500, 3999, 1000),
-    (4000, 19999, 2000),
-    (20000, 49999, 3000),
-    (50000, None, 5000),
-]
-
-
-def apply_tier_bonus(cost_price):
-    for min_price, max_price, bonus in PRICE_TIERS:
-        if cost_price >= min_price and (max_price is None or cost_price <= max_price):
-            return cost_price + bonus
-    return cost_price
+from apps.products.pricing import apply_tier_bonus
 
 
 # (slug, prix d'achat brut attendu tel qu'importe)
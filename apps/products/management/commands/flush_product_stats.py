@@ -0,0 +1,16 @@
+"""Ecrit en base les compteurs de vues/clics WhatsApp bufferises dans Redis.
+
+A lancer chaque minute, par ex. sur le VPS :
+    * * * * * docker exec erols_web python manage.py flush_product_stats
+"""
+from django.core.management.base import BaseCommand
+
+from apps.products.counters import flush
+
+
+class Command(BaseCommand):
+    help = "Vide le buffer des compteurs produits (vues, clics WhatsApp) vers ProductStats."
+
+    def handle(self, *args, **options):
+        touched = flush()
+        self.stdout.write(self.style.SUCCESS(f"Termine : {touched} produit(s) mis a jour."))
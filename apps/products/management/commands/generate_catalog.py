@@ -0,0 +1,388 @@
+"""
+Genere un catalogue synthetique realiste pour les benchmarks
+(api_benchmark) : categories, produits (marque dans le nom, prix en FCFA,
+stock, popularite), images de galerie, clients et commandes.
+
+Tailles predefinies (--size) :
+
+    1k   :     1 000 produits,     200 clients,     2 000 commandes
+    10k  :    10 000 produits,   2 000 clients,    20 000 commandes
+    100k :   100 000 produits,  20 000 clients,   200 000 commandes
+    1m   : 1 000 000 produits, 100 000 clients, 2 000 000 commandes
+
+Tout ce qui est genere est marque (categories "gen-*", clients "gen-user-*")
+et --clear le supprime sans toucher au reste. La generation est
+deterministe pour une --seed donnee. Les images pointent vers des chemins
+de media (products/gen/...) sans fichier : les serialiseurs construisent les
+URLs et testent le variant WebP comme en production.
+
+Insertion par lots (bulk_create) : pas de signaux, donc pas d'invalidation
+du cache par produit ni de WebP ; le cache du catalogue est invalide une fois
+a la fin et les scores de popularite sont ecrits directement (et dans Redis
+s'il est configure).
+
+Usage :
+    python manage.py generate_catalog --size 10k
+    python manage.py generate_catalog --size 1m --batch-size 10000
+    python manage.py generate_catalog --clear
+"""
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from apps.orders.models import City, Order
+from apps.products.cache import bump_cache_version
+from apps.products.models import Category, Product, ProductImage, ProductStats
+from apps.users.models import User
+from core.redis import get_redis
+
+PREFIX = 'gen-'
+USER_PREFIX = 'gen-user-'
+PASSWORD = 'gen-password'
+
+# (produits, clients, commandes)
+SIZES = {
+    '1k': (1_000, 200, 2_000),
+    '10k': (10_000, 2_000, 20_000),
+    '100k': (100_000, 20_000, 200_000),
+    '1m': (1_000_000, 100_000, 2_000_000),
+}
+
+# nom -> (marques, gammes, variantes, (prix min, prix max) en FCFA)
+CATALOG = {
+    'Téléphones': (
+        ['Samsung', 'Tecno', 'Infinix', 'Itel', 'Apple', 'Xiaomi', 'Oppo', 'Realme'],
+        ['Galaxy A', 'Spark', 'Hot', 'Note', 'iPhone', 'Redmi', 'Camon', 'Pova'],
+        ['64 Go', '128 Go', '256 Go', '4 Go RAM', '8 Go RAM', 'Double SIM'],
+        (35_000, 900_000),
+    ),
+    'Ordinateurs portables': (
+        ['HP', 'Lenovo', 'Dell', 'Asus', 'Acer', 'Apple'],
+        ['ProBook', 'IdeaPad', 'Latitude', 'VivoBook', 'Aspire', 'MacBook Air'],
+        ['Core i3', 'Core i5', 'Core i7', 'Ryzen 5', '8 Go', '16 Go', 'SSD 512 Go'],
+        (150_000, 1_500_000),
+    ),
+    'Tablettes': (
+        ['Samsung', 'Apple', 'Lenovo', 'Huawei'],
+        ['Galaxy Tab', 'iPad', 'Tab M', 'MatePad'],
+        ['Wi-Fi', '4G', '32 Go', '64 Go', '10 pouces'],
+        (60_000, 700_000),
+    ),
+    'TV & Audio': (
+        ['Samsung', 'LG', 'Hisense', 'TCL', 'Sony', 'JBL', 'Nasco'],
+        ['Smart TV', 'TV LED', 'Barre de son', 'Enceinte', 'Home cinéma'],
+        ['32 pouces', '43 pouces', '55 pouces', '4K', 'Bluetooth', 'Android TV'],
+        (20_000, 1_200_000),
+    ),
+    'Électroménager': (
+        ['Nasco', 'Hisense', 'Binatone', 'Roch', 'LG', 'Samsung', 'Midea'],
+        ['Réfrigérateur', 'Congélateur', 'Climatiseur', 'Ventilateur', 'Micro-ondes', 'Machine à laver'],
+        ['150 L', '250 L', '1 CV', '1,5 CV', 'Inverter', 'Classe A+'],
+        (15_000, 900_000),
+    ),
+    'Petit électroménager': (
+        ['Binatone', 'Moulinex', 'Philips', 'Tefal', 'Nasco'],
+        ['Blender', 'Bouilloire', 'Fer à repasser', 'Friteuse', 'Cuiseur à riz'],
+        ['1,5 L', '2 L', 'Inox', '1200 W', 'Sans fil'],
+        (5_000, 120_000),
+    ),
+    'Accessoires téléphone': (
+        ['Oraimo', 'Anker', 'Samsung', 'Xiaomi', 'Baseus'],
+        ['Chargeur', 'Power bank', 'Écouteurs', 'Câble USB-C', 'Coque', 'Montre connectée'],
+        ['10000 mAh', '20000 mAh', 'Charge rapide', 'Bluetooth', 'Noir', 'Blanc'],
+        (1_500, 80_000),
+    ),
+    'Mode homme': (
+        ['Zara', 'H&M', 'Celio', 'Jules', 'Made in Cameroun'],
+        ['Chemise', 'Pantalon', 'Jean', 'Polo', 'Costume', 'Boubou'],
+        ['Taille M', 'Taille L', 'Taille XL', 'Coton', 'Slim', 'Wax'],
+        (5_000, 150_000),
+    ),
+    'Mode femme': (
+        ['Zara', 'H&M', 'Mango', 'Shein', 'Made in Cameroun'],
+        ['Robe', 'Jupe', 'Ensemble', 'Kaba', 'Top', 'Sac à main'],
+        ['Taille S', 'Taille M', 'Taille L', 'Wax', 'Soie', 'Pagne'],
+        (4_000, 120_000),
+    ),
+    'Chaussures': (
+        ['Nike', 'Adidas', 'Puma', 'Bata', 'Converse', 'Vans'],
+        ['Baskets', 'Sandales', 'Mocassins', 'Escarpins', 'Air Max', 'Stan Smith'],
+        ['Pointure 40', 'Pointure 42', 'Pointure 44', 'Cuir', 'Toile', 'Noir'],
+        (6_000, 150_000),
+    ),
+    'Beauté & soins': (
+        ['Nivea', 'Dove', "L'Oréal", 'Garnier', 'Fair & White', 'Cantu'],
+        ['Crème', 'Lait corporel', 'Shampoing', 'Parfum', 'Savon', 'Huile capillaire'],
+        ['200 ml', '400 ml', '50 ml', 'Karité', 'Aloe vera', 'Lot de 3'],
+        (1_000, 60_000),
+    ),
+    'Maison & cuisine': (
+        ['Tefal', 'Luminarc', 'IKEA', 'Ménagère', 'Pyrex'],
+        ['Marmite', 'Service de table', 'Poêle', 'Matelas', 'Rideaux', 'Lampe'],
+        ['Lot de 6', '24 cm', '28 cm', '2 places', 'Inox', 'Céramique'],
+        (2_000, 250_000),
+    ),
+    'Bébé & enfants': (
+        ['Pampers', 'Huggies', 'Chicco', 'Babylove', 'Guigoz'],
+        ['Couches', 'Lait infantile', 'Poussette', 'Biberon', 'Porte-bébé'],
+        ['Taille 3', 'Taille 4', '1er âge', '2e âge', 'Pack x2'],
+        (2_000, 200_000),
+    ),
+    'Sport & loisirs': (
+        ['Decathlon', 'Nike', 'Adidas', 'Domyos', 'Kipsta'],
+        ['Ballon', 'Maillot', 'Vélo', 'Tapis de yoga', 'Haltères', 'Tapis de course'],
+        ['Taille 5', 'Lion indomptable', '26 pouces', '10 kg', 'Pliable'],
+        (3_000, 600_000),
+    ),
+    'Jeux vidéo': (
+        ['Sony', 'Microsoft', 'Nintendo', 'EA Sports'],
+        ['PlayStation 5', 'PlayStation 4', 'Xbox Series', 'Switch', 'Manette', 'FC 25'],
+        ['Édition standard', 'Édition digitale', '1 To', 'Pack 2 manettes'],
+        (15_000, 600_000),
+    ),
+    'Alimentation': (
+        ['Nestlé', 'Chococam', 'Source Tangui', 'Panzani', 'Mayor'],
+        ['Riz parfumé', 'Huile végétale', 'Chocolat en poudre', 'Eau minérale', 'Pâtes', 'Lait en poudre'],
+        ['1 kg', '5 kg', '25 kg', '1,5 L', 'Pack de 12', '400 g'],
+        (500, 40_000),
+    ),
+}
+
+ORDER_STATUSES = ['redirected'] * 6 + ['completed'] * 3 + ['cancelled']
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """bulk_create ecrase les champs auto_now_add : on les coupe le temps de
+    la generation pour garder des dates etalees sur deux ans."""
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field, _ in saved:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in saved:
+            field.auto_now_add = value
+
+
+class Command(BaseCommand):
+    help = 'Genere un catalogue synthetique (1k a 1M produits) pour les benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=SIZES, default='1k', help='Taille predefinie')
+        parser.add_argument('--products', type=int, help='Nombre de produits (remplace --size)')
+        parser.add_argument('--users', type=int, help='Nombre de clients (remplace --size)')
+        parser.add_argument('--orders', type=int, help='Nombre de commandes (remplace --size)')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--clear', action='store_true', help='Supprime les donnees generees et s\'arrete')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            self._clear()
+            return
+        if Category.objects.filter(slug__startswith=PREFIX).exists():
+            raise CommandError('Un catalogue genere existe deja : lancer d\'abord generate_catalog --clear')
+
+        products, users, orders = SIZES[options['size']]
+        products = options['products'] or products
+        users = options['users'] or users
+        orders = options['orders'] if options['orders'] is not None else orders
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        started = time.monotonic()
+
+        categories = self._create_categories()
+        cities = self._cities()
+        user_ids = self._create_users(users)
+        popularity = self._create_products(products, orders, categories, cities, user_ids)
+        self._push_popularity(popularity)
+        bump_cache_version()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Catalogue genere en {time.monotonic() - started:.0f} s : {products} produits, '
+            f'{len(categories)} categories, {users} clients, {orders} commandes '
+            f'(mot de passe des clients : {PASSWORD})'
+        ))
+
+    def _create_categories(self):
+        categories = Category.objects.bulk_create([
+            Category(name=name, slug=PREFIX + slugify(name), description=f'{name} au meilleur prix', is_active=True)
+            for name in CATALOG
+        ])
+        # bulk_create ne renvoie pas les ids sur toutes les bases
+        by_slug = {c.slug: c for c in Category.objects.filter(slug__startswith=PREFIX)}
+        return [(by_slug[PREFIX + slugify(name)], spec) for name, spec in CATALOG.items()]
+
+    def _cities(self):
+        cities = list(City.objects.filter(is_active=True))
+        if not cities:
+            cities = [
+                City.objects.create(name=f'Gen {name}', whatsapp_number='237600000000', display_order=i)
+                for i, name in enumerate(['Tamdja', 'Kamkop', 'Marché A', 'Djeleng'])
+            ]
+        return cities
+
+    def _create_users(self, count):
+        self.stdout.write(f'Clients : {count}')
+        password = make_password(PASSWORD)  # un seul hachage pour tous
+        created_at = User._meta.get_field('created_at')
+        batch = []
+        with explicit_timestamps(created_at):
+            for i in range(count):
+                email = f'{USER_PREFIX}{i}@example.com'
+                joined = self.now - timedelta(days=self.rng.uniform(0, 730))
+                batch.append(User(
+                    username=f'{USER_PREFIX}{i}', email=email, email_normalized=email,
+                    first_name=self.rng.choice(['Paul', 'Marie', 'Jean', 'Aïcha', 'Brice', 'Linda', 'Hervé', 'Grace']),
+                    last_name=self.rng.choice(['Nguema', 'Fotso', 'Kamga', 'Tchoupo', 'Mbarga', 'Ndongo', 'Ewane']),
+                    password=password, user_type='client', date_joined=joined, created_at=joined,
+                ))
+                if len(batch) >= self.batch_size:
+                    User.objects.bulk_create(batch)
+                    batch = []
+            User.objects.bulk_create(batch)
+        return list(User.objects.filter(username__startswith=USER_PREFIX).values_list('id', flat=True))
+
+    def _create_products(self, count, order_count, categories, cities, user_ids):
+        """Produits par lots ; les images, statistiques et commandes de chaque
+        lot suivent aussitot, pour ne jamais garder tout le catalogue en memoire."""
+        self.stdout.write(f'Produits : {count}')
+        orders_per_product = order_count / count if count else 0
+        popularity = {}
+        timestamp_fields = [
+            Product._meta.get_field('created_at'),
+            ProductImage._meta.get_field('created_at'),
+            Order._meta.get_field('created_at'),
+        ]
+        with explicit_timestamps(*timestamp_fields):
+            done = 0
+            while done < count:
+                size = min(self.batch_size, count - done)
+                with transaction.atomic():
+                    products = self._product_batch(done, size, categories)
+                    Product.objects.bulk_create(products)
+                    if products[0].pk is None:
+                        by_slug = dict(Product.objects.filter(
+                            slug__in=[p.slug for p in products]).values_list('slug', 'id'))
+                        for product in products:
+                            product.pk = product.id = by_slug[product.slug]
+                    self._images_and_stats(products)
+                    remaining_orders = order_count - round(done * orders_per_product)
+                    batch_orders = min(round(size * orders_per_product), remaining_orders)
+                    self._orders(products, batch_orders, cities, user_ids)
+                popularity.update((p.pk, p.popularity_score) for p in products if p.popularity_score)
+                done += size
+                self.stdout.write(f'  {done}/{count}')
+        return popularity
+
+    def _product_batch(self, start, size, categories):
+        rng = self.rng
+        products = []
+        for i in range(start, start + size):
+            category, (brands, lines, variants, (low, high)) = categories[i % len(categories)]
+            brand = rng.choice(brands)
+            line = rng.choice(lines)
+            variant = rng.choice(variants)
+            model = rng.randint(2, 99) if rng.random() < 0.6 else ''
+            name = ' '.join(str(part) for part in (brand, line, model, variant) if part)
+            # Log-uniforme : beaucoup de produits bon marche, quelques-uns chers
+            price = round(low * (high / low) ** rng.random() / 500) * 500 or low
+            created = self.now - timedelta(days=rng.uniform(0, 730))
+            # Popularite tres concentree (Pareto) : quelques best-sellers
+            popularity = round(rng.paretovariate(1.2) - 1, 2) if rng.random() < 0.4 else 0.0
+            products.append(Product(
+                name=name,
+                # SlugField : 50 caracteres au plus
+                slug=f"{slugify(name)[:40].rstrip('-')}-{i}",
+                description=(
+                    f'{line} {brand} {variant}. Garantie {rng.choice([6, 12, 24])} mois, '
+                    f'livraison a Bafoussam et dans tout le Cameroun. {category.description}.'
+                ),
+                category=category,
+                price=Decimal(price),
+                image=f'products/gen/{category.slug}/{i}.jpg',
+                stock=0 if rng.random() < 0.1 else rng.randint(1, 200),
+                is_available=rng.random() < 0.95,
+                popularity_score=popularity,
+                created_at=created,
+            ))
+        return products
+
+    def _images_and_stats(self, products):
+        rng = self.rng
+        images, stats = [], []
+        for product in products:
+            for order in range(rng.choice([0, 1, 2, 2, 3, 4])):
+                images.append(ProductImage(
+                    product=product, image=f'products/gen/gallery/{product.pk}-{order}.jpg',
+                    alt_text=f'{product.name} - vue {order + 1}', order=order, created_at=product.created_at,
+                ))
+            views = int(product.popularity_score * 40 + rng.randint(0, 50))
+            stats.append(ProductStats(
+                product=product, view_count=views, whatsapp_click_count=views // 20, updated_at=self.now,
+            ))
+        ProductImage.objects.bulk_create(images)
+        ProductStats.objects.bulk_create(stats)
+
+    def _orders(self, products, count, cities, user_ids):
+        if count <= 0 or not user_ids:
+            return
+        rng = self.rng
+        # Les produits populaires recoivent l'essentiel des commandes
+        weights = [p.popularity_score + 0.2 for p in products]
+        chosen = rng.choices(products, weights=weights, k=count)
+        orders = []
+        for product in chosen:
+            city = rng.choice(cities)
+            created = product.created_at + (self.now - product.created_at) * rng.random()
+            orders.append(Order(
+                user_id=rng.choice(user_ids), product=product, city=city,
+                product_name=product.name, product_price=product.price,
+                quantity=rng.choice([1, 1, 1, 2, 3]), city_name=city.name,
+                whatsapp_number=city.whatsapp_number, status=rng.choice(ORDER_STATUSES),
+                created_at=created,
+            ))
+        Order.objects.bulk_create(orders)
+
+    def _push_popularity(self, popularity):
+        client = get_redis()
+        if client is None or not popularity:
+            return
+        from apps.products.popularity import _scores_key
+
+        items = list(popularity.items())
+        for start in range(0, len(items), 10000):
+            client.zadd(_scores_key(), dict(items[start:start + 10000]))
+
+    def _clear(self):
+        """Suppression directe (_raw_delete) des grosses tables : le collecteur
+        de l'ORM chargerait chaque produit et enverrait un post_delete (et une
+        invalidation du cache) par ligne."""
+        products = Product.objects.filter(category__slug__startswith=PREFIX)
+        product_ids = products.values('id')
+        users = User.objects.filter(username__startswith=USER_PREFIX)
+        counts = {}
+        with transaction.atomic():
+            counts['commandes'] = Order.objects.filter(user__in=users.values('id'))._raw_delete('default')
+            Order.objects.filter(product__in=product_ids).update(product=None)
+            counts['images'] = ProductImage.objects.filter(product__in=product_ids)._raw_delete('default')
+            ProductStats.objects.filter(product__in=product_ids)._raw_delete('default')
+            counts['produits'] = Product.objects.filter(category__slug__startswith=PREFIX)._raw_delete('default')
+            counts['clients'] = users.count()
+            users.delete()
+            Category.objects.filter(slug__startswith=PREFIX).delete()
+            City.objects.filter(name__startswith='Gen ').delete()
+        bump_cache_version()
+        self.stdout.write(self.style.SUCCESS(
+            'Supprimes : ' + ', '.join(f'{count} {name}' for name, count in counts.items())
+        ))
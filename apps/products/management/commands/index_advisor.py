@@ -0,0 +1,239 @@
+"""
+Conseiller d'index pour les filtres du catalogue : rejoue toutes les
+combinaisons de ProductViewSet.get_queryset (categorie, prix min et/ou max,
+en stock, 5 tris + l'ordre par defaut, soit 96 combinaisons) telles que la
+liste les execute (COUNT de la pagination + premiere page), et rapporte pour
+chacune la duree, les parcours complets de table et les tris sans index.
+
+A lancer sur un catalogue genere de taille realiste (generate_catalog) : sur
+une petite table, le planificateur prefere souvent un parcours complet. Les
+statistiques du planificateur sont rafraichies avant (ANALYZE). Plans lus
+avec EXPLAIN (ANALYZE, BUFFERS) sur PostgreSQL, EXPLAIN QUERY PLAN sur
+SQLite (core/slow_queries.py).
+
+Pour chaque combinaison dont la page passe par un parcours complet ou un
+tri, l'index suggere suit la regle egalite, tri, intervalle : colonnes
+filtrees par egalite (category, is_available), puis la colonne du tri, puis
+les colonnes d'intervalle (price, stock). Les suggestions identiques sont
+regroupees avec le temps cumule des combinaisons qu'elles couvriraient ;
+quand un index existant a deja ce prefixe, il est signale comme non utilise
+plutot que propose a nouveau.
+
+Usage :
+    python manage.py generate_catalog --size 100k
+    python manage.py index_advisor
+    python manage.py index_advisor --only-issues --plans
+    python manage.py index_advisor --category gen-telephones --runs 5
+"""
+import itertools
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Q
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from apps.products.models import Category, Product
+from apps.products.views import ProductViewSet
+from core.slow_queries import explain, plan_issues
+
+PAGE_SIZE = 20
+SMALL_CATALOG = 10_000
+PRODUCT_TABLE = Product._meta.db_table
+
+# Abreviations des noms d'index (30 caracteres au plus pour Django)
+ABBREVIATIONS = {'category': 'cat', 'is_available': 'av', 'created_at': 'cr', 'price': 'pr', 'name': 'nm', 'stock': 'st'}
+
+
+def _bare(field):
+    return field.lstrip('-')
+
+
+def _existing_indexes():
+    """{nom: [champs]} des index de Product (Meta.indexes, db_index, FK)."""
+    indexes = {index.name: [_bare(f) for f in index.fields] for index in Product._meta.indexes}
+    for field in Product._meta.concrete_fields:
+        if field.db_index or field.unique or field.is_relation:
+            indexes.setdefault(f'{field.name} (db_index)', [field.name])
+    return indexes
+
+
+def suggest_index(combination):
+    """(egalite + tri, intervalle) : champs de l'index pour une combinaison.
+    Le sens du tri ne compte pas, un B-tree se parcourt dans les deux sens."""
+    prefix = (['category'] if combination['category'] else []) + ['is_available', _bare(combination['ordering'])]
+    ranges = []
+    if combination['min_price'] or combination['max_price']:
+        ranges.append('price')
+    if combination['in_stock']:
+        ranges.append('stock')
+    return tuple(prefix), [field for field in ranges if field not in prefix]
+
+
+def _index_name(fields):
+    return 'product_' + '_'.join(ABBREVIATIONS.get(_bare(f), _bare(f)[:3]) for f in fields) + '_idx'
+
+
+class Command(BaseCommand):
+    help = 'Rejoue les filtres du catalogue et suggere des index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--category', help='Slug de categorie (defaut : celle qui a le plus de produits)')
+        parser.add_argument('--runs', type=int, default=3, help='Executions par requete (mediane)')
+        parser.add_argument('--only-issues', action='store_true', help='Seulement les combinaisons a probleme')
+        parser.add_argument('--plans', action='store_true', help='Affiche les plans')
+
+    def handle(self, *args, **options):
+        available = Product.objects.filter(is_available=True)
+        total = available.count()
+        if not total:
+            raise CommandError('Catalogue vide : python manage.py generate_catalog --size 100k')
+        if total < SMALL_CATALOG:
+            self.stdout.write(self.style.WARNING(
+                f'{total} produits disponibles : sur une petite table le planificateur choisit volontiers '
+                f'un parcours complet (generate_catalog --size 100k)'
+            ))
+
+        category = options['category'] or (
+            Category.objects.annotate(n=Count('products', filter=Q(products__is_available=True)))
+            .order_by('-n').values_list('slug', flat=True).first()
+        )
+        prices = sorted(available.values_list('price', flat=True))
+        min_price, max_price = prices[len(prices) // 4], prices[3 * len(prices) // 4]
+
+        self.refresh_statistics()
+        self.stdout.write(
+            f'{connection.vendor}, {total} produits disponibles ; categorie {category}, '
+            f'prix {min_price:.0f}-{max_price:.0f}, mediane de {options["runs"]} executions\n'
+        )
+        header = f'{"categorie":10} {"prix":8} {"stock":6} {"tri":11} {"page ms":>8} {"count ms":>9}  problemes'
+        self.stdout.write(header)
+
+        suggestions = {}
+        issues = 0
+        combinations = list(self.combinations(category, min_price, max_price))
+        for combination in combinations:
+            result = self.replay(combination, options['runs'])
+            problems = self.problems(result)
+            if problems['page']:
+                issues += 1
+                prefix, ranges = suggest_index(combination)
+                entry = suggestions.setdefault(prefix, {'ranges': [], 'count': 0, 'ms': 0.0})
+                entry['ranges'] += [field for field in ranges if field not in entry['ranges']]
+                entry['count'] += 1
+                entry['ms'] += result['page']['ms']
+            if options['only_issues'] and not (problems['page'] or problems['count']):
+                continue
+            described = '; '.join(
+                f'{query} : {", ".join(items)}' for query, items in problems.items() if items
+            ) or 'ok'
+            self.stdout.write(
+                f'{"oui" if combination["category"] else "-":10} {self.price_label(combination):8} '
+                f'{"oui" if combination["in_stock"] else "-":6} {combination["sort_by"] or "(defaut)":11} '
+                f'{result["page"]["ms"]:8.2f} {result["count"]["ms"]:9.2f}  {described}'
+            )
+            if options['plans']:
+                for query in ('count', 'page'):
+                    self.stdout.write(f'    {query} :')
+                    for line in result[query]['plan']:
+                        self.stdout.write(f'      {line}')
+
+        self.report(suggestions, issues, len(combinations))
+
+    def refresh_statistics(self):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(f'ANALYZE {PRODUCT_TABLE}, {Category._meta.db_table}')
+            else:
+                cursor.execute('ANALYZE')
+
+    def combinations(self, category, min_price, max_price):
+        sorts = [None, *ProductViewSet.SORT_MAP]
+        prices = [(None, None), (min_price, None), (None, max_price), (min_price, max_price)]
+        for category_slug, (low, high), in_stock, sort_by in itertools.product(
+            [None, category], prices, [False, True], sorts
+        ):
+            yield {
+                'category': category_slug,
+                'min_price': low,
+                'max_price': high,
+                'in_stock': in_stock,
+                'sort_by': sort_by,
+                'ordering': ProductViewSet.SORT_MAP.get(sort_by, Product._meta.ordering[0]),
+            }
+
+    def price_label(self, combination):
+        return {
+            (False, False): '-', (True, False): 'min', (False, True): 'max', (True, True): 'min-max',
+        }[(bool(combination['min_price']), bool(combination['max_price']))]
+
+    def queryset(self, combination):
+        params = {
+            'category': combination['category'],
+            'min_price': combination['min_price'],
+            'max_price': combination['max_price'],
+            'in_stock': 'true' if combination['in_stock'] else None,
+            'sort_by': combination['sort_by'],
+        }
+        request = APIRequestFactory().get('/api/products/', {k: v for k, v in params.items() if v is not None})
+        view = ProductViewSet(request=Request(request), action='list', format_kwarg=None, kwargs={})
+        return view.get_queryset()
+
+    def replay(self, combination, runs):
+        """COUNT et premiere page comme la pagination de la liste : SQL,
+        mediane des durees et plan de chacune."""
+        queryset = self.queryset(combination)
+        queries = {
+            'count': lambda: queryset.count(),
+            'page': lambda: list(queryset[:PAGE_SIZE]),
+        }
+        result = {}
+        for name, run in queries.items():
+            captured = []
+
+            def capture(execute, sql, params, many, context):
+                captured.append((sql, params))
+                return execute(sql, params, many, context)
+
+            durations = []
+            with connection.execute_wrapper(capture):
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    run()
+                    durations.append(time.perf_counter() - start)
+            sql, params = captured[-1]
+            result[name] = {
+                'ms': statistics.median(durations) * 1000,
+                'plan': explain(connection, sql, params),
+            }
+        return result
+
+    def problems(self, result):
+        problems = {}
+        for query, data in result.items():
+            tables, sorted_in_memory = plan_issues(data['plan'], connection.vendor)
+            items = [f'parcours complet {table}' for table in tables if table == PRODUCT_TABLE]
+            if sorted_in_memory:
+                items.append('tri sans index')
+            problems[query] = items
+        return problems
+
+    def report(self, suggestions, issues, total):
+        self.stdout.write(f'\n{issues} combinaisons sur {total} avec parcours complet ou tri de la page')
+        if not suggestions:
+            return
+        existing = _existing_indexes()
+        self.stdout.write(self.style.MIGRATE_HEADING('\nIndex suggeres (egalite, tri, intervalle)'))
+        for prefix, entry in sorted(suggestions.items(), key=lambda item: -item[1]['ms']):
+            fields = [*prefix, *sorted(entry['ranges'], key=['price', 'stock'].index)]
+            summary = f'{entry["count"]} combinaison{"s" if entry["count"] > 1 else ""}, {entry["ms"]:.1f} ms cumules'
+            # Le prefixe egalite + tri suffit a eviter le tri
+            covering = [name for name, indexed in existing.items() if tuple(indexed[:len(prefix)]) == prefix]
+            if covering:
+                self.stdout.write(
+                    f'  {", ".join(prefix)} : deja couvert par {", ".join(covering)} mais non utilise ({summary})'
+                )
+                continue
+            self.stdout.write(f"  models.Index(fields={fields!r}, name='{_index_name(fields)}'),  # {summary}")
@@ -0,0 +1,19 @@
+"""Amortit les scores de popularite (demi-vie de 7 jours) et les recopie
+dans Product.popularity_score.
+
+A lancer periodiquement (cron toutes les heures), par ex. sur le VPS :
+    0 * * * * docker exec erols_web python manage.py refresh_popularity
+"""
+from django.core.management.base import BaseCommand
+
+from apps.products.popularity import decay_and_persist
+
+
+class Command(BaseCommand):
+    help = "Applique l'amortissement des scores de popularite et les sauvegarde en base."
+
+    def handle(self, *args, **options):
+        report = decay_and_persist()
+        self.stdout.write(self.style.SUCCESS(
+            f"Termine : facteur {report['factor']:.4f}, {report['products']} produit(s) classe(s)."
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_alter_product_created_at_alter_product_is_available_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='popularity_score',
+            field=models.FloatField(db_index=True, default=0, editable=False),
+        ),
+    ]
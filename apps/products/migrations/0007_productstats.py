@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_popularity_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductStats',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='products.product')),
+                ('view_count', models.PositiveBigIntegerField(default=0)),
+                ('whatsapp_click_count', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Statistiques produit',
+                'verbose_name_plural': 'Statistiques produits',
+            },
+        ),
+    ]
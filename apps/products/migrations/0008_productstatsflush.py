@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-19 19:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_productstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductStatsFlush',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch_id', models.CharField(max_length=32, unique=True)),
+                ('flushed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Lot de statistiques produit',
+                'verbose_name_plural': 'Lots de statistiques produits',
+            },
+        ),
+    ]
@@ -37,6 +37,10 @@ class Product(models.Model):
     stock = models.IntegerField(default=0, db_index=True)
     is_available = models.BooleanField(default=True, db_index=True)
 
+    # Score de popularite (ventes ponderees et amorties dans le temps), copie
+    # periodique du sorted set Redis — voir popularity.py
+    popularity_score = models.FloatField(default=0, db_index=True, editable=False)
+
     # Dates
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -71,6 +75,42 @@ class Product(models.Model):
         return self.image_url
 
 
+class ProductStats(models.Model):
+    """Compteurs d'engagement par produit (vues de la fiche, clics WhatsApp).
+
+    Jamais ecrit sur le chemin de la requete : les evenements sont bufferises
+    puis ajoutes par lots — voir counters.py.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    view_count = models.PositiveBigIntegerField(default=0)
+    whatsapp_click_count = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Statistiques produit'
+        verbose_name_plural = 'Statistiques produits'
+
+    def __str__(self):
+        return f"{self.product_id}: {self.view_count} vues, {self.whatsapp_click_count} clics"
+
+
+class ProductStatsFlush(models.Model):
+    """Lots de compteurs deja ajoutes a ProductStats.
+
+    Ecrit dans la meme transaction que les compteurs : un lot rejoue apres un
+    flush interrompu (voir counters.py) n'est pas compte deux fois.
+    """
+    batch_id = models.CharField(max_length=32, unique=True)
+    flushed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Lot de statistiques produit'
+        verbose_name_plural = 'Lots de statistiques produits'
+
+    def __str__(self):
+        return self.batch_id
+
+
 class ProductImage(models.Model):
     """Galerie d'images d'un produit (en plus de l'image principale)"""
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
@@ -0,0 +1,159 @@
+"""Sales-driven popularity score, kept in a Redis sorted set.
+
+Every order adds its quantity to the product's score (a confirmed sale adds
+a bonus, a cancellation takes the order back out). A periodic job
+(refresh_popularity command) multiplies the whole set by a decay factor so
+old sales fade with a half-life of POPULARITY_HALF_LIFE. It then copies the
+scores to Product.popularity_score so they survive a Redis flush and back the
+DB fallback.
+
+Reads page through the set with ZREVRANGE, best first, until the caller
+has enough available products — no SQL sort per request.
+Without Redis (DEBUG, see core/redis.py) the increments and the decay go
+straight to Product.popularity_score and reads order on that indexed column.
+"""
+import logging
+import math
+import time
+
+from django.core.cache import cache
+from django.db.models import F
+
+from core.redis import get_redis, redis_key
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+POPULARITY_HALF_LIFE = 7 * 24 * 3600  # une vente "pese" moitie moins apres 7 jours
+
+# Poids par evenement, multiplies par la quantite commandee
+WEIGHT_ORDERED = 1.0       # redirection WhatsApp (intention d'achat)
+WEIGHT_COMPLETED = 2.0     # bonus quand la vente est confirmee
+STATUS_WEIGHTS = {
+    'redirected': WEIGHT_ORDERED,
+    'completed': WEIGHT_ORDERED + WEIGHT_COMPLETED,
+    'cancelled': 0.0,
+}
+
+
+def _scores_key():
+    return redis_key('popularity', 'scores')
+
+
+def _last_decay_key():
+    return redis_key('popularity', 'last_decay')
+
+
+def record_status_change(product_id, quantity, old_status, new_status) -> None:
+    """Applies the score difference between an order's old and new status
+    (old_status=None for a brand new order)."""
+    if not product_id:
+        return
+    delta = (STATUS_WEIGHTS.get(new_status, 0.0) - STATUS_WEIGHTS.get(old_status, 0.0)) * quantity
+    if not delta:
+        return
+
+    client = get_redis()
+    if client is not None:
+        try:
+            client.zincrby(_scores_key(), delta, product_id)
+            return
+        except Exception:
+            # Redis indisponible : ne pas casser la commande, basculer sur la base.
+            logger.warning("Redis indisponible pour la popularite, repli sur la base", exc_info=True)
+
+    Product.objects.filter(id=product_id).update(popularity_score=F('popularity_score') + delta)
+
+
+def top_product_id_pages(page_size: int):
+    """Yields the ids of the popular products, best first, page_size at a
+    time until the ranking runs out. The caller stops once it has enough:
+    some ids may belong to unavailable or deleted products."""
+    client = get_redis()
+    start = 0
+    if client is not None:
+        try:
+            while True:
+                page = client.zrevrange(_scores_key(), start, start + page_size - 1)
+                if page:
+                    yield [int(pk) for pk in page]
+                if len(page) < page_size:
+                    return
+                start += page_size
+        except Exception:
+            logger.warning("Redis indisponible pour la popularite, repli sur la base", exc_info=True)
+            if start:
+                return  # pages deja rendues : pas de doublons depuis la base
+
+    ranking = (
+        Product.objects.filter(popularity_score__gt=0)
+        .order_by('-popularity_score', 'id')
+        .values_list('id', flat=True)
+    )
+    while True:
+        page = list(ranking[start:start + page_size])
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        start += page_size
+
+
+def decay_and_persist() -> dict:
+    """Applies the time decay since the previous run and writes the scores
+    back to Product.popularity_score. Returns a small report."""
+    now = time.time()
+    client = get_redis()
+
+    if client is None:
+        last = _db_last_decay()
+        factor = _decay_factor(now - last) if last else 1.0
+        Product.objects.filter(popularity_score__gt=0).update(
+            popularity_score=F('popularity_score') * factor
+        )
+        _set_db_last_decay(now)
+        return {'factor': factor, 'products': Product.objects.filter(popularity_score__gt=0).count()}
+
+    key = _scores_key()
+    if not client.exists(key):
+        # Redis vide (flush, nouvelle instance) : repartir des scores persistes.
+        seed = dict(
+            Product.objects.filter(popularity_score__gt=0).values_list('id', 'popularity_score')
+        )
+        if seed:
+            client.zadd(key, seed)
+
+    last = client.get(_last_decay_key())
+    factor = _decay_factor(now - float(last)) if last else 1.0
+    pipe = client.pipeline()
+    # ZUNIONSTORE d'un seul ensemble avec un poids = multiplication atomique
+    # de tous les scores, sans relire l'ensemble cote Python.
+    pipe.zunionstore(key, {key: factor})
+    # Les scores devenus negligeables (ou negatifs) sortent de l'ensemble.
+    pipe.zremrangebyscore(key, '-inf', 0.01)
+    pipe.set(_last_decay_key(), now)
+    pipe.zrange(key, 0, -1, withscores=True)
+    scores = {int(pk): score for pk, score in pipe.execute()[-1]}
+
+    to_update = []
+    for product in Product.objects.only('id', 'popularity_score'):
+        score = scores.get(product.id, 0.0)
+        if product.popularity_score != score:
+            product.popularity_score = score
+            to_update.append(product)
+    # bulk_update : pas de post_save, donc pas d'invalidation du cache
+    # catalogue a chaque passage.
+    Product.objects.bulk_update(to_update, ['popularity_score'], batch_size=200)
+    return {'factor': factor, 'products': len(scores)}
+
+
+def _decay_factor(elapsed_seconds: float) -> float:
+    return math.pow(0.5, max(elapsed_seconds, 0) / POPULARITY_HALF_LIFE)
+
+
+def _db_last_decay():
+    return cache.get(_last_decay_key())
+
+
+def _set_db_last_decay(value):
+    cache.set(_last_decay_key(), value, timeout=None)
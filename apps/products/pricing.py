@@ -0,0 +1,23 @@
+"""Resale price bareme: a fixed bonus per tier of purchase price.
+
+Same tiers as PRICE_TIERS in the frontend (erols_frontend/src/lib/
+priceTiers.ts). Used by the fix_batch3_price_tiers command and for the
+price buckets of the list's facets (facets.py).
+"""
+
+# (prix d'achat min, max inclus ou None, bonus fixe)
+PRICE_TIERS = [
+    (0, 499, 300),
+    (500, 1499, 500),
+    (1500, 3999, 1000),
+    (4000, 19999, 2000),
+    (20000, 49999, 3000),
+    (50000, None, 5000),
+]
+
+
+def apply_tier_bonus(cost_price):
+    for min_price, max_price, bonus in PRICE_TIERS:
+        if cost_price >= min_price and (max_price is None or cost_price <= max_price):
+            return cost_price + bonus
+    return cost_price
@@ -51,7 +51,11 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'slug', 'description', 'is_active', 'product_count']
     
     def get_product_count(self, obj):
-        return obj.products.filter(is_available=True).count()
+        # Annote par les vues (views._active_categories) : pas de requete ici
+        count = getattr(obj, 'available_product_count', None)
+        if count is None:
+            count = obj.products.filter(is_available=True).count()
+        return count
 
 
 class ProductListSerializer(serializers.ModelSerializer):
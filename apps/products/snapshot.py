@@ -0,0 +1,674 @@
+"""In-memory catalog snapshot, shared by the workers through a mmap'ed file.
+
+The catalog (available products) is small enough to live in memory: a few
+hundred products today, tens of thousands at most. A CatalogSnapshot holds
+it as compact column arrays, in the list's default order (newest first),
+plus:
+
+    by_price, by_name, by_created, by_stock   positions sorted on that column
+                                              (names in the database's
+                                              collation, like the SQL sort)
+    by_id                                     positions sorted by product id
+    by_popularity                             best popularity_score first
+    name_rank                                 rank of each position in by_name
+    cat_offsets, cat_postings                 per category, its positions in
+                                              default order (posting lists)
+    suggest_*                                 sorted word prefixes of the
+                                              names (suggestions.py)
+
+and one text record per product (name, slug, image and WebP URLs), decoded
+only for the products actually returned, and a bitmask of the brands found
+in its name (facets.py). The read path (the list with its filters, sorts
+and facets, featured, popular, featured per category, the products of a
+category, the suggestions) uses nothing else: zero SQL and no storage call, the WebP
+lookups are made once, at build time.
+
+Snapshots are immutable and versioned by products:cache_version (cache.py).
+The first request that sees a new version starts a background thread that
+builds one under a file lock, writes it to CATALOG_SNAPSHOT_DIR (a tmpfs:
+/dev/shm by default) and stores its file name in the cache; the other
+workers map the same file, so its pages are shared by the whole gunicorn
+instance. No request waits for a build (a full catalog query and one
+storage call per product): meanwhile requests keep serving the previous
+snapshot if it is still the current version (only expired), or fall back
+to SQL. The build_catalog_snapshot command builds it in the foreground. A snapshot is also rebuilt after
+CATALOG_SNAPSHOT_MAX_AGE, like the cache TTLs: popularity scores and WebP
+variants change without a version bump. With LocMemCache (no Redis) each
+worker builds its own.
+
+Anything the snapshot can't answer exactly like the SQL path (search,
+invalid prices, unknown category of /categories/<slug>/products/) makes
+the callers in views.py fall back to it.
+"""
+import array
+import bisect
+import fcntl
+import heapq
+import itertools
+import json
+import logging
+import mmap
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import OrderedDict
+from decimal import ROUND_CEILING, ROUND_FLOOR, Decimal, InvalidOperation
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from rest_framework.settings import api_settings
+
+from core.redis import get_redis
+from . import facets as product_facets, suggestions
+from .cache import get_cache_version
+from .image_utils import webp_path_for
+from .models import Category, Product
+from .popularity import top_product_id_pages
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'ECATSNP3'
+SEPARATOR = '\x1f'
+FLAG_PHOTO = 1
+SELECT_CACHE_SIZE = 128
+SUGGEST_CACHE_SIZE = 1024
+
+COLUMNS = (
+    'id', 'price', 'stock', 'created', 'category', 'flags', 'brands', 'popularity', 'text_offsets', 'text',
+)
+INDEXES = (
+    'by_price', 'by_name', 'by_created', 'by_stock', 'by_id', 'by_popularity', 'name_rank',
+    'cat_offsets', 'cat_postings', 'suggest_offsets', 'suggest_text', 'suggest_positions', 'suggest_first',
+)
+
+_current = None
+_lock = threading.Lock()
+_builder = None
+
+
+class _Reversed:
+    """A sorted index read backwards, without copying it."""
+
+    __slots__ = ('positions',)
+
+    def __init__(self, positions):
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, index):
+        size = len(self.positions)
+        if isinstance(index, slice):
+            return [self.positions[size - 1 - i] for i in range(*index.indices(size))]
+        if not -size <= index < size:
+            raise IndexError(index)
+        return self.positions[size - 1 - (index % size)]
+
+    def __iter__(self):
+        return (self.positions[i] for i in range(len(self.positions) - 1, -1, -1))
+
+
+def _cents(value, rounding):
+    return int((value * 100).to_integral_value(rounding=rounding))
+
+
+def _price(cents):
+    # Meme rendu que le DecimalField du serialiseur : "166500.00"
+    return str(Decimal(cents).scaleb(-2))
+
+
+def _parse_price(value):
+    """Decimal as the price__gte lookup reads it, or None if SQL would fail."""
+    try:
+        price = Decimal(value)
+    except InvalidOperation:
+        return None
+    return price if price.is_finite() else None
+
+
+def list_filters(query_params, sort_map):
+    """select() arguments for ProductViewSet.get_queryset's query parameters,
+    or None when the snapshot can't answer like SQL (search, invalid price)."""
+    if query_params.get(api_settings.SEARCH_PARAM, '').replace(',', ' ').split():
+        return None
+    filters = {
+        'category': query_params.get('category') or None,
+        'min_price': None,
+        'max_price': None,
+        'in_stock': (query_params.get('in_stock') or '').lower() == 'true',
+        'ordering': sort_map.get(query_params.get('sort_by'), Product._meta.ordering[0]),
+    }
+    for name, rounding in (('min_price', ROUND_CEILING), ('max_price', ROUND_FLOOR)):
+        value = query_params.get(name)
+        if value:
+            price = _parse_price(value)
+            if price is None:
+                return None
+            filters[name] = _cents(price, rounding)
+    return filters
+
+
+class CatalogSnapshot:
+    __slots__ = (
+        'name', 'version', 'built_at', 'count', 'categories', 'brand_names', '_category_slugs', '_mmap',
+        '_selected', '_facets', '_suggested', '_memo_lock', *COLUMNS, *INDEXES,
+    )
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{path} : pas un snapshot du catalogue')
+        start = len(MAGIC) + 8
+        length = int.from_bytes(self._mmap[len(MAGIC):start], 'little')
+        header = json.loads(self._mmap[start:start + length])
+        if header['byteorder'] != sys.byteorder:
+            raise ValueError(f'{path} : ordre des octets {header["byteorder"]}')
+        self.name = Path(path).name
+        self.version = header['version']
+        self.built_at = header['built_at']
+        self.count = header['count']
+        # [id, nom, slug, active] par index de categorie
+        self.categories = header['categories']
+        self._category_slugs = {category[2]: index for index, category in enumerate(self.categories)}
+        # Marque de chaque bit de la colonne brands
+        self.brand_names = header['brands']
+        # Resultats memorises (LRU), partages par les threads du worker
+        self._selected = OrderedDict()
+        self._facets = OrderedDict()
+        self._suggested = OrderedDict()
+        self._memo_lock = threading.Lock()
+        view = memoryview(self._mmap)
+        base = start + length
+        for name, (offset, typecode, size) in header['sections'].items():
+            setattr(self, name, view[base + offset:base + offset + size].cast(typecode))
+
+    def expired(self):
+        return time.time() - self.built_at > settings.CATALOG_SNAPSHOT_MAX_AGE
+
+    def _recall(self, memo, key):
+        with self._memo_lock:
+            value = memo.get(key)
+            if value is not None:
+                memo.move_to_end(key)
+            return value
+
+    def _memorize(self, memo, key, value, size):
+        with self._memo_lock:
+            memo[key] = value
+            if len(memo) > size:
+                memo.popitem(last=False)
+        return value
+
+    # Lecture
+
+    def text_fields(self, position):
+        """(name, slug, image URL, WebP URL), URLs relative ('' if none)."""
+        start, end = self.text_offsets[position], self.text_offsets[position + 1]
+        return bytes(self.text[start:end]).decode().split(SEPARATOR)
+
+    def position(self, product_id):
+        index = bisect.bisect_left(self.by_id, product_id, key=self.id.__getitem__)
+        if index < self.count and self.id[self.by_id[index]] == product_id:
+            return self.by_id[index]
+        return None
+
+    def postings(self, category_index):
+        return self.cat_postings[self.cat_offsets[category_index]:self.cat_offsets[category_index + 1]]
+
+    def list_item(self, position, absolute_uri):
+        """What ProductListSerializer returns for this product."""
+        name, slug, image, webp = self.text_fields(position)
+        category_id, category_name, category_slug, _ = self.categories[self.category[position]]
+        image_url = absolute_uri(image) if image else None
+        stock = self.stock[position]
+        return {
+            'id': self.id[position],
+            'name': name,
+            'slug': slug,
+            'price': _price(self.price[position]),
+            'image_url': image_url,
+            'image_url_webp': absolute_uri(webp) if webp else None,
+            'thumbnail_url': image_url,
+            'stock': stock,
+            'in_stock': stock > 0,
+            'is_available': True,
+            'category_name': category_name,
+            'category': {'id': category_id, 'name': category_name, 'slug': category_slug},
+        }
+
+    def list_items(self, positions, request):
+        return [self.list_item(position, request.build_absolute_uri) for position in positions]
+
+    def _suggest_key(self, index):
+        return bytes(self.suggest_text[self.suggest_offsets[index]:self.suggest_offsets[index + 1]])
+
+    # Requetes
+
+    def order(self, ordering):
+        """Every position in that order (a view, no copy)."""
+        field, descending = ordering.lstrip('-'), ordering.startswith('-')
+        index = {'price': self.by_price, 'name': self.by_name, 'created_at': self.by_created}[field]
+        return _Reversed(index) if descending else index
+
+    def _sort_key(self, ordering):
+        return {
+            'price': self.price.__getitem__,
+            'name': self.name_rank.__getitem__,
+            'created_at': None,  # positions = ordre par defaut (-created_at)
+        }[ordering.lstrip('-')]
+
+    def select(self, category=None, min_price=None, max_price=None, in_stock=False, ordering='-created_at'):
+        """Positions of the available products matching the filters (prices in
+        cents), in that ordering: the SQL of ProductViewSet.get_queryset."""
+        if category is None and min_price is None and max_price is None and not in_stock:
+            return self.order(ordering)
+        key = (category, min_price, max_price, in_stock, ordering)
+        selected = self._recall(self._selected, key)
+        if selected is not None:
+            return selected
+
+        low = -sys.maxsize if min_price is None else min_price
+        high = sys.maxsize if max_price is None else max_price
+        price, stock = self.price, self.stock
+        if category is not None:
+            index = self._category_slugs.get(category)
+            candidates = self.postings(index) if index is not None else ()
+            positions = [
+                p for p in candidates if low <= price[p] <= high and (not in_stock or stock[p] > 0)
+            ]
+        elif min_price is not None or max_price is not None:
+            # Intervalle de prix : une tranche de by_price par dichotomie
+            start = bisect.bisect_left(self.by_price, low, key=price.__getitem__)
+            end = bisect.bisect_right(self.by_price, high, key=price.__getitem__)
+            positions = [p for p in self.by_price[start:end] if not in_stock or stock[p] > 0]
+            if ordering == '-price':
+                positions.reverse()
+            if ordering.lstrip('-') == 'price':
+                return self._remember(key, positions)
+            positions.sort()
+        else:
+            positions = [p for p in range(self.count) if stock[p] > 0]
+
+        sort_key = self._sort_key(ordering)
+        descending = ordering.startswith('-')
+        if sort_key is not None:
+            positions.sort(key=sort_key, reverse=descending)
+        elif not descending:
+            positions.reverse()
+        return self._remember(key, positions)
+
+    def _remember(self, key, positions):
+        return self._memorize(self._selected, key, array.array('i', positions), SELECT_CACHE_SIZE)
+
+    def facets(self, category=None, min_price=None, max_price=None, in_stock=False, ordering=None):
+        """Facet counts for the list's filters (facets.py), in one pass over
+        the columns. The ordering is accepted and ignored."""
+        key = (category, min_price, max_price, in_stock)
+        cached = self._recall(self._facets, key)
+        if cached is not None:
+            return cached
+
+        # Categorie inconnue : aucune position ne correspond (-1)
+        wanted = self._category_slugs.get(category, -1) if category is not None else None
+        low = -sys.maxsize if min_price is None else min_price
+        high = sys.maxsize if max_price is None else max_price
+        bounds = [bound * 100 for bound in product_facets.PRICE_BOUNDS]
+        categories = [0] * len(self.categories)
+        buckets = [0] * len(bounds)
+        brands = [0] * len(self.brand_names)
+        stocked = [0, 0]
+        for index, price, stock, mask in zip(self.category, self.price, self.stock, self.brands):
+            in_category = wanted is None or index == wanted
+            in_range = low <= price <= high
+            available = stock > 0
+            if in_range and (available or not in_stock):
+                categories[index] += 1
+            if in_category and (available or not in_stock):
+                buckets[bisect.bisect_right(bounds, price) - 1] += 1
+            if in_category and in_range:
+                stocked[available] += 1
+                if mask and (available or not in_stock):
+                    for bit in range(mask.bit_length()):
+                        if mask >> bit & 1:
+                            brands[bit] += 1
+
+        result = product_facets.response(
+            [(slug, name, categories[index]) for index, (_, name, slug, active) in enumerate(self.categories) if active],
+            buckets,
+            list(zip(self.brand_names, brands)),
+            stocked[True],
+            stocked[False],
+        )
+        return self._memorize(self._facets, key, result, SELECT_CACHE_SIZE)
+
+    def suggest(self, query, limit):
+        """Positions of up to limit products with a name word starting with
+        query (folded, see suggestions.py): whole-name matches first, then
+        by popularity and name."""
+        cached = self._recall(self._suggested, query)
+        if cached is not None:
+            return cached[2][:limit]
+
+        prefix = query[:suggestions.KEY_LENGTH]
+        low, high = 0, len(self.suggest_positions)
+        # Requete plus longue qu'une requete deja vue : dans sa tranche
+        for end in range(len(query) - 1, 0, -1):
+            shorter = self._suggested.get(query[:end])
+            if shorter is not None:
+                low, high = shorter[0], shorter[1]
+                break
+        target = prefix.encode()
+        keys = range(high)
+        start = bisect.bisect_left(keys, target, low, high, key=self._suggest_key)
+        # 0xff n'apparait pas en UTF-8 : apres toutes les cles qui commencent par target
+        end = bisect.bisect_left(keys, target + b'\xff', start, high, key=self._suggest_key)
+
+        # Meilleure correspondance de chaque produit (nom entier ou un mot)
+        best = {}
+        for index in range(start, end):
+            position = self.suggest_positions[index]
+            best[position] = best.get(position, False) or bool(self.suggest_first[index])
+        if len(query) > len(prefix):
+            best = {
+                position: whole for position, whole in best.items()
+                if suggestions.matches(query, self.text_fields(position)[0])
+            }
+        ranked = heapq.nsmallest(
+            suggestions.MAX_RESULTS, best,
+            key=lambda position: (not best[position], -self.popularity[position], self.name_rank[position]),
+        )
+        self._memorize(self._suggested, query, (start, end, ranked), SUGGEST_CACHE_SIZE)
+        return ranked[:limit]
+
+    def featured(self, limit, **filters):
+        """Newest products in stock (ProductViewSet._featured_queryset)."""
+        return self.select(**{**filters, 'in_stock': True})[:limit]
+
+    def popular(self, limit, **filters):
+        """Best sellers, topped up with the lowest stocks
+        (ProductViewSet._popular_queryset)."""
+        narrowed = any(filters.get(name) for name in ('category', 'min_price', 'max_price', 'in_stock'))
+        allowed = set(self.select(**filters)) if narrowed else None
+        if get_redis() is not None:
+            ranked = (self.position(pk) for page in top_product_id_pages(limit * 2) for pk in page)
+        else:
+            # Sans Redis, les scores persistes (copies a la construction)
+            ranked = itertools.takewhile(lambda p: self.popularity[p] > 0, self.by_popularity)
+        chosen = []
+        for position in ranked:
+            if position is not None and (allowed is None or position in allowed) and position not in chosen:
+                chosen.append(position)
+            if len(chosen) == limit:
+                return chosen
+        for position in self.by_stock:
+            if len(chosen) == limit:
+                break
+            if (allowed is None or position in allowed) and position not in chosen:
+                chosen.append(position)
+        return chosen
+
+    def featured_per_category(self):
+        """Per active category, its newest product in stock with a photo,
+        by category name (_featured_per_category_queryset)."""
+        featured = []
+        for index, (_, category_name, _, active) in enumerate(self.categories):
+            if not active:
+                continue
+            for position in self.postings(index):
+                if self.stock[position] > 0 and self.flags[position] & FLAG_PHOTO:
+                    featured.append((category_name, position))
+                    break
+        return [position for _, position in sorted(featured)]
+
+    def category_products(self, slug, query_params):
+        """Products of an active category with the optional price range
+        (CategoryViewSet.products), or None to let SQL answer (404, 500)."""
+        index = self._category_slugs.get(slug)
+        if index is None or not self.categories[index][3]:
+            return None
+        bounds = []
+        limits = (('min_price', ROUND_CEILING, -sys.maxsize), ('max_price', ROUND_FLOOR, sys.maxsize))
+        for name, rounding, default in limits:
+            value = query_params.get(name)
+            price = _parse_price(value) if value else None
+            if value and price is None:
+                return None
+            bounds.append(default if price is None else _cents(price, rounding))
+        low, high = bounds
+        return [p for p in self.postings(index) if low <= self.price[p] <= high]
+
+
+# Construction
+
+def _section(typecode, values):
+    return array.array(typecode, values)
+
+
+def _write(path, header, sections):
+    layout, blobs, offset = {}, [], 0
+    for name, data in sections.items():
+        raw = data.tobytes()
+        layout[name] = [offset, data.typecode, len(raw)]
+        blobs.append(raw + b'\0' * (-len(raw) % 8))  # alignement de chaque section
+        offset += len(blobs[-1])
+    encoded = json.dumps({**header, 'sections': layout, 'byteorder': sys.byteorder}).encode()
+    encoded += b' ' * (-(len(MAGIC) + 8 + len(encoded)) % 8)
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'wb') as file:
+        file.write(MAGIC)
+        file.write(len(encoded).to_bytes(8, 'little'))
+        file.write(encoded)
+        for blob in blobs:
+            file.write(blob)
+    os.replace(tmp, path)
+
+
+def build(path, version):
+    """Writes the snapshot of the current catalog to path."""
+    categories = list(Category.objects.order_by('id').values_list('id', 'name', 'slug', 'is_active'))
+    category_index = {row[0]: index for index, row in enumerate(categories)}
+    # Rang du nom calcule par la base : meme collation que order_by('name')
+    # du chemin SQL (PostgreSQL ne trie pas par point de code comme Python)
+    name_order = Window(RowNumber(), order_by=[F('name').asc(), F('created_at').desc(), F('id').desc()])
+    rows = list(
+        Product.objects.filter(is_available=True).annotate(name_order=name_order)
+        .order_by('-created_at', '-id').values_list(
+            'id', 'name', 'slug', 'price', 'image', 'stock', 'created_at', 'category_id', 'popularity_score',
+            'name_order',
+        )
+    )
+    image_field = Product._meta.get_field('image')
+    storage = image_field.storage
+
+    text = bytearray()
+    text_offsets = [0]
+    columns = {name: [] for name in ('id', 'price', 'stock', 'created', 'category', 'flags', 'brands', 'popularity')}
+    postings = [[] for _ in categories]
+    name_rank = []
+    suggest_keys = []
+    for position, (pk, name, slug, price, image, stock, created, category_id, popularity, name_order) in enumerate(rows):
+        image_url = webp_url = ''
+        if image:
+            image_url = storage.url(image)
+            webp = webp_path_for(image_field.attr_class(None, image_field, image))
+            if webp and storage.exists(webp):
+                webp_url = storage.url(webp)
+        text += SEPARATOR.join((name, slug, image_url, webp_url)).encode()
+        text_offsets.append(len(text))
+        columns['id'].append(pk)
+        columns['price'].append(_cents(price, ROUND_FLOOR))
+        columns['stock'].append(stock)
+        columns['created'].append(round(created.timestamp() * 1_000_000))
+        columns['category'].append(category_index[category_id])
+        # Comme exclude(image='') : NULL passe
+        columns['flags'].append(FLAG_PHOTO if image != '' else 0)
+        columns['brands'].append(product_facets.brand_mask(name))
+        columns['popularity'].append(popularity)
+        postings[category_index[category_id]].append(position)
+        name_rank.append(name_order - 1)
+        suggest_keys += [(key.encode(), position, whole) for key, whole in suggestions.word_keys(name)]
+
+    count = len(rows)
+    by_name = sorted(range(count), key=name_rank.__getitem__)
+    cat_offsets = [0]
+    for category_postings in postings:
+        cat_offsets.append(cat_offsets[-1] + len(category_postings))
+    suggest_keys.sort()
+    suggest_offsets = [0]
+    for key, _, _ in suggest_keys:
+        suggest_offsets.append(suggest_offsets[-1] + len(key))
+
+    sections = {
+        'id': _section('q', columns['id']),
+        'price': _section('q', columns['price']),
+        'stock': _section('q', columns['stock']),
+        'created': _section('q', columns['created']),
+        'category': _section('i', columns['category']),
+        'flags': _section('B', columns['flags']),
+        'brands': _section('Q', columns['brands']),
+        'popularity': _section('d', columns['popularity']),
+        'text_offsets': _section('q', text_offsets),
+        'text': _section('B', text),
+        'by_price': _section('i', sorted(range(count), key=columns['price'].__getitem__)),
+        'by_name': _section('i', by_name),
+        # Ordre par defaut inverse : plus ancien d'abord
+        'by_created': _section('i', range(count - 1, -1, -1)),
+        'by_stock': _section('i', sorted(range(count), key=columns['stock'].__getitem__)),
+        'by_id': _section('i', sorted(range(count), key=columns['id'].__getitem__)),
+        'by_popularity': _section('i', sorted(range(count), key=lambda p: -columns['popularity'][p])),
+        'name_rank': _section('i', name_rank),
+        'cat_offsets': _section('i', cat_offsets),
+        'cat_postings': _section('i', [p for category_postings in postings for p in category_postings]),
+        'suggest_offsets': _section('q', suggest_offsets),
+        'suggest_text': _section('B', b''.join(key for key, _, _ in suggest_keys)),
+        'suggest_positions': _section('i', [position for _, position, _ in suggest_keys]),
+        'suggest_first': _section('B', [whole for _, _, whole in suggest_keys]),
+    }
+    header = {
+        'version': version, 'built_at': time.time(), 'count': count, 'categories': categories,
+        'brands': product_facets.BRANDS,
+    }
+    _write(path, header, sections)
+
+
+def _pointer_key(version):
+    return f'products:v{version}:catalog:snapshot'
+
+
+def _directory():
+    directory = Path(settings.CATALOG_SNAPSHOT_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+
+def _load(version, name):
+    try:
+        snapshot = CatalogSnapshot(_directory() / name)
+    except (OSError, ValueError):
+        return None
+    return snapshot if snapshot.version == version and not snapshot.expired() else None
+
+
+def _build_shared(version):
+    """Builds the snapshot unless another worker is building one. Returns it,
+    or None if the lock is taken."""
+    directory = _directory()
+    with open(directory / 'build.lock', 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        # Un autre worker vient peut-etre de finir
+        name = cache.get(_pointer_key(version))
+        snapshot = _load(version, name) if name and (_current is None or _current.name != name) else None
+        if snapshot is not None:
+            return snapshot
+
+        start = time.perf_counter()
+        path = directory / f'catalog-v{version}-{secrets.token_hex(4)}.bin'
+        build(path, version)
+        cache.set(_pointer_key(version), path.name, timeout=settings.CATALOG_SNAPSHOT_MAX_AGE)
+        # Les workers qui mappent encore un ancien fichier le gardent (Linux)
+        for old in directory.glob('catalog-v*.bin'):
+            if old != path and time.time() - old.stat().st_mtime > 2 * settings.CATALOG_SNAPSHOT_MAX_AGE:
+                old.unlink(missing_ok=True)
+        snapshot = CatalogSnapshot(path)
+        logger.info(
+            'Snapshot du catalogue v%s : %s produits, %.0f Ko, %.0f ms',
+            version, snapshot.count, path.stat().st_size / 1024, (time.perf_counter() - start) * 1000,
+        )
+        return snapshot
+
+
+def _build_in_background(version):
+    global _current
+    try:
+        snapshot = _build_shared(version)
+        if snapshot is not None:
+            _current = snapshot
+    except Exception:
+        logger.exception('Construction du snapshot du catalogue impossible')
+    finally:
+        # Connexions ouvertes par ce thread (la requete du catalogue)
+        connections.close_all()
+
+
+def _start_build(version):
+    global _builder
+    if _builder is not None and _builder.is_alive():
+        return
+    _builder = threading.Thread(
+        target=_build_in_background, args=(version,), name='catalog-snapshot', daemon=True,
+    )
+    _builder.start()
+
+
+def _refresh(version):
+    global _current
+    name = cache.get(_pointer_key(version))
+    snapshot = _load(version, name) if name and (_current is None or _current.name != name) else None
+    if snapshot is not None:
+        _current = snapshot
+        return snapshot
+    # Construction hors de la requete ; en attendant l'ancien snapshot s'il
+    # est de cette version (seulement expire), sinon SQL
+    _start_build(version)
+    return _current if _current is not None and _current.version == version else None
+
+
+def rebuild():
+    """Builds the snapshot of the current version now, in this thread
+    (build_catalog_snapshot command, tests). Returns it, or None if another
+    worker holds the build lock."""
+    global _current
+    snapshot = _build_shared(get_cache_version())
+    if snapshot is not None:
+        _current = snapshot
+    return snapshot
+
+
+def current():
+    """Snapshot of the current catalog version, or None (use SQL)."""
+    if not settings.CATALOG_SNAPSHOT:
+        return None
+    version = get_cache_version()
+    snapshot = _current
+    if snapshot is not None and snapshot.version == version and not snapshot.expired():
+        return snapshot
+    if not _lock.acquire(blocking=False):
+        return snapshot if snapshot is not None and snapshot.version == version else None
+    try:
+        return _refresh(version)
+    except Exception:
+        logger.exception('Snapshot du catalogue indisponible, repli sur SQL')
+        return None
+    finally:
+        _lock.release()
@@ -0,0 +1,70 @@
+"""Search-as-you-type completions: GET /api/products/suggest/?q=<prefix>.
+
+Returns up to ?limit= (8 by default, MAX_RESULTS at most) available
+products, as [{name, slug}], whose name has a word starting with q. The
+comparison is accent- and case-insensitive ("tele" finds "Télévision") and
+ignores punctuation ("star x" finds "STAR-X").
+
+The catalog snapshot (snapshot.py) carries the prefix index: one key per
+word of each name (the folded name from that word on, at most KEY_LENGTH
+characters), sorted, so the keys starting with q are one range found by
+binary search. Products whose name starts with q come first, then the most
+popular. Results are remembered per query in the snapshot, and a longer
+query only searches the range of the longest shorter query already seen
+("tel" within "te"). The index is rebuilt with the snapshot, on every
+cache version.
+
+Without a snapshot, suggest() queries SQL (istartswith / icontains on the
+name, not accent-insensitive).
+"""
+import re
+import unicodedata
+
+from django.db.models import Q
+
+from .models import Product
+
+DEFAULT_RESULTS = 8
+MAX_RESULTS = 20
+# Longueur des cles de l'index : au-dela, les candidats sont verifies sur le nom
+KEY_LENGTH = 32
+
+NOT_WORD = re.compile(r'[\W_]+')
+
+
+def fold(text):
+    """Lower case, without accents, words separated by single spaces."""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return NOT_WORD.sub(' ', text.lower()).strip()
+
+
+def word_keys(name):
+    """(key, whole name) for each word of the name: the folded name from that
+    word on, cut to KEY_LENGTH characters."""
+    folded = fold(name)
+    starts = [0] + [index + 1 for index, char in enumerate(folded) if char == ' ']
+    return [(folded[start:start + KEY_LENGTH], start == 0) for start in starts if folded]
+
+
+def matches(query, name):
+    """A word of the name starts with the (folded) query."""
+    return (' ' + fold(name)).find(' ' + query) >= 0
+
+
+def parse_limit(value):
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_RESULTS
+    return min(max(limit, 1), MAX_RESULTS)
+
+
+def suggest(query, limit):
+    """SQL version, without a snapshot: [{name, slug}]."""
+    return list(
+        Product.objects.filter(is_available=True)
+        .filter(Q(name__istartswith=query) | Q(name__icontains=' ' + query))
+        .order_by('-popularity_score', 'name')
+        .values('name', 'slug')[:limit]
+    )
@@ -1,3 +1,363 @@
-from django.test import TestCase
+import bisect
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import fakeredis
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import resolve
+
+from core.async_views import read_view
+from core.testing import QueryBudgetMixin
+from . import counters, popularity, snapshot, suggestions
+from .models import Category, Product, ProductStats, ProductStatsFlush
+
+
+class SnapshotMixin:
+    """Snapshot construit a la demande (snapshot.rebuild()) dans un dossier
+    temporaire, jamais par un thread."""
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for name, value in (('_current', None), ('_start_build', mock.DEFAULT)):
+            patcher = mock.patch.object(snapshot, name, value)
+            self.start_build = patcher.start()
+            self.addCleanup(patcher.stop)
+        overrides = override_settings(CATALOG_SNAPSHOT_DIR=directory.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+
+class CatalogBudgetTests(SnapshotMixin, QueryBudgetMixin, TestCase):
+    """Budgets SQL des lectures du catalogue : un N+1 (une requete par
+    categorie, par marque, par produit) fait echouer ces tests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        names = ['OSCAR TV 32"', 'HISENSE Frigo', 'MIDEA Clim', 'Samsung Galaxy', 'JBL Flip', 'Lampe LED']
+        for index in range(4):
+            category = Category.objects.create(name=f'Categorie {index}', slug=f'categorie-{index}')
+            for number, name in enumerate(names):
+                Product.objects.create(
+                    name=f'{name} {index}', slug=f'produit-{index}-{number}', category=category,
+                    price=Decimal('10000') + number, stock=number,
+                    image=f'products/produit-{index}-{number}.jpg' if number % 2 else '',
+                )
+
+    def test_cached_hit_skips_drf_without_event_loop(self):
+        # WSGI (defaut) : vue synchrone, pas d'async_to_sync par requete
+        self.assertFalse(iscoroutinefunction(resolve('/api/products/homepage/').func))
+        self.client.get('/api/products/homepage/')
+        with mock.patch('rest_framework.views.APIView.dispatch') as dispatch:
+            hit = self.client.get('/api/products/homepage/', HTTP_ACCEPT_ENCODING='br, gzip')
+        dispatch.assert_not_called()
+        self.assertEqual(hit.status_code, 200)
+        # Corps pre-compresse a la mise en cache (core/compression.py)
+        self.assertEqual(hit['Content-Encoding'], 'br')
+        with override_settings(ASYNC_VIEWS=True):
+            self.assertTrue(iscoroutinefunction(read_view(lambda: 'key', resolve('/api/products/homepage/').func)))
+
+    def test_cached_reads_make_no_query(self):
+        for path in ('/api/products/homepage/', '/api/products/brands/', '/api/products/categories/',
+                     '/api/products/produit-0-1/'):
+            with self.subTest(path=path):
+                self.client.get(path)
+                self.assertBudget(path, db=0, storage=0)
+
+    @override_settings(CATALOG_SNAPSHOT=False)
+    def test_sql_path(self):
+        # Categories (1) et marques (2), le reste par liste de produits
+        self.assertBudget('/api/products/homepage/', db=8)
+        self.assertBudget('/api/products/brands/', db=2)
+        self.assertBudget('/api/products/categories/', db=2)
+        self.assertBudget('/api/products/featured-per-category/', db=2)
+        self.assertBudget('/api/products/', db=2)
+        self.assertBudget('/api/products/?facets=true', db=4)
+        self.assertBudget('/api/products/produit-0-1/', db=3)
+
+    def test_snapshot_built_outside_requests(self):
+        # Premiere lecture : SQL, construction confiee au thread
+        self.assertBudget('/api/products/?facets=true', db=4)
+        self.start_build.assert_called_once_with(snapshot.get_cache_version())
+        catalog = snapshot.rebuild()
+        self.assertIs(snapshot.current(), catalog)
+        # Expire : toujours servi pendant la reconstruction
+        with mock.patch.object(snapshot.CatalogSnapshot, 'expired', return_value=True):
+            self.assertIs(snapshot.current(), catalog)
+        self.assertEqual(self.start_build.call_count, 2)
+
+    def test_snapshot_path(self):
+        # Construction du snapshot : hors budget
+        self.assertIsNotNone(snapshot.rebuild())
+        # Reste en SQL : categories (1) et marques (2)
+        self.assertBudget('/api/products/homepage/', db=3, storage=0)
+        for path in ('/api/products/', '/api/products/?facets=true', '/api/products/featured/',
+                     '/api/products/popular/', '/api/products/suggest/?q=hise'):
+            with self.subTest(path=path):
+                self.assertBudget(path, db=0, storage=0)
+
+
+class SnapshotNameOrderTests(TestCase):
+    """Tri par nom du snapshot = tri SQL, quelle que soit la collation de la
+    base (casse, accents, ponctuation)."""
+
+    def test_name_order_matches_sql(self):
+        category = Category.objects.create(name='Divers', slug='divers')
+        for index, name in enumerate(['zoo', 'Zèbre', 'eclair', 'Éclair', 'abc', 'Abd', 'a-b', 'ab c', '10 ans', '9 vies']):
+            Product.objects.create(name=name, slug=f'produit-{index}', category=category, price=Decimal('1000'))
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'catalog.bin'
+            snapshot.build(path, version=1)
+            catalog = snapshot.CatalogSnapshot(path)
+            expected = list(Product.objects.order_by('name').values_list('id', flat=True))
+            self.assertEqual([catalog.id[position] for position in catalog.order('name')], expected)
+            self.assertEqual([catalog.id[position] for position in catalog.order('-name')], expected[::-1])
+
+
+class FacetsTests(SnapshotMixin, TestCase):
+    """Facettes du snapshot = facettes SQL, pour chaque combinaison de filtres."""
+
+    def setUp(self):
+        super().setUp()
+        # Prix aux bords des tranches, en stock ou non
+        prices = ['0', '499', '499.50', '500', '1499.99', '1500', '19999', '20000', '50000', '120000']
+        for index, slug in enumerate(['tv', 'froid']):
+            category = Category.objects.create(name=slug.upper(), slug=slug)
+            for number, price in enumerate(prices):
+                Product.objects.create(
+                    name=f'{("SAMSUNG", "HISENSE Frigo", "Lampe")[number % 3]} {index}-{number}',
+                    slug=f'{slug}-{number}', category=category, price=Decimal(price),
+                    stock=(number + index) % 3,
+                )
+
+    def facets(self, query):
+        response = self.client.get(f'/api/products/?facets=true&{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['facets']
+
+    def test_buckets_are_half_open(self):
+        buckets = self.facets('category=tv')['price']
+        self.assertEqual(
+            [(bucket['min_price'], bucket['max_price_exclusive'], bucket['count']) for bucket in buckets],
+            [(0, 500, 3), (500, 1500, 2), (1500, 4000, 1), (4000, 20000, 1), (20000, 50000, 1), (50000, None, 2)],
+        )
+
+    def test_snapshot_matches_sql(self):
+        queries = [
+            '&'.join(part for part in (category, prices, stock) if part)
+            for category in ('', 'category=tv', 'category=froid', 'category=inconnue')
+            for prices in ('', 'min_price=499', 'max_price=499.50', 'min_price=499.5&max_price=1500',
+                           'min_price=20000&max_price=19999')
+            for stock in ('', 'in_stock=true')
+        ]
+        with override_settings(CATALOG_SNAPSHOT=False):
+            expected = [self.facets(query) for query in queries]
+        self.assertIsNotNone(snapshot.rebuild())
+        for query, sql in zip(queries, expected):
+            with self.subTest(query=query), self.assertNumQueries(0):
+                self.assertEqual(self.facets(query), sql)
+
+
+class SuggestTests(SnapshotMixin, TestCase):
+    """Recherche instantanee dans l'index du snapshot."""
+
+    LONG_NAME = 'Réfrigérateur HISENSE double porte 250 litres classe A+ '
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Divers', slug='divers')
+        names = [
+            ('Télévision OSCAR 32"', 5), ('TELECOMMANDE universelle', 9), ('STAR-X Ventilateur', 8),
+            ('Ventilateur STARX sur pied', 1), (f'{cls.LONG_NAME}argent', 3), (f'{cls.LONG_NAME}noir', 2),
+            ("L'éclair lampe", 4), ('Tapis de sol', 7), ('Tasse', 6),
+        ]
+        for index, (name, popularity) in enumerate(names):
+            Product.objects.create(
+                name=name, slug=f'produit-{index}', category=category, price=Decimal('1000'),
+                popularity_score=popularity,
+            )
+
+    def suggest(self, q, limit=None):
+        params = {'q': q} if limit is None else {'q': q, 'limit': limit}
+        response = self.client.get('/api/products/suggest/', params)
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.json()]
+
+    def setUp(self):
+        super().setUp()
+        self.catalog = snapshot.rebuild()
+
+    def test_fold(self):
+        self.assertEqual(suggestions.fold("  Télé-Vision  L'ÉCLAIR_32 "), 'tele vision l eclair 32')
+
+    def test_accents_and_case(self):
+        # Nom entier d'abord, puis par popularite
+        self.assertEqual(self.suggest('tele'), ['TELECOMMANDE universelle', 'Télévision OSCAR 32"'])
+        self.assertEqual(self.suggest('TÉLÉV'), ['Télévision OSCAR 32"'])
+        self.assertEqual(self.suggest('ECLAIR'), ["L'éclair lampe"])
+
+    def test_punctuation(self):
+        self.assertEqual(self.suggest('star x'), ['STAR-X Ventilateur'])
+        self.assertEqual(self.suggest('star-x'), ['STAR-X Ventilateur'])
+        self.assertEqual(self.suggest('starx'), ['Ventilateur STARX sur pied'])
+        self.assertEqual(self.suggest('ventil'), ['Ventilateur STARX sur pied', 'STAR-X Ventilateur'])
+
+    def test_query_longer_than_key_length(self):
+        query = suggestions.fold(self.LONG_NAME)
+        self.assertGreater(len(query), suggestions.KEY_LENGTH)
+        self.assertEqual(self.suggest(query), [f'{self.LONG_NAME}argent', f'{self.LONG_NAME}noir'])
+        self.assertEqual(self.suggest(f'{query} noir'), [f'{self.LONG_NAME}noir'])
+        self.assertEqual(self.suggest('hisense double porte 250 litres classe a arg'), [f'{self.LONG_NAME}argent'])
+
+    def test_narrowing_matches_a_fresh_search(self):
+        path = Path(settings.CATALOG_SNAPSHOT_DIR) / self.catalog.name
+        queries = ['t', 'ta', 'tap', 'tas', 'te', 'tel', 'telecommande', 'televisions', 'r', 'refrigerateur hisense',
+                   suggestions.fold(f'{self.LONG_NAME}noir'), suggestions.fold(f'{self.LONG_NAME}argent')]
+        for query in queries:
+            with self.subTest(query=query):
+                fresh = snapshot.CatalogSnapshot(path)
+                self.assertEqual(self.catalog.suggest(query, 20), fresh.suggest(query, 20))
+        # Tranche de la plus longue requete deja vue
+        with mock.patch('bisect.bisect_left', wraps=bisect.bisect_left) as search:
+            self.catalog.suggest('tapi', 20)
+        self.assertEqual(search.call_args_list[0].args[2:4], self.catalog._suggested['tap'][:2])
+
+    def test_empty_and_one_character_queries(self):
+        for query in ('', '   ', '-', "'"):
+            with self.subTest(query=query):
+                self.assertEqual(self.suggest(query), [])
+        self.assertEqual(self.suggest('t'), [
+            'TELECOMMANDE universelle', 'Tapis de sol', 'Tasse', 'Télévision OSCAR 32"',
+        ])
+        self.assertEqual(self.suggest('t', limit=2), ['TELECOMMANDE universelle', 'Tapis de sol'])
+        self.assertEqual(self.suggest('t', limit='abc'), self.suggest('t'))
+        self.assertEqual(self.suggest('t', limit=0), ['TELECOMMANDE universelle'])
+
+
+class CountersFlushTests(TestCase):
+    """Compteurs bufferises dans Redis puis ajoutes a ProductStats."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Divers', slug='divers')
+        cls.first, cls.second = (
+            Product.objects.create(name=name, slug=name, category=category, price=Decimal('1000'))
+            for name in ('premier', 'second')
+        )
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch.object(counters, 'get_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def stats(self):
+        return {
+            stats.product_id: (stats.view_count, stats.whatsapp_click_count)
+            for stats in ProductStats.objects.all()
+        }
+
+    def test_flush(self):
+        for _ in range(3):
+            counters.record_view(self.first.id)
+        counters.record_whatsapp_click(self.second.id, 2)
+        counters.record_view(self.second.id)
+        self.assertEqual(counters.flush(), 2)
+        self.assertEqual(self.stats(), {self.first.id: (3, 0), self.second.id: (1, 2)})
+        self.assertFalse(self.redis.exists(counters._pending_key(), counters._processing_key()))
+        # Rien en attente, puis ajout aux compteurs existants
+        self.assertEqual(counters.flush(), 0)
+        counters.record_view(self.first.id)
+        counters.flush()
+        self.assertEqual(self.stats(), {self.first.id: (4, 0), self.second.id: (1, 2)})
+
+    def test_replayed_batch_is_not_counted_twice(self):
+        counters.record_view(self.first.id)
+        # Flush interrompu apres le commit, avant la suppression du lot
+        with mock.patch.object(self.redis, 'delete', side_effect=ConnectionError):
+            with self.assertRaises(ConnectionError):
+                counters.flush()
+        counters.record_view(self.first.id)
+        self.assertEqual(counters.flush(), 0)
+        self.assertEqual(self.stats(), {self.first.id: (1, 0)})
+        self.assertEqual(ProductStatsFlush.objects.count(), 1)
+        # L'evenement arrive pendant la panne est dans le lot suivant
+        counters.flush()
+        self.assertEqual(self.stats(), {self.first.id: (2, 0)})
+
+    def test_events_during_a_flush_go_to_the_next_one(self):
+        upsert = counters._upsert
+
+        def upsert_during_events(counts, batch_id=None):
+            counters.record_view(self.first.id)
+            counters.record_whatsapp_click(self.second.id)
+            return upsert(counts, batch_id)
+
+        counters.record_view(self.first.id)
+        with mock.patch.object(counters, '_upsert', side_effect=upsert_during_events):
+            counters.flush()
+        self.assertEqual(self.stats(), {self.first.id: (1, 0)})
+        counters.flush()
+        self.assertEqual(self.stats(), {self.first.id: (2, 0), self.second.id: (0, 1)})
+
+    def test_upsert_skips_deleted_products(self):
+        deleted = self.second.id
+        Product.objects.filter(id=deleted).delete()
+        counts = {f'v:{self.first.id}': 2, f'v:{deleted}': 5, f'c:{deleted}': 1, 'x:1': 3, 'v:abc': 1}
+        self.assertEqual(counters._upsert(counts), 1)
+        self.assertEqual(self.stats(), {self.first.id: (2, 0)})
+        self.assertEqual(counters._upsert({f'v:{deleted}': 1}), 0)
+
+
+class PopularTests(SnapshotMixin, TestCase):
+    """Meilleures ventes lues par pages dans le sorted set Redis."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Divers', slug='divers')
+        # Les 20 mieux classes sont indisponibles : au-dela de la premiere page
+        cls.ranked = [
+            Product.objects.create(
+                name=f'Produit {index}', slug=f'produit-{index}', category=category, price=Decimal('1000'),
+                stock=50 - index, is_available=index >= 20,
+            )
+            for index in range(30)
+        ]
+
+    def setUp(self):
+        super().setUp()
+        self.redis = fakeredis.FakeRedis()
+        self.redis.zadd(popularity._scores_key(), {product.id: 100 - index for index, product in enumerate(self.ranked)})
+        for module in (popularity, snapshot):
+            patcher = mock.patch.object(module, 'get_redis', return_value=self.redis)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def popular(self):
+        cache.clear()
+        response = self.client.get('/api/products/popular/')
+        self.assertEqual(response.status_code, 200)
+        return [item['slug'] for item in response.json()]
+
+    def test_pages_past_unavailable_products(self):
+        expected = [product.slug for product in self.ranked[20:28]]
+        with override_settings(CATALOG_SNAPSHOT=False):
+            self.assertEqual(self.popular(), expected)
+        snapshot.rebuild()
+        self.assertEqual(self.popular(), expected)
+
+    def test_pages_stop_when_the_ranking_runs_out(self):
+        self.assertEqual(list(popularity.top_product_id_pages(16)), [
+            [product.id for product in self.ranked[:16]], [product.id for product in self.ranked[16:]],
+        ])
+        # Classement epuise : complete par le stock le plus bas
+        self.redis.zrem(popularity._scores_key(), *[product.id for product in self.ranked[22:]])
+        with override_settings(CATALOG_SNAPSHOT=False):
+            slugs = self.popular()
+        self.assertEqual(slugs, ['produit-20', 'produit-21', *(f'produit-{index}' for index in range(29, 23, -1))])
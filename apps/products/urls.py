@@ -1,5 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from .async_views import with_async_reads
 from .views import CategoryViewSet, ProductViewSet
 
 # Create router
@@ -10,5 +11,6 @@ router.register(r'categories', CategoryViewSet, basename='category')
 router.register(r'', ProductViewSet, basename='product')
 
 urlpatterns = [
-    path('', include(router.urls)),
+    # Lectures en cache servies sans DRF, par des vues async sous ASGI (voir async_views.py)
+    path('', include(with_async_reads(router.urls))),
 ]
\ No newline at end of file
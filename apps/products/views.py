@@ -1,13 +1,19 @@
+import operator
 from decimal import Decimal, InvalidOperation
+from functools import reduce
 
 from django.core.cache import cache
-from django.db.models import OuterRef, Subquery
+from django.db.models import Count, OuterRef, Q, Subquery
 from rest_framework import viewsets, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from core.compression import cache_payload
+from . import facets, snapshot, suggestions
 from .cache import TTL_DETAIL, TTL_MEDIUM, TTL_SHORT, bump_cache_version, versioned_key
+from .counters import record_view
 from .models import Category, Product, ProductImage
 from .permissions import IsStaffOrReadOnly
+from .popularity import top_product_id_pages
 from .serializers import (
     CategorySerializer,
     ProductSerializer,
@@ -18,6 +24,15 @@ from .serializers import (
 )
 
 
+def _active_categories():
+    """Active categories with their available product count (read by
+    CategorySerializer), in the same query instead of one per category."""
+    # order_by explicite : Meta.ordering est ignore avec un GROUP BY
+    return Category.objects.filter(is_active=True).annotate(
+        available_product_count=Count('products', filter=Q(products__is_available=True))
+    ).order_by('name')
+
+
 def _featured_per_category_queryset():
     """One product per active category (most recent, in stock, with a photo),
     fetched in 2 queries total instead of 1-per-category (N+1)."""
@@ -50,7 +65,7 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
     list: Retourne toutes les catégories actives
     retrieve: Retourne une catégorie spécifique avec ses produits
     """
-    queryset = Category.objects.filter(is_active=True)
+    queryset = _active_categories()
     serializer_class = CategorySerializer
     lookup_field = 'slug'
 
@@ -60,12 +75,18 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
         if cached is not None:
             return Response(cached)
         response = super().list(request, *args, **kwargs)
-        cache.set(key, response.data, TTL_MEDIUM)
+        cache_payload(key, response.data, TTL_MEDIUM)
         return response
 
     @action(detail=True, methods=['get'])
     def products(self, request, slug=None):
         """Retourne tous les produits d'une catégorie"""
+        # Catalogue en memoire (snapshot.py) : sans SQL
+        catalog = snapshot.current()
+        positions = catalog.category_products(slug, request.query_params) if catalog else None
+        if positions is not None:
+            return Response(catalog.list_items(positions, request))
+
         category = self.get_object()
         products = category.products.filter(is_available=True).select_related('category')
 
@@ -114,28 +135,37 @@ class ProductViewSet(viewsets.ModelViewSet):
             return ProductCreateUpdateSerializer
         return ProductSerializer
 
-    def get_queryset(self):
-        """Filtre personnalisé des produits"""
-        queryset = super().get_queryset()
+    def _filters(self, query_params):
+        """Q de chaque filtre actif de la liste, par facette (Q() sinon)."""
+        filters = {'category': Q(), 'price': Q(), 'stock': Q()}
 
         # Filtrer par catégorie (slug)
-        category_slug = self.request.query_params.get('category')
+        category_slug = query_params.get('category')
         if category_slug:
-            queryset = queryset.filter(category__slug=category_slug)
+            filters['category'] = Q(category__slug=category_slug)
 
         # Filtrer par prix
-        min_price = self.request.query_params.get('min_price')
-        max_price = self.request.query_params.get('max_price')
+        min_price = query_params.get('min_price')
+        max_price = query_params.get('max_price')
 
         if min_price:
-            queryset = queryset.filter(price__gte=min_price)
+            filters['price'] &= Q(price__gte=min_price)
         if max_price:
-            queryset = queryset.filter(price__lte=max_price)
+            filters['price'] &= Q(price__lte=max_price)
 
         # Filtrer par disponibilité en stock
-        in_stock_only = self.request.query_params.get('in_stock')
+        in_stock_only = query_params.get('in_stock')
         if in_stock_only and in_stock_only.lower() == 'true':
-            queryset = queryset.filter(stock__gt=0)
+            filters['stock'] = Q(stock__gt=0)
+
+        return filters
+
+    def get_queryset(self):
+        """Filtre personnalisé des produits"""
+        queryset = super().get_queryset()
+        for condition in self._filters(self.request.query_params).values():
+            if condition:
+                queryset = queryset.filter(condition)
 
         # Tri
         sort_by = self.request.query_params.get('sort_by')
@@ -143,19 +173,73 @@ class ProductViewSet(viewsets.ModelViewSet):
             queryset = queryset.order_by(self.SORT_MAP[sort_by])
 
         return queryset
-    
+
+    def _snapshot_filters(self, request):
+        """Catalogue en memoire et filtres de la requete, ou (None, None) :
+        repli sur get_queryset (recherche, prix invalide, snapshot absent)."""
+        catalog = snapshot.current()
+        filters = catalog and snapshot.list_filters(request.query_params, self.SORT_MAP)
+        return (catalog, filters) if filters else (None, None)
+
+    def list(self, request, *args, **kwargs):
+        catalog, filters = self._snapshot_filters(request)
+        if catalog is None:
+            response = super().list(request, *args, **kwargs)
+        else:
+            positions = catalog.select(**filters)
+            page = self.paginate_queryset(positions)
+            if page is None:
+                return Response(catalog.list_items(positions, request))
+            response = self.get_paginated_response(catalog.list_items(page, request))
+        # ?facets=true : comptes par categorie, tranche de prix, marque et stock
+        if (request.query_params.get('facets') or '').lower() == 'true' and isinstance(response.data, dict):
+            response.data['facets'] = catalog.facets(**filters) if catalog is not None else self._facets_data(request)
+        return response
+
+    def _facets_data(self, request):
+        """Facettes en SQL (recherche, snapshot absent) : une requete agregee."""
+        queryset = self.filter_queryset(super().get_queryset())
+        categories = list(Category.objects.filter(is_active=True).values_list('id', 'slug', 'name'))
+        return facets.aggregate(queryset, self._filters(request.query_params), categories)
+
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        """Complétions du nom pour la recherche instantanée :
+        ?q=<début d'un mot>&limit=8, renvoie [{name, slug}]."""
+        query = suggestions.fold(request.query_params.get('q', ''))
+        if not query:
+            return Response([])
+        limit = suggestions.parse_limit(request.query_params.get('limit'))
+        catalog = snapshot.current()
+        if catalog is None:
+            return Response(suggestions.suggest(request.query_params['q'].strip(), limit))
+        return Response([
+            {'name': name, 'slug': slug}
+            for name, slug, _, _ in map(catalog.text_fields, catalog.suggest(query, limit))
+        ])
+
     def retrieve(self, request, *args, **kwargs):
         slug = kwargs.get(self.lookup_url_kwarg or self.lookup_field)
         key = versioned_key('product', 'detail', slug)
         cached = cache.get(key)
         if cached is not None:
+            record_view(cached['id'])
             return Response(cached)
         response = super().retrieve(request, *args, **kwargs)
-        cache.set(key, response.data, TTL_DETAIL)
+        cache_payload(key, response.data, TTL_DETAIL)
+        record_view(response.data['id'])
         return response
 
+    FEATURED_LIMIT = 8
+
     def _featured_queryset(self):
-        return self.get_queryset().filter(stock__gt=0)[:8]
+        return self.get_queryset().filter(stock__gt=0)[:self.FEATURED_LIMIT]
+
+    def _featured_data(self, request):
+        catalog, filters = self._snapshot_filters(request)
+        if catalog is not None:
+            return catalog.list_items(catalog.featured(self.FEATURED_LIMIT, **filters), request)
+        return ProductListSerializer(self._featured_queryset(), many=True, context={'request': request}).data
 
     @action(detail=False, methods=['get'])
     def featured(self, request):
@@ -164,25 +248,49 @@ class ProductViewSet(viewsets.ModelViewSet):
         cached = cache.get(key)
         if cached is not None:
             return Response(cached)
-        serializer = ProductListSerializer(self._featured_queryset(), many=True, context={'request': request})
-        cache.set(key, serializer.data, TTL_SHORT)
-        return Response(serializer.data)
+        data = self._featured_data(request)
+        cache_payload(key, data, TTL_SHORT)
+        return Response(data)
+
+    POPULAR_LIMIT = 8
 
     def _popular_queryset(self):
-        # Pour l'instant, produits avec le moins de stock restant (proxy de vente
-        # rapide) ; a remplacer par un vrai compteur de ventes des qu'il existe.
-        return self.get_queryset().order_by('stock')[:8]
+        # Top-K lu dans le sorted set Redis des ventes (voir popularity.py),
+        # sans tri SQL ; complete par l'ancien proxy (stock le plus bas) tant
+        # qu'il n'y a pas encore assez de ventes enregistrees.
+        limit = self.POPULAR_LIMIT
+        products = []
+        # Pages suivantes tant que des produits classes sont indisponibles
+        for ids in top_product_id_pages(limit * 2):
+            by_id = self.get_queryset().in_bulk(ids)
+            products += [by_id[pk] for pk in ids if pk in by_id]
+            if len(products) >= limit:
+                break
+        products = products[:limit]
+        if len(products) < limit:
+            products += list(
+                self.get_queryset()
+                .exclude(id__in=[p.id for p in products])
+                .order_by('stock')[:limit - len(products)]
+            )
+        return products
+
+    def _popular_data(self, request):
+        catalog, filters = self._snapshot_filters(request)
+        if catalog is not None:
+            return catalog.list_items(catalog.popular(self.POPULAR_LIMIT, **filters), request)
+        return ProductListSerializer(self._popular_queryset(), many=True, context={'request': request}).data
 
     @action(detail=False, methods=['get'])
     def popular(self, request):
-        """Retourne les produits populaires (basé sur le stock vendu)"""
+        """Retourne les produits populaires (basé sur les ventes récentes)"""
         key = versioned_key('products', 'popular')
         cached = cache.get(key)
         if cached is not None:
             return Response(cached)
-        serializer = ProductListSerializer(self._popular_queryset(), many=True, context={'request': request})
-        cache.set(key, serializer.data, TTL_SHORT)
-        return Response(serializer.data)
+        data = self._popular_data(request)
+        cache_payload(key, data, TTL_SHORT)
+        return Response(data)
 
     @action(detail=False, methods=['get'], url_path='featured-per-category')
     def featured_per_category(self, request):
@@ -191,39 +299,42 @@ class ProductViewSet(viewsets.ModelViewSet):
         cached = cache.get(key)
         if cached is not None:
             return Response(cached)
-        serializer = ProductListSerializer(
-            _featured_per_category_queryset(), many=True, context={'request': request}
-        )
-        cache.set(key, serializer.data, TTL_SHORT)
-        return Response(serializer.data)
+        data = self._featured_per_category_data(request)
+        cache_payload(key, data, TTL_SHORT)
+        return Response(data)
 
-    # Vraies marques presentes dans le catalogue (pas de "partenariat" invente) :
-    # on ne montre que celles ayant au moins un produit reel en stock.
-    KNOWN_BRANDS = [
-        'OSCAR', 'HISENSE', 'MIDEA', 'INNOVA', 'TOBI', 'FODEG Star', 'GIFTMAX',
-        'Sylver Crest', 'STAR-X', 'STARX', 'Light Wave', 'JBL', 'Grious', 'DORAGYM',
-        'RMG', 'VISION', 'SAMSUNG', 'LG', 'SONAR', 'Hoffmans',
-    ]
+    def _featured_per_category_data(self, request):
+        catalog = snapshot.current()
+        if catalog is not None:
+            return catalog.list_items(catalog.featured_per_category(), request)
+        return ProductListSerializer(_featured_per_category_queryset(), many=True, context={'request': request}).data
 
     def _brands_data(self, request):
+        # 2 requetes au lieu de 2 par marque : les comptes en un aggregate,
+        # puis les produits avec photo des marques trouvees, du plus recent au
+        # plus ancien, jusqu'a avoir une photo par marque
         queryset = self.get_queryset()
-        results = []
-        seen_upper = set()
-        for brand in self.KNOWN_BRANDS:
-            key = brand.upper()
-            if key in seen_upper:
-                continue
-            matches = queryset.filter(name__icontains=brand)
-            count = matches.count()
-            if count == 0:
-                continue
-            seen_upper.add(key)
-            sample = matches.exclude(image='').first()
-            results.append({
+        found = [(bit, brand, count) for bit, (brand, count) in enumerate(facets.brand_counts(queryset)) if count]
+        samples = {}
+        if found:
+            photos = queryset.exclude(image='').filter(
+                reduce(operator.or_, (Q(name__icontains=brand) for _, brand, _ in found))
+            ).order_by('-created_at')
+            for product in photos.iterator(chunk_size=100):
+                mask = facets.brand_mask(product.name)
+                for bit, brand, _ in found:
+                    if mask & (1 << bit) and brand not in samples:
+                        samples[brand] = product
+                if len(samples) == len(found):
+                    break
+        results = [
+            {
                 'name': brand,
                 'product_count': count,
-                'image_url': _absolute_image_url(sample, request) if sample else None,
-            })
+                'image_url': _absolute_image_url(samples[brand], request) if brand in samples else None,
+            }
+            for _, brand, count in found
+        ]
         results.sort(key=lambda b: -b['product_count'])
         return results
 
@@ -236,7 +347,7 @@ class ProductViewSet(viewsets.ModelViewSet):
         if cached is not None:
             return Response(cached)
         data = self._brands_data(request)
-        cache.set(key, data, TTL_MEDIUM)
+        cache_payload(key, data, TTL_MEDIUM)
         return Response(data)
 
     @action(detail=False, methods=['get'])
@@ -251,17 +362,13 @@ class ProductViewSet(viewsets.ModelViewSet):
 
         ctx = {'request': request}
         data = {
-            'featured': ProductListSerializer(self._featured_queryset(), many=True, context=ctx).data,
-            'popular': ProductListSerializer(self._popular_queryset(), many=True, context=ctx).data,
-            'featured_per_category': ProductListSerializer(
-                _featured_per_category_queryset(), many=True, context=ctx
-            ).data,
-            'categories': CategorySerializer(
-                Category.objects.filter(is_active=True), many=True, context=ctx
-            ).data,
+            'featured': self._featured_data(request),
+            'popular': self._popular_data(request),
+            'featured_per_category': self._featured_per_category_data(request),
+            'categories': CategorySerializer(_active_categories(), many=True, context=ctx).data,
             'brands': self._brands_data(request),
         }
-        cache.set(key, data, TTL_SHORT)
+        cache_payload(key, data, TTL_SHORT)
         return Response(data)
 
     @action(detail=True, methods=['get'])
@@ -280,7 +387,7 @@ class ProductViewSet(viewsets.ModelViewSet):
             .order_by('?')[:4]  # 4 produits aléatoires
         )
         serializer = ProductListSerializer(related_products, many=True, context={'request': request})
-        cache.set(key, serializer.data, TTL_SHORT)
+        cache_payload(key, serializer.data, TTL_SHORT)
         return Response(serializer.data)
 
     @action(detail=True, methods=['post'], url_path='images')
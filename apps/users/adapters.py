@@ -27,13 +27,11 @@ class CustomSocialAccountAdapter(DefaultSocialAccountAdapter):
         if not email:
             return
         
-        # Chercher un utilisateur avec cet email
-        try:
-            user = User.objects.get(email=email)
+        # Chercher un utilisateur avec cet email (colonne normalisée indexée)
+        user = User.objects.filter(email_normalized=email).first()
+        if user is not None:
             # Connecter le compte social à l'utilisateur existant
             sociallogin.connect(request, user)
-        except User.DoesNotExist:
-            pass
     
     def populate_user(self, request, sociallogin, data):
         """
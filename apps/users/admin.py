@@ -1,11 +1,39 @@
 from django.contrib import admin
+from django.contrib.auth import forms as auth_forms
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.html import format_html
-from .models import User
+from .authentication import invalidate_cached_user
+from .models import DUPLICATE_MESSAGES, User
+
+
+class UniqueIdentifiersFormMixin:
+    """Email et téléphone déjà utilisés sous leur forme normalisée : erreur
+    sur le champ plutôt qu'une IntegrityError à l'enregistrement."""
+
+    def clean(self):
+        cleaned_data = super().clean()
+        conflicts = User.identifier_conflicts(
+            email=cleaned_data.get('email'), phone=cleaned_data.get('phone'), exclude_pk=self.instance.pk,
+        )
+        for field in conflicts:
+            self.add_error(field if field in self.fields else None, DUPLICATE_MESSAGES[field])
+        return cleaned_data
+
+
+class UserChangeForm(UniqueIdentifiersFormMixin, auth_forms.UserChangeForm):
+    class Meta(auth_forms.UserChangeForm.Meta):
+        model = User
+
+
+class UserCreationForm(UniqueIdentifiersFormMixin, auth_forms.UserCreationForm):
+    class Meta(auth_forms.UserCreationForm.Meta):
+        model = User
 
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
+    form = UserChangeForm
+    add_form = UserCreationForm
     list_display = [
         'username', 'email', 'phone', 'full_name',
         'user_type_badge', 'is_verified_badge', 
@@ -78,26 +106,35 @@ class UserAdmin(BaseUserAdmin):
     
     actions = ['verify_users', 'unverify_users', 'activate_users', 'deactivate_users']
     
+    def _update_and_invalidate(self, queryset, **fields):
+        """update() ne declenche pas post_save : vider a la main le cache
+        d'authentification (une desactivation doit prendre effet tout de suite)"""
+        user_ids = list(queryset.values_list('pk', flat=True))
+        updated = queryset.update(**fields)
+        for user_id in user_ids:
+            invalidate_cached_user(user_id)
+        return updated
+    
     def verify_users(self, request, queryset):
         """Action pour vérifier les utilisateurs"""
-        updated = queryset.update(is_verified=True)
+        updated = self._update_and_invalidate(queryset, is_verified=True)
         self.message_user(request, f'{updated} utilisateur(s) vérifié(s).')
     verify_users.short_description = "Marquer comme vérifié"
     
     def unverify_users(self, request, queryset):
         """Action pour retirer la vérification"""
-        updated = queryset.update(is_verified=False)
+        updated = self._update_and_invalidate(queryset, is_verified=False)
         self.message_user(request, f'{updated} utilisateur(s) non vérifié(s).')
     unverify_users.short_description = "Retirer la vérification"
     
     def activate_users(self, request, queryset):
         """Action pour activer les utilisateurs"""
-        updated = queryset.update(is_active=True)
+        updated = self._update_and_invalidate(queryset, is_active=True)
         self.message_user(request, f'{updated} utilisateur(s) activé(s).')
     activate_users.short_description = "Activer les comptes"
     
     def deactivate_users(self, request, queryset):
         """Action pour désactiver les utilisateurs"""
-        updated = queryset.update(is_active=False)
+        updated = self._update_and_invalidate(queryset, is_active=False)
         self.message_user(request, f'{updated} utilisateur(s) désactivé(s).')
     deactivate_users.short_description = "Désactiver les comptes"
\ No newline at end of file
@@ -0,0 +1,92 @@
+"""JWT authentication that resolves the user from a short-lived cache.
+
+simplejwt's JWTAuthentication loads the User row on every authenticated
+request, including the catalog GETs where the user only matters for
+throttling and permissions. Here safe requests read a small dict from the
+shared cache (Redis, SHARED_TTL) and only fall back to the database on a
+miss.
+
+The cache holds AUTH_FIELDS and the hash simplejwt compares for
+CHECK_REVOKE_TOKEN, never the whole row: no password hash, email or phone
+in Redis. The user is rebuilt from it with the other fields deferred, so
+code that reads them still gets the database values (one query per field:
+views that need the full profile reload the row, see ProfileView).
+
+Saving or deleting a user (profile edit, password change, deactivation)
+drops the entry (see signals.py), and every worker sees it on the next
+request. Write requests (POST, PUT, PATCH, DELETE) always load a fresh row,
+so a partial copy can never be saved back over newer data.
+"""
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import User
+
+SHARED_TTL = 60 * 5   # 5 min dans Redis
+
+# Champs utiles aux permissions et aux throttles, rien de plus
+AUTH_FIELDS = ('id', 'username', 'is_active', 'is_staff', 'is_superuser')
+REVOKE_HASH = 'revoke_hash'
+
+
+def _cache_key(user_id) -> str:
+    return f'users:auth:{user_id}'
+
+
+def get_cached_user(user_id):
+    """(user, revoke hash) from the shared cache, or (None, None)."""
+    entry = cache.get(_cache_key(user_id))
+    if entry is None:
+        return None, None
+    # from_db veut les valeurs dans l'ordre des champs du modele ; les champs
+    # absents sont differes (lus en base s'ils sont utilises)
+    names = [field.attname for field in User._meta.concrete_fields if field.attname in AUTH_FIELDS]
+    user = User.from_db('default', names, [entry[name] for name in names])
+    return user, entry[REVOKE_HASH]
+
+
+def cache_user(user) -> None:
+    entry = {name: getattr(user, name) for name in AUTH_FIELDS}
+    entry[REVOKE_HASH] = get_md5_hash_password(user.password)
+    cache.set(_cache_key(user.pk), entry, SHARED_TTL)
+
+
+def invalidate_cached_user(user_id) -> None:
+    cache.delete(_cache_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def authenticate(self, request):
+        self._use_cache = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        if not getattr(self, '_use_cache', False):
+            user = super().get_user(validated_token)
+            cache_user(user)
+            return user
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        user, revoke_hash = get_cached_user(user_id)
+        if user is None:
+            user = super().get_user(validated_token)
+            cache_user(user)
+            return user
+
+        # Memes controles que simplejwt, sur les champs en cache
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != revoke_hash:
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
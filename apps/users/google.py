@@ -0,0 +1,193 @@
+"""Offline verification of Google id_tokens.
+
+allauth's GoogleOAuth2Adapter downloads Google's signing certificates on
+every login before checking the id_token signature: one synchronous HTTPS
+round trip per social login, and a failed login whenever egress is slow.
+
+Here the key set (JWKS) is kept in memory and in the shared cache for as
+long as Google's Cache-Control header allows (usually several hours).
+Shortly before it expires, a background thread fetches the new set while
+requests keep using the current one. A synchronous fetch only happens on a
+cold start with an empty shared cache, or when a token is signed with an
+unknown kid (key rotation), and then at most once per MIN_REFETCH_INTERVAL.
+
+Where the keys come from is pluggable (GOOGLE_JWKS_SOURCE setting, or
+set_key_source() in tests): any object with a fetch() method that returns
+(jwks_dict, max_age_seconds). StaticKeySource serves a fixed set.
+"""
+import logging
+import re
+import threading
+import time
+
+import jwt
+from allauth.socialaccount.adapter import get_adapter
+from allauth.socialaccount.internal.jwtkit import verify_jti
+from allauth.socialaccount.providers.google.views import GoogleOAuth2Adapter as AllauthGoogleOAuth2Adapter
+from allauth.socialaccount.providers.oauth2.client import OAuth2Error
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+JWKS_URL = 'https://www.googleapis.com/oauth2/v3/certs'
+ISSUERS = ('https://accounts.google.com', 'accounts.google.com')
+
+DEFAULT_MAX_AGE = 60 * 60      # si Google n'envoie pas de Cache-Control
+REFRESH_MARGIN = 60 * 5        # rafraichir en arriere-plan 5 min avant expiration
+MIN_REFETCH_INTERVAL = 60      # kid inconnu : pas plus d'un telechargement par minute
+SHARED_CACHE_KEY = 'users:google:jwks'
+
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+
+class HTTPKeySource:
+    """Downloads the JWKS and derives its lifetime from the cache headers."""
+
+    def __init__(self, url=JWKS_URL, timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    def fetch(self):
+        with get_adapter().get_requests_session() as sess:
+            response = sess.get(self.url, timeout=self.timeout)
+            response.raise_for_status()
+        match = _MAX_AGE_RE.search(response.headers.get('Cache-Control', ''))
+        max_age = int(match.group(1)) if match else DEFAULT_MAX_AGE
+        max_age -= int(response.headers.get('Age', 0) or 0)
+        return response.json(), max(max_age, 0)
+
+
+class StaticKeySource:
+    """Fixed key set, e.g. a locally generated key in tests."""
+
+    def __init__(self, jwks, max_age=DEFAULT_MAX_AGE):
+        self.jwks = jwks
+        self.max_age = max_age
+
+    def fetch(self):
+        return self.jwks, self.max_age
+
+
+class KeySet:
+    """Google's signing keys by kid, refreshed ahead of expiry."""
+
+    def __init__(self, source):
+        self.source = source
+        self._keys = {}
+        self._expires_at = 0.0
+        self._last_fetch = 0.0
+        self._lock = threading.Lock()
+        # Distinct de _lock, tenu pendant tout le telechargement
+        self._refreshing_lock = threading.Lock()
+        self._refreshing = False
+
+    def get_key(self, kid):
+        now = time.time()
+        if not self._keys:
+            self._load_shared() or self._refresh()
+        elif now >= self._expires_at - REFRESH_MARGIN:
+            self._refresh_in_background()
+
+        key = self._keys.get(kid)
+        if key is None and time.time() - self._last_fetch >= MIN_REFETCH_INTERVAL:
+            # Nouvelle cle pas encore connue : Google vient de faire une rotation
+            self._refresh()
+            key = self._keys.get(kid)
+        if key is None:
+            raise OAuth2Error(f"Invalid 'kid': '{kid}'")
+        return key
+
+    def _load_shared(self) -> bool:
+        """Another worker may already have fetched the set."""
+        cached = cache.get(SHARED_CACHE_KEY)
+        if not cached:
+            return False
+        jwks, expires_at = cached
+        self._install(jwks, expires_at)
+        return True
+
+    def _refresh(self):
+        with self._lock:
+            self._last_fetch = time.time()
+            jwks, max_age = self.source.fetch()
+            expires_at = time.time() + max_age
+            self._install(jwks, expires_at)
+            if max_age:
+                cache.set(SHARED_CACHE_KEY, (jwks, expires_at), max_age)
+
+    def _refresh_in_background(self):
+        with self._refreshing_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._background_refresh, name='google-jwks-refresh', daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            # Un autre worker a peut-etre deja rafraichi le cache partage
+            cached = cache.get(SHARED_CACHE_KEY)
+            if cached and cached[1] - REFRESH_MARGIN > time.time():
+                self._install(*cached)
+            else:
+                self._refresh()
+        except Exception:
+            # On garde les cles actuelles ; nouvel essai a la prochaine requete
+            logger.warning("Echec du rafraichissement des cles Google", exc_info=True)
+        finally:
+            self._refreshing = False
+
+    def _install(self, jwks, expires_at):
+        keys = {}
+        for jwk in jwks.get('keys', []):
+            try:
+                keys[jwk['kid']] = jwt.PyJWK(jwk)
+            except (KeyError, jwt.PyJWTError):
+                logger.warning("Cle Google ignoree: %s", jwk.get('kid'))
+        self._keys = keys
+        self._expires_at = expires_at
+
+
+_key_set = None
+
+
+def get_key_set() -> KeySet:
+    global _key_set
+    if _key_set is None:
+        source_path = getattr(settings, 'GOOGLE_JWKS_SOURCE', None)
+        _key_set = KeySet(import_string(source_path)() if source_path else HTTPKeySource())
+    return _key_set
+
+
+def set_key_source(source) -> None:
+    """Replaces the key source (tests, or a local stand-in without egress)."""
+    global _key_set
+    _key_set = KeySet(source)
+
+
+def verify_id_token(credential, audience) -> dict:
+    """Checks signature, issuer, audience and expiry of a Google id_token
+    without any network call when the keys are cached."""
+    try:
+        header = jwt.get_unverified_header(credential)
+        key = get_key_set().get_key(header.get('kid'))
+        data = jwt.decode(
+            credential,
+            key=key.key,
+            algorithms=[key.algorithm_name],
+            audience=audience,
+            issuer=ISSUERS,
+            options={'require': ['exp', 'iss', 'aud', 'sub']},
+        )
+    except jwt.PyJWTError as e:
+        raise OAuth2Error("Invalid id_token") from e
+    verify_jti(data)
+    return data
+
+
+class GoogleOAuth2Adapter(AllauthGoogleOAuth2Adapter):
+    """allauth's adapter with the id_token checked against the cached keys."""
+
+    def _decode_id_token(self, app, id_token):
+        return verify_id_token(id_token, audience=app.client_id)
@@ -0,0 +1,61 @@
+"""Password hashing: a tunable scrypt hasher and a bounded hashing pool.
+
+PBKDF2 with Django's default iteration count costs a few hundred ms of CPU
+per login. hashlib.scrypt (stdlib, OpenSSL) reaches a comparable security
+level for a fraction of that, and its cost is tuned with SCRYPT_WORK_FACTOR.
+Existing PBKDF2 hashes keep working: check_password() reports them as
+needing an upgrade and the login view re-hashes them with scrypt.
+
+Under ASGI (ASYNC_VIEWS), hashing runs in a small dedicated thread pool
+(PASSWORD_HASH_WORKERS threads). hashlib releases the GIL while it hashes,
+so a burst of logins uses at most that many cores per process, and the
+async login view awaits the pool while the other requests keep being
+served. Under WSGI (sync workers, the default) the login holds its worker
+whatever happens, so the password is hashed inline, without the pool.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import ScryptPasswordHasher as DjangoScryptPasswordHasher
+from django.contrib.auth.hashers import check_password, make_password
+
+
+class ScryptPasswordHasher(DjangoScryptPasswordHasher):
+    """Scrypt avec un cout reglable depuis les settings (SCRYPT_WORK_FACTOR,
+    SCRYPT_BLOCK_SIZE, SCRYPT_PARALLELISM). Meme identifiant "scrypt" que le
+    hasher de Django : les hashs restent lisibles si on revient a celui-ci, et
+    un changement de cout declenche une remise a niveau a la connexion."""
+
+    work_factor = getattr(settings, 'SCRYPT_WORK_FACTOR', DjangoScryptPasswordHasher.work_factor)
+    block_size = getattr(settings, 'SCRYPT_BLOCK_SIZE', DjangoScryptPasswordHasher.block_size)
+    parallelism = getattr(settings, 'SCRYPT_PARALLELISM', DjangoScryptPasswordHasher.parallelism)
+    # Memoire requise par scrypt : 128 * n * r * p octets, plus une marge.
+    # La limite par defaut d'OpenSSL (32 Mo) refuserait un cout plus eleve.
+    maxmem = 2 * 128 * work_factor * block_size * parallelism
+
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'PASSWORD_HASH_WORKERS', 2),
+    thread_name_prefix='password-hash',
+)
+
+
+def _verify(raw_password, encoded):
+    """Returns (is_correct, upgraded_hash_or_None). Pure CPU, no DB access."""
+    needs_upgrade = []
+    is_correct = check_password(raw_password, encoded, setter=needs_upgrade.append)
+    if is_correct and needs_upgrade:
+        return True, make_password(raw_password)
+    return is_correct, None
+
+
+async def averify_password(raw_password, encoded):
+    """Checks a password in the hashing pool without blocking the event loop.
+    Returns (is_correct, upgraded_hash_or_None)."""
+    if not settings.ASYNC_VIEWS:
+        # WSGI : la boucle d'evenements ne sert que cette requete, le pool
+        # ne libererait rien et couterait un passage par un thread
+        return _verify(raw_password, encoded)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, _verify, raw_password, encoded)
@@ -0,0 +1,51 @@
+"""Nettoie les tables de simplejwt (OutstandingToken / BlacklistedToken).
+
+Avec Redis, les nouveaux tokens n'y ecrivent plus rien (voir
+apps/users/tokens.py) ; ces tables ne contiennent que l'historique des
+anciens deploiements et les ecritures faites en repli sans Redis.
+
+1. recopie dans Redis les tokens blacklistes en base et pas encore expires
+   (la verification le fait aussi d'elle-meme pour les lignes plus recentes
+   que la derniere recopie, voir sync_db_blacklist) ;
+2. supprime les tokens expires par lots (les BlacklistedToken suivent en
+   cascade), sans verrouiller la table d'un bloc comme flushexpiredtokens.
+
+A lancer au deploiement puis une fois par jour, par ex. sur le VPS :
+    0 4 * * * docker exec erols_web python manage.py purge_jwt_tokens
+"""
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+from apps.users.tokens import sync_db_blacklist
+from core.redis import get_redis
+
+
+class Command(BaseCommand):
+    help = "Purge par lots les tokens JWT expires et synchronise la blacklist Redis."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        now = aware_utcnow()
+
+        client = get_redis()
+        synced = 0
+        if client is not None:
+            synced = sync_db_blacklist(client, batch_size=batch_size)
+
+        deleted = 0
+        expired = OutstandingToken.objects.filter(expires_at__lte=now)
+        while True:
+            ids = list(expired.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            OutstandingToken.objects.filter(id__in=ids).delete()
+            deleted += len(ids)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Termine : {deleted} token(s) expire(s) supprime(s), "
+            f"{synced} entree(s) de blacklist recopiee(s) dans Redis."
+        ))
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:53
+
+from django.db import migrations, models
+
+from core.utils import normalize_email, normalize_phone
+
+
+def backfill_login_identifiers(apps, schema_editor):
+    """Remplit les identifiants normalises des comptes existants. En cas de
+    doublon (meme email a la casse pres, meme numero ecrit differemment),
+    seul le compte le plus ancien garde l'identifiant : les autres restent
+    joignables par username et le recupereront en corrigeant leur profil."""
+    User = apps.get_model('users', 'User')
+    seen_emails, seen_phones = set(), set()
+    to_update = []
+    for user in User.objects.order_by('id').only('id', 'email', 'phone'):
+        email = normalize_email(user.email)
+        phone = normalize_phone(user.phone)
+        user.email_normalized = email if email not in seen_emails else None
+        user.phone_e164 = phone if phone not in seen_phones else None
+        seen_emails.add(email)
+        seen_phones.add(phone)
+        to_update.append(user)
+    User.objects.bulk_update(to_update, ['email_normalized', 'phone_e164'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_alter_user_phone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='email_normalized',
+            field=models.CharField(editable=False, max_length=254, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='phone_e164',
+            field=models.CharField(editable=False, max_length=16, null=True),
+        ),
+        migrations.RunPython(backfill_login_identifiers, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='user',
+            name='email_normalized',
+            field=models.CharField(editable=False, max_length=254, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='phone_e164',
+            field=models.CharField(editable=False, max_length=16, null=True, unique=True),
+        ),
+    ]
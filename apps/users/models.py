@@ -1,6 +1,15 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from core.utils import normalize_email, normalize_phone
+
+# Messages des identifiants deja utilises (serializers, admin)
+DUPLICATE_MESSAGES = {
+    'username': "Ce nom d'utilisateur est déjà pris.",
+    'email': "Cet email est déjà utilisé.",
+    'phone': "Ce numéro de téléphone est déjà utilisé.",
+}
+
 
 class User(AbstractUser):
     USER_TYPES = (
@@ -15,6 +24,12 @@ class User(AbstractUser):
     address = models.TextField(blank=True)
     city = models.CharField(max_length=100, default='Douala')
     is_verified = models.BooleanField(default=False)
+
+    # Identifiants de connexion normalises, indexes (uniques) : la connexion
+    # cible une seule colonne au lieu d'un OR sur email/phone non indexes.
+    # Derives de email/phone a chaque save(), jamais saisis directement.
+    email_normalized = models.CharField(max_length=254, unique=True, null=True, editable=False)
+    phone_e164 = models.CharField(max_length=16, unique=True, null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -26,6 +41,44 @@ class User(AbstractUser):
     def __str__(self):
         return f"{self.username} ({self.get_user_type_display()})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_identifiers = (instance.__dict__.get('email'), instance.__dict__.get('phone'))
+        return instance
+    
+    def save(self, *args, **kwargs):
+        # Ne recalculer que si email/phone ont change : un doublon historique
+        # laisse a NULL par la migration 0005 ne doit pas faire echouer
+        # chaque save() du compte sur la contrainte d'unicite.
+        identifiers = (self.email, self.phone)
+        if self._state.adding or getattr(self, '_loaded_identifiers', None) != identifiers:
+            self.email_normalized = normalize_email(self.email)
+            self.phone_e164 = normalize_phone(self.phone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if 'email' in update_fields:
+                update_fields.add('email_normalized')
+            if 'phone' in update_fields:
+                update_fields.add('phone_e164')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+        self._loaded_identifiers = identifiers
+    
+    @classmethod
+    def identifier_conflicts(cls, username=None, email=None, phone=None, exclude_pk=None):
+        """Champs parmi username, email et phone deja utilises par un autre
+        compte. email et phone sont compares sur leur forme normalisee, comme
+        les contraintes d'unicite de email_normalized et phone_e164."""
+        others = cls.objects.exclude(pk=exclude_pk) if exclude_pk is not None else cls.objects.all()
+        lookups = {
+            'username': {'username': username} if username else None,
+            'email': {'email_normalized': normalize_email(email)} if normalize_email(email) else None,
+            'phone': {'phone_e164': normalize_phone(phone)} if normalize_phone(phone) else None,
+        }
+        return [field for field, lookup in lookups.items() if lookup and others.filter(**lookup).exists()]
+
     @property
     def full_name(self):
         """Retourne le nom complet ou username"""
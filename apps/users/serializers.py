@@ -1,7 +1,9 @@
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
-from .models import User
-from dj_rest_auth.registration.serializers import SocialLoginSerializer
+from django.db import IntegrityError, transaction
+from .models import DUPLICATE_MESSAGES, User
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as SimpleJWTTokenRefreshSerializer
+from .tokens import RefreshToken
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -18,7 +20,45 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'is_verified', 'is_staff', 'created_at', 'updated_at']
 
 
-class RegisterSerializer(serializers.ModelSerializer):
+class UniqueIdentifiersMixin:
+    """Email et téléphone uniques sous leur forme normalisée.
+
+    La validation ne suffit pas face à deux requêtes concurrentes
+    ("+237 690..." et "690...") : la contrainte d'unicité de la base tranche,
+    et son IntegrityError devient une erreur 400 sur le champ en cause."""
+
+    def _other_accounts_pk(self):
+        return self.instance.pk if self.instance is not None else None
+
+    def _check_identifier(self, field, value):
+        if field in User.identifier_conflicts(**{field: value}, exclude_pk=self._other_accounts_pk()):
+            raise serializers.ValidationError(DUPLICATE_MESSAGES[field])
+        return value
+
+    def validate_email(self, value):
+        """Vérifier que l'email n'est pas déjà utilisé (casse ignorée)"""
+        return self._check_identifier('email', value)
+
+    def validate_phone(self, value):
+        """Vérifier que le téléphone n'est pas déjà utilisé (quel que soit le format)"""
+        return self._check_identifier('phone', value)
+
+    def save(self, **kwargs):
+        try:
+            with transaction.atomic():
+                return super().save(**kwargs)
+        except IntegrityError:
+            data = self.validated_data
+            conflicts = User.identifier_conflicts(
+                username=data.get('username'), email=data.get('email'), phone=data.get('phone'),
+                exclude_pk=self._other_accounts_pk(),
+            )
+            if not conflicts:
+                raise
+            raise serializers.ValidationError({field: DUPLICATE_MESSAGES[field] for field in conflicts})
+
+
+class RegisterSerializer(UniqueIdentifiersMixin, serializers.ModelSerializer):
     password = serializers.CharField(
         write_only=True, 
         required=True, 
@@ -47,21 +87,7 @@ class RegisterSerializer(serializers.ModelSerializer):
     
     def validate_username(self, value):
         """Vérifier que le username n'existe pas déjà"""
-        if User.objects.filter(username=value).exists():
-            raise serializers.ValidationError("Ce nom d'utilisateur est déjà pris.")
-        return value
-    
-    def validate_email(self, value):
-        """Vérifier que l'email n'existe pas déjà"""
-        if User.objects.filter(email=value).exists():
-            raise serializers.ValidationError("Cet email est déjà utilisé.")
-        return value
-    
-    def validate_phone(self, value):
-        """Vérifier que le téléphone n'existe pas déjà"""
-        if User.objects.filter(phone=value).exists():
-            raise serializers.ValidationError("Ce numéro de téléphone est déjà utilisé.")
-        return value
+        return self._check_identifier('username', value)
     
     def validate(self, attrs):
         """Validation globale"""
@@ -83,7 +109,7 @@ class RegisterSerializer(serializers.ModelSerializer):
         return user
 
 
-class UpdateProfileSerializer(serializers.ModelSerializer):
+class UpdateProfileSerializer(UniqueIdentifiersMixin, serializers.ModelSerializer):
     """Serializer pour la mise à jour du profil"""
     class Meta:
         model = User
@@ -95,20 +121,6 @@ class UpdateProfileSerializer(serializers.ModelSerializer):
             'email': {'required': False},
             'phone': {'required': False},
         }
-    
-    def validate_email(self, value):
-        """Vérifier que l'email n'est pas déjà utilisé par un autre utilisateur"""
-        user = self.context['request'].user
-        if User.objects.exclude(pk=user.pk).filter(email=value).exists():
-            raise serializers.ValidationError("Cet email est déjà utilisé.")
-        return value
-    
-    def validate_phone(self, value):
-        """Vérifier que le téléphone n'est pas déjà utilisé par un autre utilisateur"""
-        user = self.context['request'].user
-        if User.objects.exclude(pk=user.pk).filter(phone=value).exists():
-            raise serializers.ValidationError("Ce numéro de téléphone est déjà utilisé.")
-        return value
 
 
 class ChangePasswordSerializer(serializers.Serializer):
@@ -143,22 +155,7 @@ class ChangePasswordSerializer(serializers.Serializer):
         user.save()
         return user
 
-class GoogleLoginSerializer(SocialLoginSerializer):
-    """
-    Serializer pour accepter id_token OU access_token de Google
-    """
-    id_token = serializers.CharField(required=False, allow_blank=True)
-    access_token = serializers.CharField(required=False, allow_blank=True)
-    
-    def validate(self, attrs):
-        # Si id_token est fourni, l'utiliser
-        if attrs.get('id_token'):
-            attrs['access_token'] = attrs.get('id_token')
-        
-        # Vérifier qu'au moins un token est fourni
-        if not attrs.get('access_token'):
-            raise serializers.ValidationError(
-                "Vous devez fournir soit 'access_token' soit 'id_token'"
-            )
-        
-        return super().validate(attrs)
\ No newline at end of file
+
+class TokenRefreshSerializer(SimpleJWTTokenRefreshSerializer):
+    """Rotation des refresh tokens avec la blacklist Redis (voir tokens.py)"""
+    token_class = RefreshToken
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_cached_user
+from .models import User
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_auth_cache(sender, instance, **kwargs):
+    """Profile edits, password changes and deactivation must be seen by the
+    next authenticated request, not after the cache TTL."""
+    invalidate_cached_user(instance.pk)
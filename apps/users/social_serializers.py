@@ -0,0 +1,23 @@
+from dj_rest_auth.registration.serializers import SocialLoginSerializer
+from rest_framework import serializers
+
+
+class GoogleLoginSerializer(SocialLoginSerializer):
+    """
+    Serializer pour accepter id_token OU access_token de Google
+    """
+    id_token = serializers.CharField(required=False, allow_blank=True)
+    access_token = serializers.CharField(required=False, allow_blank=True)
+    
+    def validate(self, attrs):
+        # Si id_token est fourni, l'utiliser
+        if attrs.get('id_token'):
+            attrs['access_token'] = attrs.get('id_token')
+        
+        # Vérifier qu'au moins un token est fourni
+        if not attrs.get('access_token'):
+            raise serializers.ValidationError(
+                "Vous devez fournir soit 'access_token' soit 'id_token'"
+            )
+        
+        return super().validate(attrs)
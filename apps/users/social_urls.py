@@ -0,0 +1,8 @@
+from django.urls import path
+
+from .social_views import GoogleLoginView
+
+# Charge a la demande (voir core/urls.py) : allauth Google, dj_rest_auth
+urlpatterns = [
+    path('google/', GoogleLoginView.as_view(), name='google-login'),
+]
@@ -1,10 +1,11 @@
 from dj_rest_auth.registration.views import SocialLoginView
-from allauth.socialaccount.providers.google.views import GoogleOAuth2Adapter
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework_simplejwt.tokens import RefreshToken
-from .serializers import UserSerializer, GoogleLoginSerializer
+from .google import GoogleOAuth2Adapter
+from .serializers import UserSerializer
+from .social_serializers import GoogleLoginSerializer
+from .tokens import RefreshToken
 import logging
 
 logger = logging.getLogger(__name__)
@@ -31,7 +32,7 @@ class GoogleLoginView(SocialLoginView):
         }
     }
     """
-    adapter_class = GoogleOAuth2Adapter
+    adapter_class = GoogleOAuth2Adapter  # id_token verifie hors ligne (voir google.py)
     serializer_class = GoogleLoginSerializer  # ✅ Utiliser le serializer personnalisé
     permission_classes = [AllowAny]
     
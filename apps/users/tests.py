@@ -1,3 +1,327 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+import fakeredis
+import jwt
+from allauth.socialaccount.providers.oauth2.client import OAuth2Error
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.exceptions import ValidationError
+from rest_framework_simplejwt.exceptions import TokenError
+
+from . import authentication, google, hashers, tokens
+from .hashers import ScryptPasswordHasher
+from .models import User
+from .serializers import RegisterSerializer, UpdateProfileSerializer
+
+
+class UniqueIdentifiersTests(TestCase):
+    """Email et telephone uniques sous leur forme normalisee, y compris face
+    a une inscription concurrente (IntegrityError -> erreur de champ)."""
+
+    password = 'Xk4!pQ9z-sEcure'
+
+    def register(self, **data):
+        return RegisterSerializer(data={
+            'username': 'john', 'email': 'john@example.com', 'password': self.password,
+            'password2': self.password, 'phone': '+237 690 00 00 00', **data,
+        })
+
+    def test_equivalent_phone_is_rejected(self):
+        User.objects.create(username='jane', email='jane@example.com', phone='690000000')
+        serializer = self.register()
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('phone', serializer.errors)
+
+    def test_email_case_is_ignored(self):
+        User.objects.create(username='jane', email='John@Example.com')
+        serializer = self.register()
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('email', serializer.errors)
+
+    def test_concurrent_registration_is_a_field_error(self):
+        serializer = self.register()
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        # Inscription concurrente entre la validation et l'enregistrement
+        User.objects.create(username='jane', email='jane@example.com', phone='00237690000000')
+        with self.assertRaises(ValidationError) as raised:
+            serializer.save()
+        self.assertEqual(list(raised.exception.detail), ['phone'])
+        self.assertFalse(User.objects.filter(username='john').exists())
+
+    def test_profile_update_keeps_own_identifiers(self):
+        user = User.objects.create(username='john', email='john@example.com', phone='690000000')
+        User.objects.create(username='jane', email='jane@example.com', phone='690000001')
+        serializer = UpdateProfileSerializer(user, data={'phone': '+237 690 00 00 00'}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer = UpdateProfileSerializer(user, data={'phone': '237690000001'}, partial=True)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('phone', serializer.errors)
+
+
+class ScryptPasswordHasherTests(SimpleTestCase):
+    def test_encode_verify_round_trip(self):
+        hasher = ScryptPasswordHasher()
+        encoded = hasher.encode('Xk4!pQ9z-sEcure', hasher.salt())
+        self.assertTrue(encoded.startswith('scrypt$'))
+        self.assertTrue(hasher.verify('Xk4!pQ9z-sEcure', encoded))
+        self.assertFalse(hasher.verify('wrong-password', encoded))
+
+    def test_must_update_when_the_cost_changes(self):
+        hasher = ScryptPasswordHasher()
+        self.assertFalse(hasher.must_update(hasher.encode('secret', hasher.salt())))
+
+        class CheaperHasher(ScryptPasswordHasher):
+            work_factor = ScryptPasswordHasher.work_factor // 2
+
+        cheaper = CheaperHasher()
+        self.assertTrue(hasher.must_update(cheaper.encode('secret', cheaper.salt())))
+
+
+class LoginViewTests(TestCase):
+    password = 'Xk4!pQ9z-sEcure'
+
+    def setUp(self):
+        self.user = User.objects.create(username='john', email='John.Doe@example.com', phone='690000000')
+        self.user.set_password(self.password)
+        self.user.save()
+
+    def login(self, body, content_type='application/json'):
+        return self.client.post('/api/users/login/', body, content_type=content_type)
+
+    def test_login_with_email_any_case(self):
+        response = self.login({'username': 'john.doe@EXAMPLE.com', 'password': self.password})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['id'], self.user.id)
+        self.assertIn('access', response.json()['tokens'])
+
+    def test_login_with_phone_any_format(self):
+        for phone in ('+237 690 00 00 00', '00237690000000', '690000000'):
+            with self.subTest(phone=phone):
+                response = self.login({'phone': phone, 'password': self.password})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['user']['id'], self.user.id)
+
+    def test_login_with_username(self):
+        self.assertEqual(self.login({'username': 'john', 'password': self.password}).status_code, 200)
+
+    def test_wrong_password(self):
+        self.assertEqual(self.login({'username': 'john', 'password': 'wrong'}).status_code, 401)
+
+    def test_body_must_be_a_json_object(self):
+        for body in ('[]', '"john"', '42', 'null', '{not json'):
+            with self.subTest(body=body):
+                self.assertEqual(self.login(body).status_code, 400)
+
+    def test_password_must_be_a_string(self):
+        for password in (123, ['x'], {'a': 1}, True):
+            with self.subTest(password=password):
+                response = self.login({'username': 'john', 'password': password})
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.login({'username': 'john', 'password': ''}).status_code, 400)
+
+    def test_pool_only_under_asgi(self):
+        with mock.patch.object(hashers, '_executor') as executor:
+            self.assertEqual(self.login({'username': 'john', 'password': self.password}).status_code, 200)
+        executor.submit.assert_not_called()
+        with override_settings(ASYNC_VIEWS=True):
+            self.assertEqual(self.login({'username': 'john', 'password': self.password}).status_code, 200)
+
+    def test_identifier_must_be_a_string(self):
+        for body in ({'username': 690000000}, {'username': ['john']}, {'phone': 690000000}, {'email': {'a': 1}}):
+            with self.subTest(body=body):
+                response = self.login({**body, 'password': self.password})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('texte attendu', response.json()['error'])
+
+    def test_legacy_pbkdf2_hash_is_upgraded(self):
+        User.objects.filter(pk=self.user.pk).update(password=make_password(self.password, hasher='pbkdf2_sha256'))
+        self.assertEqual(self.login({'username': 'john', 'password': self.password}).status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('scrypt$'))
+        self.assertTrue(self.user.check_password(self.password))
+
+
+class CachedAuthenticationTests(TestCase):
+    """Cache d'authentification : champs utiles seulement, invalide a
+    l'enregistrement."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='john', email='john@example.com', phone='690000000')
+        self.user.set_password('Xk4!pQ9z-sEcure')
+        self.user.save()
+        access = tokens.RefreshToken.for_user(self.user).access_token
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {access}'}
+
+    def profile(self):
+        return self.client.get('/api/users/profile/', **self.headers)
+
+    def test_cache_holds_no_secret(self):
+        self.assertEqual(self.profile().status_code, 200)
+        entry = cache.get(authentication._cache_key(self.user.pk))
+        self.assertEqual(set(entry), {*authentication.AUTH_FIELDS, authentication.REVOKE_HASH})
+        self.assertNotIn(self.user.password, entry.values())
+
+    def test_profile_from_cached_user_is_complete(self):
+        first = self.profile()
+        second = self.profile()  # utilisateur reconstruit depuis le cache
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second.json()['email'], 'john@example.com')
+
+    def test_deactivation_is_seen_immediately(self):
+        self.assertEqual(self.profile().status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.profile().status_code, 401)
+
+
+class RedisBlacklistTests(TestCase):
+    """Blacklist Redis avec repli sur la base pendant une panne."""
+
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+        patcher = mock.patch.object(tokens, 'get_redis', return_value=fakeredis.FakeRedis(server=self.server))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create(username='john', email='john@example.com')
+
+    def test_blacklisted_token_is_rejected(self):
+        refresh = tokens.RefreshToken.for_user(self.user)
+        tokens.RefreshToken(str(refresh))
+        refresh.blacklist()
+        with self.assertRaises(TokenError):
+            tokens.RefreshToken(str(refresh))
+
+    def test_revocation_during_outage_survives_recovery(self):
+        refresh = tokens.RefreshToken.for_user(self.user)
+        other = tokens.RefreshToken.for_user(self.user)
+        self.server.connected = False
+        refresh.blacklist()  # repli : ligne BlacklistedToken
+        with self.assertRaises(TokenError):
+            tokens.RefreshToken(str(refresh))
+        self.server.connected = True
+        with self.assertRaises(TokenError):
+            tokens.RefreshToken(str(refresh))
+        # Recopie faite une fois : les autres tokens restent valides
+        self.assertTrue(fakeredis.FakeRedis(server=self.server).exists(tokens.blacklist_key(refresh['jti'])))
+        tokens.RefreshToken(str(other))
+
+
+class GoogleIdTokenTests(SimpleTestCase):
+    """Verification hors ligne des id_tokens Google avec une cle RSA locale."""
+
+    AUDIENCE = 'client-id.apps.googleusercontent.com'
+
+    def setUp(self):
+        cache.clear()
+        self.now = 1_000_000.0
+        for name, value in (('_key_set', None), ('time', mock.Mock(time=lambda: self.now))):
+            patcher = mock.patch.object(google, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.source = google.StaticKeySource(self.jwks(('k1', self.private_key)), max_age=600)
+        self.fetch = mock.Mock(side_effect=self.source.fetch)
+        self.source.fetch = self.fetch
+        google.set_key_source(self.source)
+
+    @staticmethod
+    def jwks(*keys):
+        entries = []
+        for kid, private_key in keys:
+            jwk = jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key(), as_dict=True)
+            entries.append({**jwk, 'kid': kid, 'alg': 'RS256', 'use': 'sig'})
+        return {'keys': entries}
+
+    def claims(self, **overrides):
+        # exp/iat en temps reel : jwt.decode ne passe pas par google.time
+        claims = {
+            'iss': 'https://accounts.google.com', 'aud': self.AUDIENCE, 'sub': '1234567890',
+            'email': 'john@example.com', 'iat': int(time.time()), 'exp': int(time.time()) + 3600,
+        }
+        claims.update(overrides)
+        return {name: value for name, value in claims.items() if value is not None}
+
+    def token(self, kid='k1', private_key=None, **overrides):
+        return jwt.encode(self.claims(**overrides), private_key or self.private_key, algorithm='RS256',
+                          headers={'kid': kid})
+
+    def assertRejected(self, credential):
+        with self.assertRaises(OAuth2Error):
+            google.verify_id_token(credential, audience=self.AUDIENCE)
+
+    def test_valid_token(self):
+        data = google.verify_id_token(self.token(), audience=self.AUDIENCE)
+        self.assertEqual(data['sub'], '1234567890')
+        # Cles en memoire et dans le cache partage : pas de second telechargement
+        google.verify_id_token(self.token(), audience=self.AUDIENCE)
+        self.assertEqual(self.fetch.call_count, 1)
+        self.assertIsNotNone(cache.get(google.SHARED_CACHE_KEY))
+
+    def test_wrong_audience_or_issuer(self):
+        self.assertRejected(self.token(aud='other-client'))
+        self.assertRejected(self.token(iss='https://evil.example.com'))
+
+    def test_expired_token(self):
+        self.assertRejected(self.token(iat=int(time.time()) - 7200, exp=int(time.time()) - 3600))
+
+    def test_required_claims(self):
+        self.assertRejected(self.token(sub=None))
+        self.assertRejected(self.token(exp=None))
+
+    def test_algorithm_must_match_the_key(self):
+        # HS256 signe avec la cle publique (confusion d'algorithme)
+        public_pem = self.private_key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+        segments = [
+            jwt.utils.base64url_encode(json.dumps(part).encode())
+            for part in ({'alg': 'HS256', 'typ': 'JWT', 'kid': 'k1'}, self.claims())
+        ]
+        signing_input = b'.'.join(segments)
+        signature = hmac.new(public_pem, signing_input, hashlib.sha256).digest()
+        self.assertRejected((signing_input + b'.' + jwt.utils.base64url_encode(signature)).decode())
+
+    def test_unknown_kid_refetches_at_most_once_per_interval(self):
+        self.assertRejected(self.token(kid='k2'))
+        self.assertRejected(self.token(kid='k2'))
+        self.assertEqual(self.fetch.call_count, 1)
+        # Rotation chez Google : la nouvelle cle est prise apres l'intervalle
+        rotated = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.source.jwks = self.jwks(('k1', self.private_key), ('k2', rotated))
+        self.now += google.MIN_REFETCH_INTERVAL - 1
+        self.assertRejected(self.token(kid='k2', private_key=rotated))
+        self.assertEqual(self.fetch.call_count, 1)
+        self.now += 1
+        google.verify_id_token(self.token(kid='k2', private_key=rotated), audience=self.AUDIENCE)
+        self.assertEqual(self.fetch.call_count, 2)
+
+    def test_background_refresh_before_expiry(self):
+        google.verify_id_token(self.token(), audience=self.AUDIENCE)
+        rotated = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        release = threading.Event()
+
+        def slow_fetch():
+            release.wait(5)
+            return self.jwks(('k1', self.private_key), ('k2', rotated)), 600
+
+        self.fetch.side_effect = slow_fetch
+        self.now += 600 - google.REFRESH_MARGIN
+        # Servi avec les cles actuelles pendant le telechargement
+        google.verify_id_token(self.token(), audience=self.AUDIENCE)
+        google.verify_id_token(self.token(), audience=self.AUDIENCE)
+        (refresh,) = [thread for thread in threading.enumerate() if thread.name == 'google-jwks-refresh']
+        release.set()
+        refresh.join(5)
+        self.assertEqual(self.fetch.call_count, 2)
+        google.verify_id_token(self.token(kid='k2', private_key=rotated), audience=self.AUDIENCE)
+        self.assertEqual(self.fetch.call_count, 2)
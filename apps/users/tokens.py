@@ -0,0 +1,121 @@
+"""Refresh tokens with a Redis-backed blacklist.
+
+Out of the box, simplejwt's token_blacklist app writes an OutstandingToken
+row for every issued refresh token and a BlacklistedToken row for every
+rotation or logout. Each refresh then looks the token up in that table.
+With ROTATE_REFRESH_TOKENS that means two inserts and a lookup per refresh,
+and both tables grow forever.
+
+Here a blacklisted jti is just a Redis key that expires with the token
+itself: blacklisting is one SET with a TTL, the check is one EXISTS, and
+nothing needs purging. Without Redis (DEBUG, see core/redis.py) every
+method falls back to simplejwt's database behaviour.
+
+That fallback also covers a Redis outage: a token revoked meanwhile only
+has a BlacklistedToken row. So that it doesn't become valid again once
+Redis is back, Redis keeps the id of the last DB row copied into it
+(sync_db_blacklist). A refresh whose jti isn't blacklisted in Redis
+compares it with the highest id in the table (a primary key lookup); the
+first worker that sees newer rows copies them, then checks again. A Redis
+that lost its data resyncs the same way. The purge_jwt_tokens command
+cleans rows left by the fallback or by older deploys.
+"""
+import logging
+
+from django.db.models import Max
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import BlacklistMixin
+from rest_framework_simplejwt.tokens import RefreshToken as SimpleJWTRefreshToken
+from rest_framework_simplejwt.utils import aware_utcnow, datetime_from_epoch
+
+from core.redis import get_redis, redis_key
+
+logger = logging.getLogger(__name__)
+
+
+def blacklist_key(jti) -> str:
+    return redis_key('jwt', 'blacklist', jti)
+
+
+def synced_key() -> str:
+    return redis_key('jwt', 'blacklist-db-synced')
+
+
+def blacklist_jti(client, jti, expires_at) -> bool:
+    """Blacklists a jti until expires_at. Returns False if already expired."""
+    ttl = int((expires_at - aware_utcnow()).total_seconds()) + 1
+    if ttl <= 0:
+        return False
+    client.set(blacklist_key(jti), 1, ex=ttl)
+    return True
+
+
+def sync_db_blacklist(client, after_id=0, batch_size=1000) -> int:
+    """Copies into Redis the DB blacklist entries (id > after_id) that have
+    not expired, then records the highest id copied. Returns the count."""
+    last_id = BlacklistedToken.objects.aggregate(last=Max('id'))['last'] or 0
+    if last_id <= after_id:
+        return 0
+    live = (
+        BlacklistedToken.objects
+        .filter(id__gt=after_id, id__lte=last_id, token__expires_at__gt=aware_utcnow())
+        .values_list('token__jti', 'token__expires_at')
+        .iterator(chunk_size=batch_size)
+    )
+    pipe = client.pipeline(transaction=False)
+    copied = 0
+    for jti, expires_at in live:
+        copied += blacklist_jti(pipe, jti, expires_at)
+    pipe.set(synced_key(), last_id)
+    pipe.execute()
+    return copied
+
+
+class RefreshToken(SimpleJWTRefreshToken):
+    def check_blacklist(self) -> None:
+        client = get_redis()
+        if client is None:
+            return super().check_blacklist()
+        jti = self.payload[api_settings.JTI_CLAIM]
+        try:
+            blacklisted, synced = client.mget(blacklist_key(jti), synced_key())
+            # Revocations ecrites en base pendant une panne de Redis
+            if not blacklisted and sync_db_blacklist(client, int(synced or 0)):
+                logger.info("Blacklist JWT : revocations de la base recopiees dans Redis")
+                blacklisted = client.exists(blacklist_key(jti))
+        except Exception:
+            logger.warning("Redis indisponible pour la blacklist JWT, repli sur la base", exc_info=True)
+            return super().check_blacklist()
+        if blacklisted:
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        client = get_redis()
+        if client is None:
+            return super().blacklist()
+        try:
+            blacklist_jti(
+                client,
+                self.payload[api_settings.JTI_CLAIM],
+                datetime_from_epoch(self.payload['exp']),
+            )
+        except Exception:
+            logger.warning("Redis indisponible pour la blacklist JWT, repli sur la base", exc_info=True)
+            return super().blacklist()
+        return None
+
+    def outstand(self):
+        # Pas de ligne OutstandingToken : la blacklist Redis n'en a pas besoin.
+        if get_redis() is None:
+            return super().outstand()
+        return None
+
+    @classmethod
+    def for_user(cls, user):
+        if get_redis() is None:
+            return super().for_user(user)
+        # Token.for_user sans l'insertion OutstandingToken de BlacklistMixin
+        return super(BlacklistMixin, cls).for_user(user)
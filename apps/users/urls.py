@@ -1,7 +1,8 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenRefreshView
+
+from core.urls import lazy_include
 from . import views
-from .social_views import GoogleLoginView
 
 app_name = 'users'
 
@@ -15,6 +16,6 @@ urlpatterns = [
     path('stats/', views.user_stats_view, name='stats'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
     
-    # Authentification sociale (OAuth)
-    path('auth/google/', GoogleLoginView.as_view(), name='google-login'),
+    # Authentification sociale (OAuth), importee au premier appel
+    lazy_include('auth/', 'apps.users.social_urls'),
 ]
\ No newline at end of file
@@ -1,10 +1,18 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
 from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.request import Request
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
-from django.db.models import Q
+from rest_framework.settings import api_settings
+from core.utils import csrf_exempt_async, looks_like_phone, normalize_email, normalize_phone
+from .authentication import invalidate_cached_user
+from .hashers import averify_password
 from .models import User
+from .tokens import RefreshToken
 from .serializers import (
     UserSerializer, RegisterSerializer, 
     UpdateProfileSerializer, ChangePasswordSerializer
@@ -59,7 +67,12 @@ class ProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_object(self):
-        return self.request.user
+        user = self.request.user
+        # Utilisateur du cache d'authentification : seuls les champs
+        # d'AUTH_FIELDS sont charges, relire la ligne pour le profil complet
+        if user.get_deferred_fields():
+            user = User.objects.get(pk=user.pk)
+        return user
     
     def get_serializer_class(self):
         if self.request.method in ['PUT', 'PATCH']:
@@ -67,9 +80,74 @@ class ProfileView(generics.RetrieveUpdateAPIView):
         return UserSerializer
 
 
-@api_view(['POST'])
-@permission_classes([AllowAny])
-def login_view(request):
+IDENTIFIER_FIELDS = ('username', 'email', 'phone')
+
+
+async def _find_user_by_identifier(identifier):
+    """
+    Cherche le compte sur UNE colonne indexée choisie d'après la forme de
+    l'identifiant (email -> email_normalized, numéro -> phone_e164), au lieu
+    d'un OR username/email/phone qui force un parcours complet de la table.
+    Le username sert de repli : il peut lui aussi contenir "@" ou des chiffres.
+    """
+    identifier = identifier.strip()
+    lookups = []
+    if '@' in identifier:
+        lookups.append({'email_normalized': normalize_email(identifier)})
+    elif looks_like_phone(identifier):
+        phone = normalize_phone(identifier)
+        if phone:
+            lookups.append({'phone_e164': phone})
+    lookups.append({'username': identifier})
+
+    for lookup in lookups:
+        user = await User.objects.filter(**lookup).afirst()
+        if user is not None:
+            return user
+    return None
+
+
+def _request_data(request):
+    """Corps JSON ou formulaire, comme les parsers DRF par défaut ; None si
+    le JSON est invalide ou n'est pas un objet."""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+    return request.POST
+
+
+def _throttle_wait(request):
+    """Applique les throttles DRF par défaut (cette vue async n'est pas une
+    APIView) ; retourne le délai d'attente si la requête est refusée."""
+    # Pile de middlewares allégée sous /api/ : pas de request.user Django,
+    # la requête de connexion est de toute façon anonyme.
+    drf_request = Request(request, authenticators=())
+    for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+        throttle = throttle_class()
+        if not throttle.allow_request(drf_request, None):
+            return throttle.wait()
+    return None
+
+
+def _login_payload(user):
+    # Accès base possible (utilisateur, OutstandingToken sans Redis) : appelé
+    # via sync_to_async
+    refresh = RefreshToken.for_user(user)
+    return {
+        'message': 'Connexion réussie !',
+        'user': UserSerializer(user).data,
+        'tokens': {
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+        }
+    }
+
+
+@csrf_exempt_async
+async def login_view(request):
     """
     Connexion avec email, username ou téléphone
     
@@ -78,56 +156,83 @@ def login_view(request):
         "username": "john_doe" ou "john@example.com" ou "+237690000000",
         "password": "SecurePass123!"
     }
+    
+    Vue async : sous ASGI, la vérification du mot de passe (CPU) s'exécute
+    dans le pool borné de hashers.py, sans bloquer les autres requêtes du
+    worker ; sous WSGI, directement dans la requête.
     """
-    identifier = request.data.get('username') or request.data.get('email') or request.data.get('phone')
-    password = request.data.get('password')
+    if request.method != 'POST':
+        return JsonResponse({'detail': f'Méthode "{request.method}" non autorisée.'}, status=405)
+    
+    wait = await sync_to_async(_throttle_wait)(request)
+    if wait is not None:
+        return JsonResponse(
+            {'detail': f'Requête ralentie. Réessayez dans {int(wait or 0)} secondes.'},
+            status=status.HTTP_429_TOO_MANY_REQUESTS
+        )
+    
+    data = _request_data(request)
+    if data is None:
+        return JsonResponse({'error': 'JSON invalide (objet attendu)'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    # JSON valide mais identifiant non textuel (nombre, liste...) : 400, pas 500
+    if any(data.get(name) is not None and not isinstance(data.get(name), str) for name in IDENTIFIER_FIELDS):
+        return JsonResponse(
+            {'error': 'Identifiant (email/username/téléphone) invalide : texte attendu'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    identifier = data.get('username') or data.get('email') or data.get('phone')
+    password = data.get('password')
+    if password is not None and not isinstance(password, str):
+        return JsonResponse(
+            {'error': 'Mot de passe invalide : texte attendu'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     
     if not identifier or not password:
-        return Response(
+        return JsonResponse(
             {'error': 'Identifiant (email/username/téléphone) et mot de passe requis'}, 
             status=status.HTTP_400_BAD_REQUEST
         )
     
     try:
         # Chercher par username, email OU téléphone
-        user = User.objects.filter(
-            Q(username=identifier) | Q(email=identifier) | Q(phone=identifier)
-        ).first()
+        user = await _find_user_by_identifier(identifier)
         
         if not user:
-            return Response(
+            return JsonResponse(
                 {'error': 'Utilisateur introuvable'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Vérifier le mot de passe
-        if not user.check_password(password):
-            return Response(
+        # Vérifier le mot de passe (hors de la boucle d'événements)
+        is_correct, upgraded_hash = await averify_password(password, user.password)
+        if not is_correct:
+            return JsonResponse(
                 {'error': 'Mot de passe incorrect'}, 
                 status=status.HTTP_401_UNAUTHORIZED
             )
         
+        # Ancien hash (PBKDF2, ou scrypt à un autre coût) : remise à niveau
+        if upgraded_hash:
+            user.password = upgraded_hash
+            await User.objects.filter(pk=user.pk).aupdate(password=upgraded_hash)
+            await sync_to_async(invalidate_cached_user)(user.pk)
+        
         # Vérifier si l'utilisateur est actif
         if not user.is_active:
-            return Response(
+            return JsonResponse(
                 {'error': 'Ce compte a été désactivé'}, 
                 status=status.HTTP_403_FORBIDDEN
             )
         
         # Générer les tokens JWT
-        refresh = RefreshToken.for_user(user)
-        
-        return Response({
-            'message': 'Connexion réussie !',
-            'user': UserSerializer(user).data,
-            'tokens': {
-                'refresh': str(refresh),
-                'access': str(refresh.access_token),
-            }
-        }, status=status.HTTP_200_OK)
+        payload = await sync_to_async(_login_payload)(user)
+        return JsonResponse(payload, status=status.HTTP_200_OK)
         
     except Exception as e:
-        return Response(
+        return JsonResponse(
             {'error': f'Erreur serveur: {str(e)}'}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
@@ -202,21 +307,18 @@ def user_stats_view(request):
     
     GET /api/users/stats/
     """
-    user = request.user
-    
     # Import ici pour éviter les imports circulaires
-    from apps.orders.models import Order
+    from apps.orders.cache import get_user_order_stats
     
-    orders = Order.objects.filter(user=user)
+    data = get_user_order_stats(request.user.id)
     
+    # "En attente" = redirigé vers WhatsApp, pas encore confirmé
     stats = {
-        'total_orders': orders.count(),
-        'pending_orders': orders.filter(status='pending').count(),
-        'completed_orders': orders.filter(status='delivered').count(),
-        'cancelled_orders': orders.filter(status='cancelled').count(),
-        'total_spent': sum(
-            order.total for order in orders.exclude(status='cancelled')
-        ),
+        'total_orders': data['total_orders'],
+        'pending_orders': data['redirected'],
+        'completed_orders': data['completed'],
+        'cancelled_orders': data['cancelled'],
+        'total_spent': data['total_spent'],
     }
     
     return Response(stats)
\ No newline at end of file
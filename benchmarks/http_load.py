@@ -0,0 +1,158 @@
+"""Minimal HTTP load generator (stdlib only, HTTP/1.1 keep-alive).
+
+Opens N concurrent connections against one URL for a fixed duration and
+prints throughput and latency percentiles:
+
+    python benchmarks/http_load.py http://127.0.0.1:8000/api/products/homepage/ \
+        --concurrency 50 --duration 20
+
+--slow-clients adds connections that trickle their request over
+--slow-seconds (a mobile client on a poor network). They are not measured;
+they show how the measured clients suffer when workers are held by them.
+
+Used for the WSGI/ASGI comparison in docs/asgi-benchmark.md. Deliberately
+dependency-free so it runs in the app image as is.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('connexion fermee')
+    status = int(status_line.split()[1])
+    length = 0
+    chunked = False
+    keep_alive = True
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value.strip())
+        elif name == 'transfer-encoding' and 'chunked' in value.lower():
+            chunked = True
+        elif name == 'connection' and 'close' in value.lower():
+            keep_alive = False
+    if chunked:
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length:
+        await reader.readexactly(length)
+    return status, keep_alive
+
+
+async def _client(url, deadline, latencies, statuses, headers):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    path = parts.path + (f'?{parts.query}' if parts.query else '')
+    request = (
+        f'GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nConnection: keep-alive\r\n'
+        + ''.join(f'{h}\r\n' for h in headers)
+        + '\r\n'
+    ).encode()
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            start = time.perf_counter()
+            writer.write(request)
+            status, keep_alive = await _read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+            if not keep_alive:
+                # Workers gunicorn sync : une connexion par requete
+                writer.close()
+                reader = writer = None
+        except (ConnectionError, asyncio.IncompleteReadError, OSError):
+            statuses['error'] = statuses.get('error', 0) + 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            await asyncio.sleep(0.01)
+    if writer is not None:
+        writer.close()
+
+
+async def _slow_client(url, deadline, slow_seconds):
+    """Sends the request one line at a time over slow_seconds, then reads
+    the response, in a loop. Not measured."""
+    parts = urlsplit(url)
+    path = parts.path + (f'?{parts.query}' if parts.query else '')
+    lines = [f'GET {path} HTTP/1.1', f'Host: {parts.netloc}', 'Connection: close', 'User-Agent: slow', 'Accept: */*', '']
+    while time.perf_counter() < deadline:
+        writer = None
+        try:
+            reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+            for line in lines:
+                writer.write(f'{line}\r\n'.encode())
+                await writer.drain()
+                await asyncio.sleep(slow_seconds / len(lines))
+            await _read_response(reader)
+        except (ConnectionError, asyncio.IncompleteReadError, OSError):
+            await asyncio.sleep(0.1)
+        finally:
+            if writer is not None:
+                writer.close()
+
+
+async def run(url, concurrency, duration, headers=(), slow_clients=0, slow_seconds=2.0):
+    latencies, statuses = [], {}
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    await asyncio.gather(
+        *[_client(url, deadline, latencies, statuses, headers) for _ in range(concurrency)],
+        *[_slow_client(url, deadline, slow_seconds) for _ in range(slow_clients)],
+    )
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'mean_ms': (statistics.fmean(latencies) * 1000) if latencies else 0.0,
+        'statuses': statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('url')
+    parser.add_argument('--concurrency', '-c', type=int, default=50)
+    parser.add_argument('--duration', '-d', type=float, default=20)
+    parser.add_argument('--header', '-H', action='append', default=[])
+    parser.add_argument('--slow-clients', type=int, default=0)
+    parser.add_argument('--slow-seconds', type=float, default=2.0)
+    args = parser.parse_args()
+    result = asyncio.run(run(
+        args.url, args.concurrency, args.duration, args.header,
+        slow_clients=args.slow_clients, slow_seconds=args.slow_seconds,
+    ))
+    print(
+        f"{result['requests']} requetes, {result['rps']:.0f} req/s | "
+        f"p50 {result['p50_ms']:.1f} ms  p95 {result['p95_ms']:.1f} ms  "
+        f"p99 {result['p99_ms']:.1f} ms | statuts {result['statuses']}"
+    )
+
+
+if __name__ == '__main__':
+    main()
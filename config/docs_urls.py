@@ -0,0 +1,25 @@
+"""Documentation de l'API (Swagger UI, ReDoc, schema OpenAPI).
+
+Module a part pour que drf_yasg et ses dependances (jsonschema, yaml...) ne
+soient importes qu'a la premiere requete de documentation (voir
+core/urls.py), pas au demarrage de chaque worker.
+"""
+from django.urls import path
+from drf_yasg.views import get_schema_view
+from rest_framework import permissions
+
+from core.openapi import API_INFO, schema_file_view
+
+schema_view = get_schema_view(
+    API_INFO,
+    public=True,
+    permission_classes=[permissions.AllowAny],
+)
+
+urlpatterns = [
+    # Schema pregenere (manage.py generate_openapi_schema), les pages UI le
+    # chargent depuis son URL versionnee (SPEC_URL)
+    path('swagger<format>/', schema_file_view, name='schema-json'),
+    path('swagger/', schema_view.with_ui('swagger', cache_timeout=60 * 60), name='schema-swagger-ui'),
+    path('redoc/', schema_view.with_ui('redoc', cache_timeout=60 * 60), name='schema-redoc'),
+]
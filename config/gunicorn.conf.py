@@ -0,0 +1,96 @@
+"""Gunicorn configuration (start.sh, docker-compose, Render).
+
+By default the app is served through WSGI with sync workers. ASGI with
+uvicorn workers (cached catalog reads as async views, see
+core/async_views.py) is opt-in:
+
+    GUNICORN_APP=config.asgi:application \
+    GUNICORN_WORKER_CLASS=uvicorn_worker.UvicornWorker CONN_MAX_AGE=0
+
+It is not the default: WhiteNoiseMiddleware is sync-only, so under ASGI
+every request goes through the sync adapter (thread_sensitive, one thread
+per worker) and the async views never run concurrently. The benchmark in
+docs/asgi-benchmark.md measures it slower than WSGI at every concurrency
+except slow clients.
+
+GUNICORN_PRELOAD=1 loads the application once in the master before forking
+the workers: Django setup, models, middlewares and the URLconf with its
+views are imported once, and each worker starts already warm instead of
+importing everything again. The master collects no garbage while importing,
+then gc.freeze() moves everything it holds to a permanent generation, so the
+workers' collections never write to those objects and their pages stay
+shared copy-on-write (see the gc.freeze() documentation).
+Nothing in the master may open a connection (database, Redis) that the
+workers would inherit.
+
+Prometheus metrics (core/metrics.py) are summed over the workers through
+PROMETHEUS_MULTIPROC_DIR: the variable has to be set before
+prometheus_client is imported, so it is set here (default: a directory
+under /tmp), and the directory is emptied when this file is read so that the
+previous run's workers don't count.
+
+Each worker can trace its allocations (MEMORY_TRACE) and recycle itself
+above a memory ceiling (MEMORY_CEILING_MB): see core/memory.py.
+"""
+import gc
+import os
+import shutil
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '0') == '1'
+
+metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', f'/tmp/erols-metrics-{bind.rsplit(":", 1)[1]}')
+# Ici et pas dans on_starting : avec preload_app, l'application (donc
+# prometheus_client) est chargee avant ce hook
+shutil.rmtree(metrics_dir, ignore_errors=True)
+os.makedirs(metrics_dir, exist_ok=True)
+
+if preload_app:
+    # Pas de trous dans les pages du master pendant les imports
+    gc.disable()
+
+
+def _warm_up():
+    """Ce que toute requete charge : l'URLconf et les vues qu'elle importe.
+    Les modules charges a la demande (core/urls.py) le restent."""
+    from django.db import connections
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns  # noqa: B018
+    connections.close_all()
+
+
+def when_ready(server):
+    # Master, apres le chargement de l'application, avant le premier fork
+    if preload_app:
+        _warm_up()
+        gc.freeze()
+        gc.enable()
+
+
+def pre_fork(server, worker):
+    # Objets crees par le master depuis (redemarrage d'un worker)
+    if preload_app:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    from core import memory
+
+    memory.start_worker()
+
+
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid, metrics_dir)
@@ -6,6 +6,8 @@ from datetime import timedelta
 from decouple import config
 import dj_database_url
 import os
+from django.utils.functional import lazy
+from django.utils.module_loading import import_string
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -69,6 +71,7 @@ INSTALLED_APPS = [
     'dj_rest_auth.registration',
     
     # Apps locales
+    'core',
     'apps.users',
     'apps.products',
     'apps.orders',
@@ -80,20 +83,82 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'users.User'
 
 # ========== MIDDLEWARE ==========
+# Couches communes a toutes les requetes ; le dispatcher (voir
+# core/middleware.py) n'ajoute FULL_ONLY_MIDDLEWARE que hors de l'API JWT.
 MIDDLEWARE = [
+    # Requetes SQL, cache et stockage par requete (voir core/instrumentation.py)
+    'core.middleware.RequestStatsMiddleware',
+    # Profil a la demande (staff, en-tete X-Profile) ou 1 sur N (core/profiling.py)
+    'core.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.middleware.gzip.GZipMiddleware',
+    'core.middleware.ThresholdGZipMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    # Exigee dans MIDDLEWARE par allauth (verifie au demarrage) ; peu couteuse
+    'allauth.account.middleware.AccountMiddleware',
+    'core.middleware.PathMiddlewareDispatcher',
+]
+
+# En-tete Server-Timing (requetes SQL, appels cache/stockage, duree) sur
+# chaque reponse ; lisible dans l'onglet reseau du navigateur. Hors DEBUG,
+# seulement pour le staff (il decrit l'interieur du serveur), sauf
+# SERVER_TIMING=True (preproduction, api_benchmark --base-url)
+SERVER_TIMING = config('SERVER_TIMING', default=DEBUG, cast=bool)
+
+# Jeton du scrape Prometheus de /metrics (core/metrics.py) ; sans jeton,
+# /metrics n'est ouvert qu'en DEBUG
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Catalogue en memoire partage par les workers (apps/products/snapshot.py) :
+# fichier mappe dans un tmpfs, reconstruit a chaque products:cache_version
+# et au plus tard apres CATALOG_SNAPSHOT_MAX_AGE secondes
+CATALOG_SNAPSHOT = config('CATALOG_SNAPSHOT', default=True, cast=bool)
+CATALOG_SNAPSHOT_DIR = config(
+    'CATALOG_SNAPSHOT_DIR', default='/dev/shm/erols-catalog' if os.path.isdir('/dev/shm') else '/tmp/erols-catalog'
+)
+CATALOG_SNAPSHOT_MAX_AGE = config('CATALOG_SNAPSHOT_MAX_AGE', default=600, cast=int)
+
+# Journal des requetes SQL lentes (core/slow_queries.py) : seuil en ms (0 :
+# desactive), intervalle minimal (s) entre deux EXPLAIN d'une meme requete
+# normalisee, et EXPLAIN ANALYZE (re-execute la requete) sur PostgreSQL
+SLOW_QUERY_MS = config('SLOW_QUERY_MS', default=200, cast=float)
+SLOW_QUERY_EXPLAIN_INTERVAL = config('SLOW_QUERY_EXPLAIN_INTERVAL', default=300, cast=int)
+SLOW_QUERY_ANALYZE = config('SLOW_QUERY_ANALYZE', default=True, cast=bool)
+
+# Profils de requetes (core/profiling.py) : repertoire, periode
+# d'echantillonnage de la pile (s) et profilage 1 sur N par route, ex.
+# "product-list:100,*:1000" (vide : desactive). Profils gardes : les
+# PROFILE_KEEP derniers a la demande, les PROFILE_SAMPLE_KEEP derniers
+# echantillonnes
+PROFILE_DIR = config('PROFILE_DIR', default='/tmp/erols-profiles')
+PROFILE_INTERVAL = config('PROFILE_INTERVAL', default=0.001, cast=float)
+PROFILE_SAMPLE = config('PROFILE_SAMPLE', default='')
+PROFILE_KEEP = config('PROFILE_KEEP', default=200, cast=int)
+PROFILE_SAMPLE_KEEP = config('PROFILE_SAMPLE_KEEP', default=200, cast=int)
+
+# Compression gzip a la volee seulement au-dela de cette taille (octets) ; les
+# lectures du catalogue en cache arrivent deja compressees (core/compression.py)
+GZIP_MIN_LENGTH = config('GZIP_MIN_LENGTH', default=1024, cast=int)
+
+# Sessions, CSRF, messages... : admin, flux allauth, documentation de l'API
+FULL_ONLY_MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'allauth.account.middleware.AccountMiddleware',
 ]
 
+# Pile allegee pour l'API (authentification JWT, pas de session)...
+LIGHT_MIDDLEWARE_PATHS = ['/api/', '/metrics']
+# ...sauf la connexion Google, qui passe par allauth (session, messages)
+FULL_MIDDLEWARE_PATHS = ['/api/users/auth/']
+
+# L'admin verifie que sessions, auth et messages sont dans MIDDLEWARE ; ils
+# sont dans FULL_ONLY_MIDDLEWARE, appliques a /admin/ par le dispatcher.
+SILENCED_SYSTEM_CHECKS = ['admin.E408', 'admin.E409', 'admin.E410']
+
 ROOT_URLCONF = 'config.urls'
 
 # ========== TEMPLATES ==========
@@ -114,12 +179,20 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
+
+# Vues async des lectures en cache (core/async_views.py) : activees par
+# config/asgi.py, donc des que GUNICORN_APP=config.asgi:application ; sous
+# WSGI elles couteraient une boucle d'evenements par requete
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
 
 # ========== BASE DE DONNÉES ==========
 DATABASES = {
     'default': dj_database_url.config(
         default=config('DATABASE_URL', default='postgresql://erols_user:erols_pass@db:5432/erols_db'),
-        conn_max_age=600,
+        # Connexions persistantes (WSGI) ; CONN_MAX_AGE=0 en mode ASGI, ou
+        # chaque requete a son thread et la connexion n'est jamais reutilisee
+        conn_max_age=config('CONN_MAX_AGE', default=600, cast=int),
         conn_health_checks=True,
     )
 }
@@ -141,10 +214,28 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# ========== HACHAGE DES MOTS DE PASSE ==========
+# scrypt (hashlib, stdlib) en premier : nouveaux mots de passe et remise a
+# niveau transparente des anciens hashs PBKDF2 a la connexion. PBKDF2 reste
+# dans la liste pour verifier les comptes pas encore migres.
+PASSWORD_HASHERS = [
+    'apps.users.hashers.ScryptPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+# Cout scrypt : memoire = 128 * n * r octets (16 Mo par defaut), ~50 ms CPU
+SCRYPT_WORK_FACTOR = config('SCRYPT_WORK_FACTOR', default=2**14, cast=int)
+SCRYPT_BLOCK_SIZE = config('SCRYPT_BLOCK_SIZE', default=8, cast=int)
+SCRYPT_PARALLELISM = 1
+# Threads dedies au hachage par process, sous ASGI seulement (voir
+# apps/users/hashers.py)
+PASSWORD_HASH_WORKERS = config('PASSWORD_HASH_WORKERS', default=2, cast=int)
+
 # ========== REST FRAMEWORK ==========
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWTAuthentication + cache de l'utilisateur (pas de SELECT par requete)
+        'apps.users.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -157,8 +248,9 @@ REST_FRAMEWORK = {
         'rest_framework.filters.OrderingFilter',
     ],
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle',
+        # Fenetre glissante atomique dans Redis (voir core/throttling.py)
+        'core.throttling.AnonRateThrottle',
+        'core.throttling.UserRateThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         # 100/hour was far too low for a public catalog: browsing (pagination,
@@ -166,8 +258,8 @@ REST_FRAMEWORK = {
         # easily exceeds that in a few minutes for a single anonymous visitor,
         # and checkout no longer requires an account, so most real traffic is
         # anonymous by design. 1000/hour matches the authenticated rate.
-        'anon': '1000/hour',
-        'user': '1000/hour',
+        'anon': config('THROTTLE_RATE_ANON', default='1000/hour'),
+        'user': config('THROTTLE_RATE_USER', default='1000/hour'),
     },
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
@@ -223,6 +315,10 @@ SIMPLE_JWT = {
     
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
+
+    # Blacklist des refresh tokens dans Redis (cle par jti, TTL = duree de vie
+    # restante) au lieu des tables OutstandingToken/BlacklistedToken
+    'TOKEN_REFRESH_SERIALIZER': 'apps.users.serializers.TokenRefreshSerializer',
 }
 
 # ========== CORS ==========
@@ -260,7 +356,12 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 
 # ========== SWAGGER/OPENAPI ==========
+# Schema pregenere (manage.py generate_openapi_schema), servi par core/openapi.py.
+# Chaine paresseuse : les URLs ne sont pas encore chargees a ce stade.
+OPENAPI_SPEC_URL = lazy(lambda: import_string('core.openapi.spec_url')(), str)()
+
 SWAGGER_SETTINGS = {
+    'SPEC_URL': OPENAPI_SPEC_URL,
     'SECURITY_DEFINITIONS': {
         'Bearer': {
             'type': 'apiKey',
@@ -273,6 +374,10 @@ SWAGGER_SETTINGS = {
     'LOGOUT_URL': 'rest_framework:logout',
 }
 
+REDOC_SETTINGS = {
+    'SPEC_URL': OPENAPI_SPEC_URL,
+}
+
 # ========== EMAIL (Console pour développement) ==========
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
@@ -303,6 +408,18 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        # Une ligne par requete (core/middleware.py) ; WARNING pour la couper
+        'core.requests': {
+            'handlers': ['console'],
+            'level': config('REQUEST_LOG_LEVEL', default='INFO'),
+            'propagate': False,
+        },
+        # Requetes au-dela de SLOW_QUERY_MS, avec leur plan (core/slow_queries.py)
+        'core.slow_queries': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
     },
 }
 
@@ -351,6 +468,10 @@ SOCIALACCOUNT_PROVIDERS = {
     },
 }
 
+# Source des cles de signature Google (JWKS) pour verifier les id_token hors
+# ligne ; par defaut telechargees et mises en cache (voir apps/users/google.py)
+GOOGLE_JWKS_SOURCE = config('GOOGLE_JWKS_SOURCE', default='') or None
+
 # Adapter la création d'utilisateur pour notre modèle custom
 SOCIALACCOUNT_ADAPTER = 'apps.users.adapters.CustomSocialAccountAdapter'
 
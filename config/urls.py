@@ -2,22 +2,11 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 
-schema_view = get_schema_view(
-    openapi.Info(
-        title="EROLS EasyBuy API",
-        default_version='v1',
-        description="API pour la plateforme EROLS EasyBuy - Plateforme e-commerce camerounaise",
-        terms_of_service="https://www.erols.cm/terms/",
-        contact=openapi.Contact(email="contact@erols.cm"),
-        license=openapi.License(name="Proprietary"),
-    ),
-    public=True,
-    permission_classes=[permissions.AllowAny],
-)
+from core.memory_views import MemoryView
+from core.metrics import metrics_view
+from core.profiling import ProfileFileView, ProfileListView
+from core.urls import lazy_include_prefixes
 
 urlpatterns = [
     # Administration Django
@@ -26,10 +15,8 @@ urlpatterns = [
     # API REST Framework - Authentification browsable (requis pour Swagger)
     path('api-auth/', include('rest_framework.urls', namespace='rest_framework')),
     
-    # Documentation API
-    path('swagger<format>/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    # Documentation API (swagger/, swagger<format>/, redoc/), importee au premier appel
+    lazy_include_prefixes(('swagger', 'redoc'), 'config.docs_urls'),
     
     # API Endpoints
     path('api/users/', include('apps.users.urls')),
@@ -38,6 +25,15 @@ urlpatterns = [
     # path('api/delivery/', include('apps.delivery.urls')),
     # path('api/marketplace/', include('apps.marketplace.urls')),
     # path('api/notifications/', include('apps.notifications.urls')),
+
+    # Metriques Prometheus (jeton METRICS_TOKEN)
+    path('metrics', metrics_view, name='metrics'),
+
+    # Profils de requetes (staff, voir core/profiling.py)
+    path('api/profiles/', ProfileListView.as_view(), name='profile-list'),
+    path('api/profiles/<path:profile_id>/', ProfileFileView.as_view(), name='profile-file'),
+    # Memoire du worker (staff, voir core/memory.py)
+    path('api/memory/', MemoryView.as_view(), name='worker-memory'),
 ]
 
 # Servir les fichiers media en développement
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    name = 'core'
+
+    def ready(self):
+        from . import instrumentation, slow_queries
+
+        instrumentation.install()
+        slow_queries.install()
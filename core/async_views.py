@@ -0,0 +1,138 @@
+"""Fast path for cached read-only API endpoints.
+
+For endpoints whose answer is usually already cached, read_view() wraps the
+DRF view:
+
+- GET/HEAD with a cached payload: JWT authentication and the DRF throttles
+  run as they would in APIView, then the body stored next to the payload in
+  the negotiated encoding (core/compression.py) is sent as is: the same
+  bytes DRF's JSONRenderer would produce, already gzip/brotli compressed.
+  No serializer, no ORM, no compression at request time.
+- anything else (cache miss, writes, format suffixes): the original DRF
+  view runs in a thread. On a miss that fills the cache for the next request.
+
+Under WSGI (the default) the wrapper is a plain function calling
+serve_cached(). Under ASGI (ASYNC_VIEWS, set by config/asgi.py) it is a
+coroutine, so Django doesn't run the whole view in its sync thread; the hit
+path then runs in one sync_to_async call rather than through cache.aget():
+in Django 4.2 the cache backends' async methods are themselves
+sync_to_async wrappers, so awaiting the version key, the payload and the
+throttle separately would cost three thread hops instead of one. The
+coroutine is never installed under WSGI, where it would add an event loop
+(async_to_sync) and a thread hop to every request.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .compression import encoded_response, negotiate, variant_key
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+def json_response(data, status=200, headers=None):
+    return HttpResponse(
+        JSONRenderer().render(data),
+        content_type='application/json',
+        status=status,
+        headers=headers,
+    )
+
+
+def check_request(request):
+    """JWT authentication and default throttles, as APIView.initial() does
+    them. Returns an error response, or None if the request may proceed."""
+    authenticators = [auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    drf_request = Request(request, authenticators=authenticators)
+    try:
+        drf_request.user  # noqa: B018 - declenche l'authentification
+    except exceptions.AuthenticationFailed as exc:
+        # Meme forme que exception_handler de DRF
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        headers = None
+        if authenticators:
+            headers = {'WWW-Authenticate': authenticators[0].authenticate_header(drf_request)}
+        return json_response(data, status=exc.status_code, headers=headers)
+
+    for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+        throttle = throttle_class()
+        if not throttle.allow_request(drf_request, None):
+            wait = throttle.wait()
+            exc = exceptions.Throttled(wait)
+            headers = {'Retry-After': '%d' % wait} if wait is not None else None
+            return json_response({'detail': exc.detail}, status=exc.status_code, headers=headers)
+    return None
+
+
+def serve_cached(cache_key, request, kwargs, on_hit=None):
+    """The whole cache-hit path in one call, so the async view needs a
+    single thread hop: cached body, then authentication and throttles.
+    Returns a response, or None on a cache miss."""
+    key = cache_key(**kwargs)
+    encoding = negotiate(request.headers.get('Accept-Encoding'))
+    body_key = variant_key(key, encoding)
+    data = None
+    if on_hit is None:
+        body = cache.get(body_key)
+    else:
+        # on_hit a besoin du payload : une seule lecture pour les deux
+        found = cache.get_many([key, body_key])
+        body, data = found.get(body_key), found.get(key)
+        if data is None:
+            body = None
+    if body is None:
+        return None
+    error = check_request(request)
+    if error is not None:
+        return error
+    if on_hit is not None:
+        on_hit(data)
+    return encoded_response(body, encoding)
+
+
+def _like_drf(view, drf_view):
+    # Comme les vues DRF : pas de CSRF (authentification JWT uniquement)
+    view.csrf_exempt = True
+    view.cls = getattr(drf_view, 'cls', None)
+    view.initkwargs = getattr(drf_view, 'initkwargs', None)
+    view.actions = getattr(drf_view, 'actions', None)
+    return view
+
+
+def sync_read_view(cache_key, drf_view, on_hit=None):
+    """WSGI version of async_read_view(): same hit path, no event loop."""
+
+    def view(request, *args, **kwargs):
+        if request.method in READ_METHODS and not kwargs.get('format'):
+            response = serve_cached(cache_key, request, kwargs, on_hit)
+            if response is not None:
+                return response
+        return drf_view(request, *args, **kwargs)
+
+    return _like_drf(view, drf_view)
+
+
+def async_read_view(cache_key, drf_view, on_hit=None):
+    """Wraps drf_view. cache_key(**url_kwargs) returns the versioned key the
+    DRF view caches its payload under with cache_payload(); on_hit(data) is
+    an optional callback (e.g. a view counter) run after a served hit."""
+
+    async def view(request, *args, **kwargs):
+        if request.method in READ_METHODS and not kwargs.get('format'):
+            response = await sync_to_async(serve_cached)(cache_key, request, kwargs, on_hit)
+            if response is not None:
+                return response
+        return await sync_to_async(drf_view)(request, *args, **kwargs)
+
+    return _like_drf(view, drf_view)
+
+
+def read_view(cache_key, drf_view, on_hit=None):
+    """async_read_view() under ASGI (ASYNC_VIEWS), sync_read_view() otherwise."""
+    wrap = async_read_view if settings.ASYNC_VIEWS else sync_read_view
+    return wrap(cache_key, drf_view, on_hit=on_hit)
@@ -0,0 +1,208 @@
+"""Per-request counters for SQL queries, cache calls and storage calls.
+
+RequestStats counts the calls and the time spent, per request, in:
+
+    db       SQL queries (an execute_wrapper on every connection)
+    cache    Django cache calls (get, set, get_many...) and raw Redis
+             commands (core/redis.py); misses are counted for get/get_many
+    storage  file storage I/O (exists, open, save...), e.g. the WebP
+             lookups of the product serializers
+
+The hooks are installed once, from CoreConfig.ready(). Outside a collect()
+block they cost one ContextVar lookup per call. The current stats live in a
+ContextVar, so they follow the request into sync_to_async threads.
+
+A call made by another instrumented call of the same kind is not counted
+again (BaseCache.get_many looping over get, RedisCache going through the
+raw Redis client). Nested collect() blocks add their counts to the
+enclosing block on exit: the middleware collects each request, and a test
+can wrap client calls around it (core/testing.py).
+
+Lookups of versioned keys ("products:v12:product:detail:<slug>:br") are
+also recorded per namespace ("product:detail"): hit if any lookup of the
+namespace hit during the request, so a fast-path miss followed by the DRF
+view's own lookup counts once (core/metrics.py).
+
+RequestStatsMiddleware (core/middleware.py) turns the stats into a
+Server-Timing header, a log line and metrics.
+"""
+import functools
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.utils.module_loading import import_string
+
+KINDS = ('db', 'cache', 'storage')
+
+CACHE_METHODS = (
+    'get', 'get_many', 'set', 'set_many', 'add', 'get_or_set', 'delete', 'delete_many',
+    'has_key', 'incr', 'decr', 'touch', 'clear',
+)
+# url() et path() ne font pas d'entree/sortie sur FileSystemStorage
+STORAGE_METHODS = ('open', 'save', 'delete', 'exists', 'listdir', 'size', 'get_modified_time')
+
+# <prefixe>:v<version>:<espace>:<sous-espace>[:...] (apps/products/cache.py)
+VERSIONED_KEY = re.compile(r'^[\w-]+:v\d+:([\w-]+:[\w-]+)')
+
+_stats = ContextVar('request_stats', default=None)
+# Genre de l'appel instrumente en cours (pas de double comptage)
+_inside = ContextVar('request_stats_inside', default=None)
+
+
+class RequestStats:
+    __slots__ = ('count', 'time', 'cache_misses', 'cache_namespaces', 'sql', 'duration')
+
+    def __init__(self, record_sql=False):
+        self.count = dict.fromkeys(KINDS, 0)
+        self.time = dict.fromkeys(KINDS, 0.0)
+        self.cache_misses = 0
+        self.cache_namespaces = {}
+        self.sql = [] if record_sql else None
+        self.duration = 0.0
+
+    def cache_lookup(self, key, hit):
+        if not hit:
+            self.cache_misses += 1
+        match = VERSIONED_KEY.match(key) if isinstance(key, str) else None
+        if match:
+            namespace = match.group(1)
+            self.cache_namespaces[namespace] = self.cache_namespaces.get(namespace, False) or hit
+
+    def add(self, other):
+        for kind in KINDS:
+            self.count[kind] += other.count[kind]
+            self.time[kind] += other.time[kind]
+        self.cache_misses += other.cache_misses
+        for namespace, hit in other.cache_namespaces.items():
+            self.cache_namespaces[namespace] = self.cache_namespaces.get(namespace, False) or hit
+        if self.sql is not None and other.sql is not None:
+            self.sql.extend(other.sql)
+
+    def as_dict(self):
+        data = {'duration_ms': round(self.duration * 1000, 2)}
+        for kind in KINDS:
+            data[f'{kind}_calls'] = self.count[kind]
+            data[f'{kind}_ms'] = round(self.time[kind] * 1000, 2)
+        data['cache_misses'] = self.cache_misses
+        return data
+
+    def server_timing(self):
+        return ', '.join([
+            f'db;dur={self.time["db"] * 1000:.2f};desc="{self.count["db"]} queries"',
+            f'cache;dur={self.time["cache"] * 1000:.2f};'
+            f'desc="{self.count["cache"]} calls, {self.cache_misses} misses"',
+            f'storage;dur={self.time["storage"] * 1000:.2f};desc="{self.count["storage"]} calls"',
+            f'total;dur={self.duration * 1000:.2f}',
+        ])
+
+
+def current_stats():
+    return _stats.get()
+
+
+@contextmanager
+def paused():
+    """Calls made inside the block are not counted (e.g. the EXPLAIN of a
+    slow query, core/slow_queries.py)."""
+    token = _stats.set(None)
+    try:
+        yield
+    finally:
+        _stats.reset(token)
+
+
+@contextmanager
+def collect(record_sql=False):
+    """Collects the calls made inside the block into a new RequestStats."""
+    parent = _stats.get()
+    stats = RequestStats(record_sql=record_sql or (parent is not None and parent.sql is not None))
+    token = _stats.set(stats)
+    start = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        stats.duration = time.perf_counter() - start
+        _stats.reset(token)
+        if parent is not None:
+            parent.add(stats)
+
+
+def _lookups(name, args, kwargs, result):
+    """(key, hit) for each key read by cache.get / cache.get_many."""
+    if name == 'get':
+        key = args[0] if args else kwargs.get('key')
+        default = args[1] if len(args) > 1 else kwargs.get('default')
+        return [(key, result is not default)]
+    keys = args[0] if args else kwargs.get('keys', ())
+    return [(key, key in result) for key in keys]
+
+
+def _wrap(method, name, kind):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        stats = _stats.get()
+        if stats is None or _inside.get() == kind:
+            return method(*args, **kwargs)
+        token = _inside.set(kind)
+        start = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+        finally:
+            stats.time[kind] += time.perf_counter() - start
+            stats.count[kind] += 1
+            _inside.reset(token)
+        if kind == 'cache' and name in ('get', 'get_many'):
+            # args[0] est l'instance du cache
+            for key, hit in _lookups(name, args[1:], kwargs, result):
+                stats.cache_lookup(key, hit)
+        return result
+
+    wrapper._instrumented = True
+    return wrapper
+
+
+def _instrument(cls, names, kind):
+    for name in names:
+        method = getattr(cls, name, None)
+        if method is not None and not getattr(method, '_instrumented', False):
+            setattr(cls, name, _wrap(method, name, kind))
+
+
+def _db_wrapper(execute, sql, params, many, context):
+    stats = _stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.time['db'] += time.perf_counter() - start
+        stats.count['db'] += 1
+        if stats.sql is not None:
+            stats.sql.append(sql)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    # Le signal est emis a chaque (re)connexion d'un meme DatabaseWrapper
+    if _db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_wrapper)
+
+
+def install():
+    connection_created.connect(_on_connection_created, dispatch_uid='core.instrumentation')
+
+    for alias in settings.CACHES:
+        _instrument(import_string(settings.CACHES[alias]['BACKEND']), CACHE_METHODS, 'cache')
+    for alias in settings.STORAGES:
+        _instrument(import_string(settings.STORAGES[alias]['BACKEND']), STORAGE_METHODS, 'storage')
+
+    if not settings.REDIS_URL:
+        return
+    import redis
+
+    _instrument(redis.Redis, ('execute_command',), 'cache')
+    _instrument(redis.client.Pipeline, ('execute',), 'cache')
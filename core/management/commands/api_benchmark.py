@@ -0,0 +1,384 @@
+"""
+Benchmark de charge de l'API : un melange de scenarios realistes joue en
+parallele, avec latence p50/p95/p99, debit et requetes SQL par requete.
+
+Scenarios (poids dans le melange) :
+
+    homepage        GET  /api/products/homepage/                      (20)
+    list_filters    GET  /api/products/?category=&min_price=&sort_by= (20)
+    search          GET  /api/products/?search=<marque ou gamme>      (15)
+    detail          GET  /api/products/<slug>/                        (25)
+    cart_checkout   POST /api/orders/orders/initiate_cart/  (JWT)     (5)
+    order_history   GET  /api/orders/orders/history/        (JWT)     (15)
+
+Par defaut tout tourne dans ce processus (client de test Django, pile de
+middlewares complete, un thread par client concurrent) : chaque requete SQL
+est comptee. Avec --base-url, les memes scenarios visent un serveur lance a
+part (gunicorn) ; les requetes SQL sont lues dans l'en-tete Server-Timing
+s'il est active sur le serveur (SERVER_TIMING, core/middleware.py). Le
+throttling est desactive en mode local ; pour --base-url, relever
+THROTTLE_RATE_ANON/THROTTLE_RATE_USER sur le serveur.
+
+Les parametres (slugs, categories, termes de recherche, clients) sont tires
+du catalogue en base, de preference celui de generate_catalog. Le scenario
+de commande ecrit en base.
+
+Baselines : --save-baseline NOM ecrit benchmarks/baselines/NOM.json,
+--compare NOM compare le run a ce fichier (requetes SQL par requete : une
+hausse de plus de 10 % est une regression ; latence p95 et debit : au-dela
+de --tolerance).
+Les latences dependent de la machine et de la base ; les requetes SQL non.
+
+Usage :
+    python manage.py generate_catalog --size 10k
+    python manage.py api_benchmark --concurrency 8 --duration 20 --save-baseline 10k-sqlite
+    python manage.py api_benchmark --compare 10k-sqlite --fail-on-regression
+    python manage.py api_benchmark --base-url http://127.0.0.1:8000 --scenario homepage --scenario detail
+"""
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone
+from unittest import mock
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from rest_framework.throttling import SimpleRateThrottle
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.orders.models import City
+from apps.products.models import Category, Product
+from apps.users.models import User
+from core.instrumentation import collect
+
+BASELINE_DIR = settings.BASE_DIR / 'benchmarks' / 'baselines'
+
+WEIGHTS = {
+    'homepage': 20,
+    'list_filters': 20,
+    'search': 15,
+    'detail': 25,
+    'cart_checkout': 5,
+    'order_history': 15,
+}
+SORTS = ['price_asc', 'price_desc', 'newest', 'name_asc']
+SERVER_TIMING_DB = re.compile(r'\bdb;dur=[\d.]+;desc="(\d+) queries"')
+# Moyenne sur un tirage aleatoire (ex. 1 a 3 articles par panier) : petite marge
+QUERY_TOLERANCE = 0.10
+
+
+def _pct(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))] if values else 0.0
+
+
+class Fixtures:
+    """Parametres des scenarios, tires du catalogue en base."""
+
+    def __init__(self, rng, sample=2000, users=50):
+        products = Product.objects.filter(is_available=True)
+        bounds = list(products.order_by('id').values_list('id', flat=True)[:1]) + \
+            list(products.order_by('-id').values_list('id', flat=True)[:1])
+        if not bounds:
+            raise CommandError('Catalogue vide : lancer generate_catalog')
+        # Tirage par ids (pas d'ORDER BY RANDOM() sur un million de lignes)
+        ids = [rng.randint(bounds[0], bounds[1]) for _ in range(sample)]
+        rows = list(products.filter(id__in=ids).values_list('id', 'slug', 'name', 'stock'))
+        if not rows:
+            rows = list(products.values_list('id', 'slug', 'name', 'stock')[:sample])
+        self.products = rows
+        # Le panier ne reserve pas le stock : ces produits restent commandables
+        self.in_stock = [row for row in rows if row[3] >= 3] or rows
+        self.categories = list(Category.objects.filter(is_active=True).values_list('slug', flat=True))
+        words = {word for _, _, name, _ in rows for word in name.split() if len(word) > 3 and word.isalpha()}
+        self.terms = sorted(words) or ['a']
+        self.city_ids = list(City.objects.filter(is_active=True).values_list('id', flat=True))
+        clients = User.objects.filter(is_active=True, username__startswith='gen-user-')
+        if not clients.exists():
+            clients = User.objects.filter(is_active=True, is_staff=False)
+        # Jetons d'acces seulement : pas de ligne OutstandingToken creee
+        self.tokens = [str(AccessToken.for_user(user)) for user in clients[:users]]
+
+
+def build_request(name, fixtures, rng):
+    """(methode, chemin, corps JSON ou None, en-tetes)."""
+    if name == 'homepage':
+        return 'GET', '/api/products/homepage/', None, {}
+    if name == 'list_filters':
+        params = {'sort_by': rng.choice(SORTS)}
+        if fixtures.categories and rng.random() < 0.8:
+            params['category'] = rng.choice(fixtures.categories)
+        else:
+            # Pages suivantes seulement sans filtre : elles existent toujours
+            params['page'] = rng.choice([1, 2, 3])
+        if rng.random() < 0.5:
+            low = rng.choice([0, 5000, 20000, 50000])
+            params['min_price'] = low
+            params['max_price'] = low * 10 + 50000
+        if rng.random() < 0.3:
+            params['in_stock'] = 'true'
+        return 'GET', f'/api/products/?{urlencode(params)}', None, {}
+    if name == 'search':
+        return 'GET', f"/api/products/?{urlencode({'search': rng.choice(fixtures.terms)})}", None, {}
+    if name == 'detail':
+        # Quelques fiches tres consultees, une longue traine
+        index = min(int(rng.paretovariate(1.0)) - 1, len(fixtures.products) - 1)
+        return 'GET', f'/api/products/{fixtures.products[index][1]}/', None, {}
+    token = rng.choice(fixtures.tokens)
+    headers = {'Authorization': f'Bearer {token}'}
+    if name == 'order_history':
+        return 'GET', '/api/orders/orders/history/', None, headers
+    items = [
+        {'product_id': product[0], 'quantity': rng.randint(1, 3)}
+        for product in rng.sample(fixtures.in_stock, k=min(len(fixtures.in_stock), rng.randint(1, 3)))
+    ]
+    body = {'items': items, 'city_id': rng.choice(fixtures.city_ids)}
+    return 'POST', '/api/orders/orders/initiate_cart/', body, headers
+
+
+class LocalTransport:
+    """Client de test Django dans le thread courant."""
+
+    def __init__(self):
+        self.client = Client()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        connection.close()
+
+    def send(self, method, path, body, headers):
+        extra = {f"HTTP_{key.upper().replace('-', '_')}": value for key, value in headers.items()}
+        with collect() as stats:
+            if method == 'GET':
+                response = self.client.get(path, **extra)
+            else:
+                response = self.client.post(path, json.dumps(body), content_type='application/json', **extra)
+        return response.status_code, stats.count['db']
+
+
+class HTTPTransport:
+    """Connexion HTTP/1.1 keep-alive vers un serveur lance a part ; requetes
+    SQL lues dans l'en-tete Server-Timing (SERVER_TIMING active)."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self.conn is not None:
+            self.conn.close()
+
+    def send(self, method, path, body, headers):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {'Accept-Encoding': 'gzip, br', **headers}
+        if payload is not None:
+            headers['Content-Type'] = 'application/json'
+        try:
+            self.conn.request(method, path, body=payload, headers=headers)
+            response = self.conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = None
+            return 'error', None
+        if response.getheader('Connection', '').lower() == 'close':
+            self.conn.close()
+            self.conn = None
+        match = SERVER_TIMING_DB.search(response.getheader('Server-Timing', ''))
+        return response.status, int(match.group(1)) if match else None
+
+
+class Command(BaseCommand):
+    help = "Benchmark de charge de l'API (latences, debit, requetes SQL par requete)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', '-c', type=int, default=8)
+        parser.add_argument('--duration', '-d', type=float, default=20, help='Secondes de mesure')
+        parser.add_argument('--warmup', type=float, default=3, help='Secondes de chauffe, non mesurees')
+        parser.add_argument('--scenario', action='append', choices=WEIGHTS, help='Scenario a inclure (repetable)')
+        parser.add_argument('--base-url', help='Serveur a viser (par defaut : en process)')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--save-baseline', metavar='NOM')
+        parser.add_argument('--compare', metavar='NOM')
+        parser.add_argument('--tolerance', type=float, default=0.25, help='Ecart toleré sur p95 et debit (0.25 = 25 %%)')
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        fixtures = Fixtures(rng)
+        scenarios = {name: WEIGHTS[name] for name in (options['scenario'] or WEIGHTS)}
+        if not fixtures.tokens:
+            scenarios.pop('cart_checkout', None)
+            scenarios.pop('order_history', None)
+        if not fixtures.city_ids:
+            scenarios.pop('cart_checkout', None)
+
+        if options['base_url']:
+            base_url = options['base_url']
+            transport = lambda: HTTPTransport(base_url)  # noqa: E731
+            result = self._run(transport, scenarios, fixtures, options)
+        else:
+            # Les vues lisent les taux a l'import : un taux None laisse tout passer
+            rates = dict.fromkeys(SimpleRateThrottle.THROTTLE_RATES)
+            allowed_hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+            request_logger = logging.getLogger('core.requests')
+            level = request_logger.level
+            # Pas de ligne de log par requete pendant la mesure
+            request_logger.setLevel(logging.WARNING)
+            try:
+                with mock.patch.object(SimpleRateThrottle, 'THROTTLE_RATES', rates), \
+                        override_settings(ALLOWED_HOSTS=allowed_hosts):
+                    result = self._run(LocalTransport, scenarios, fixtures, options)
+            finally:
+                request_logger.setLevel(level)
+
+        self._report(result)
+        if options['save_baseline']:
+            path = BASELINE_DIR / f"{options['save_baseline']}.json"
+            BASELINE_DIR.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(result, indent=2, ensure_ascii=False, sort_keys=True) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Baseline ecrite : {path}'))
+        if options['compare']:
+            regressions = self._compare(result, options['compare'], options['tolerance'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f'{len(regressions)} regression(s) par rapport a {options["compare"]}')
+
+    def _run(self, transport_factory, scenarios, fixtures, options):
+        names, weights = list(scenarios), list(scenarios.values())
+        samples = {name: [] for name in names}  # (latence, requetes SQL, statut)
+        lock = threading.Lock()
+        start_at = time.perf_counter() + options['warmup']
+        stop_at = start_at + options['duration']
+
+        def worker(seed):
+            rng = random.Random(seed)
+            local = []
+            with transport_factory() as transport:
+                while True:
+                    now = time.perf_counter()
+                    if now >= stop_at:
+                        break
+                    name = rng.choices(names, weights)[0]
+                    method, path, body, headers = build_request(name, fixtures, rng)
+                    began = time.perf_counter()
+                    status, queries = transport.send(method, path, body, headers)
+                    elapsed = time.perf_counter() - began
+                    if began >= start_at:
+                        local.append((name, elapsed, queries, status))
+            with lock:
+                for name, elapsed, queries, status in local:
+                    samples[name].append((elapsed, queries, status))
+
+        threads = [
+            threading.Thread(target=worker, args=(options['seed'] * 1000 + i,))
+            for i in range(options['concurrency'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        duration = options['duration']
+        result = {'meta': self._meta(options, fixtures, transport_factory), 'scenarios': {}}
+        for name, rows in samples.items():
+            latencies = [row[0] for row in rows]
+            queries = [row[1] for row in rows if row[1] is not None]
+            errors = sum(1 for row in rows if not (isinstance(row[2], int) and row[2] < 400))
+            result['scenarios'][name] = {
+                'requests': len(rows),
+                'rps': round(len(rows) / duration, 1),
+                'p50_ms': round(_pct(latencies, 50) * 1000, 2),
+                'p95_ms': round(_pct(latencies, 95) * 1000, 2),
+                'p99_ms': round(_pct(latencies, 99) * 1000, 2),
+                'queries_per_request': round(statistics.fmean(queries), 2) if queries else None,
+                'errors': errors,
+            }
+        total = sum(s['requests'] for s in result['scenarios'].values())
+        result['total_rps'] = round(total / duration, 1)
+        return result
+
+    def _meta(self, options, fixtures, transport_factory):
+        try:
+            revision = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR,
+            ).stdout.strip() or None
+        except OSError:
+            revision = None
+        return {
+            'date': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'revision': revision,
+            'target': options['base_url'] or 'in-process',
+            'database': connection.vendor,
+            'products': Product.objects.count(),
+            'concurrency': options['concurrency'],
+            'duration_s': options['duration'],
+            'python': platform.python_version(),
+            'machine': f'{platform.machine()}, {os.cpu_count()} CPU',
+        }
+
+    def _report(self, result):
+        meta = result['meta']
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\n{meta['products']} produits ({meta['database']}), {meta['target']}, "
+            f"c={meta['concurrency']}, {meta['duration_s']:.0f} s"
+        ))
+        self.stdout.write(
+            f"  {'scenario':<15} {'req':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'SQL/req':>8} {'err':>5}"
+        )
+        for name, s in result['scenarios'].items():
+            queries = '-' if s['queries_per_request'] is None else f"{s['queries_per_request']:.1f}"
+            self.stdout.write(
+                f"  {name:<15} {s['requests']:>7} {s['rps']:>8.1f} {s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} "
+                f"{s['p99_ms']:>8.1f} {queries:>8} {s['errors']:>5}"
+            )
+        self.stdout.write(f"  total : {result['total_rps']:.1f} req/s")
+
+    def _compare(self, result, name, tolerance):
+        path = BASELINE_DIR / f'{name}.json'
+        if not path.exists():
+            raise CommandError(f'Baseline introuvable : {path}')
+        baseline = json.loads(path.read_text())
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\nComparaison avec {name} ({baseline['meta']['date']}, {baseline['meta']['revision']})"
+        ))
+        regressions = []
+        for scenario, current in result['scenarios'].items():
+            before = baseline['scenarios'].get(scenario)
+            if before is None or not current['requests']:
+                continue
+            problems = []
+            if current['queries_per_request'] is not None and before['queries_per_request'] is not None \
+                    and current['queries_per_request'] > before['queries_per_request'] * (1 + QUERY_TOLERANCE) + 0.5:
+                problems.append(f"SQL/req {before['queries_per_request']} -> {current['queries_per_request']}")
+            if before['p95_ms'] and current['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+                problems.append(f"p95 {before['p95_ms']} -> {current['p95_ms']} ms")
+            if before['rps'] and current['rps'] < before['rps'] * (1 - tolerance):
+                problems.append(f"req/s {before['rps']} -> {current['rps']}")
+            if problems:
+                regressions.append(scenario)
+                self.stdout.write(self.style.ERROR(f"  {scenario:<15} REGRESSION : {', '.join(problems)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f"  {scenario:<15} ok (p95 {before['p95_ms']} -> {current['p95_ms']} ms, "
+                    f"SQL/req {before['queries_per_request']} -> {current['queries_per_request']})"
+                ))
+        return regressions
@@ -0,0 +1,50 @@
+"""
+Genere le schema OpenAPI de l'API dans static/openapi/ (schema.json et
+schema.yaml), servi ensuite tel quel par /swagger.json, /swagger.yaml, la
+Swagger UI et ReDoc (voir core/openapi.py).
+
+La sortie est deterministe (requete anonyme fictive, pas d'hote, ordre de
+l'URLconf) : les fichiers sont commites et toute modification de l'API
+apparait dans le diff de la revue. A relancer apres chaque changement de vue
+ou de serialiseur.
+Les bornes des entiers sont celles de PostgreSQL (production) quel que soit
+le DATABASE_URL local : meme schema sous SQLite.
+
+Usage :
+    python manage.py generate_openapi_schema
+    python manage.py generate_openapi_schema --check   # CI : echoue si le schema commite est perime
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core.openapi import FORMATS, SCHEMA_DIR, generate_schema
+
+
+class Command(BaseCommand):
+    help = "Genere le schema OpenAPI statique (static/openapi/)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="N'ecrit rien ; code de sortie non nul si les fichiers different du schema genere",
+        )
+
+    def handle(self, *args, **options):
+        generated = generate_schema()
+        stale = []
+        for fmt, (filename, _) in FORMATS.items():
+            path = SCHEMA_DIR / filename
+            current = path.read_bytes() if path.exists() else None
+            if current == generated[fmt]:
+                self.stdout.write(f'{path} : a jour')
+                continue
+            if options['check']:
+                stale.append(str(path))
+                continue
+            SCHEMA_DIR.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(generated[fmt])
+            self.stdout.write(self.style.SUCCESS(f'{path} : ecrit'))
+
+        if stale:
+            raise CommandError(
+                f"Schema OpenAPI perime : {', '.join(stale)}. Lancer `python manage.py generate_openapi_schema`."
+            )
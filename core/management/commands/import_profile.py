@@ -0,0 +1,94 @@
+"""
+Profil du temps d'import au demarrage d'un worker, agrege par application.
+
+Lance un interpreteur neuf avec `python -X importtime` qui rejoue le
+demarrage d'un worker en deux phases :
+
+  - "app" : chargement de l'application (config.wsgi ou config.asgi :
+    django.setup(), modeles des INSTALLED_APPS, middlewares) ;
+  - "first request" : resolution d'un chemin, c'est-a-dire l'URLconf et les
+    vues qu'il importe (sans les modules charges a la demande, voir
+    core/urls.py).
+
+Chaque module est rattache a l'entree d'INSTALLED_APPS la plus longue qui le
+prefixe, sinon a son paquet de premier niveau. Le rapport donne, par phase,
+le temps propre cumule (hors sous-imports deja comptes ailleurs) et le nombre
+de modules.
+
+Usage :
+    python manage.py import_profile
+    python manage.py import_profile --app config.asgi --path /api/products/ --top 25
+"""
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+PHASE_MARK = 'import-profile-phase:'
+# import time:       350 |        512 |   django.urls
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)')
+
+SCRIPT = """
+import os, sys
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+sys.stderr.write('{mark}app\\n')
+import {app}
+sys.stderr.write('{mark}first request\\n')
+from django.urls import resolve
+try:
+    resolve({path!r})
+except Exception:
+    pass
+"""
+
+
+def app_group(module, apps):
+    for app in apps:
+        if module == app or module.startswith(app + '.'):
+            return app
+    return module.split('.')[0]
+
+
+class Command(BaseCommand):
+    help = "Temps d'import du demarrage d'un worker, agrege par application"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--app', default='config.wsgi', help="Module de l'application (config.wsgi, config.asgi)")
+        parser.add_argument('--path', default='/api/products/', help='Chemin resolu pour la phase "first request"')
+        parser.add_argument('--top', type=int, default=15, help='Groupes affiches par phase')
+
+    def handle(self, *args, **options):
+        script = SCRIPT.format(mark=PHASE_MARK, app=options['app'], path=options['path'])
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', script],
+            capture_output=True, text=True, cwd=settings.BASE_DIR,
+        )
+        if proc.returncode:
+            raise CommandError(proc.stderr[-2000:])
+
+        # Plus long prefixe d'abord : apps.users avant apps
+        apps = sorted((a for a in settings.INSTALLED_APPS), key=len, reverse=True)
+        phases = {}
+        phase = None
+        for line in proc.stderr.splitlines():
+            if line.startswith(PHASE_MARK):
+                phase = phases.setdefault(line[len(PHASE_MARK):], defaultdict(lambda: [0, 0]))
+                continue
+            match = IMPORTTIME_LINE.match(line)
+            if match and phase is not None:
+                group = phase[app_group(match.group(4), apps)]
+                group[0] += int(match.group(1))
+                group[1] += 1
+
+        for name, groups in phases.items():
+            total = sum(us for us, _ in groups.values())
+            modules = sum(count for _, count in groups.values())
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'\nphase "{name}" : {total / 1000:.0f} ms, {modules} modules'
+            ))
+            ranked = sorted(groups.items(), key=lambda item: item[1][0], reverse=True)
+            for group, (us, count) in ranked[:options['top']]:
+                self.stdout.write(f'  {group:<45} {us / 1000:8.1f} ms  {count:5d} modules')
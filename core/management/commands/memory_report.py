@@ -0,0 +1,99 @@
+"""
+Rapport memoire des workers gunicorn, a partir des snapshots tracemalloc et
+de l'historique RSS ecrits dans MEMORY_DIR (voir core/memory.py ; lancer les
+workers avec MEMORY_TRACE=25).
+
+Pour chaque worker : RSS au premier et au dernier releve, croissance par
+heure, puis les sites d'allocation qui ont le plus grossi entre le premier
+snapshot (juste apres le fork) et le dernier (ou --from / --to).
+
+Usage :
+    python manage.py memory_report
+    python manage.py memory_report --pid 4242 --top 30 --group-by traceback
+    python manage.py memory_report --prune        # supprime les workers termines
+"""
+import os
+import shutil
+import tracemalloc
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import memory
+
+MB = 2**20
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Command(BaseCommand):
+    help = 'Croissance memoire des workers (tracemalloc, RSS)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pid', type=int, action='append', help='Worker(s) a analyser (defaut : tous)')
+        parser.add_argument('--top', type=int, default=15)
+        parser.add_argument('--group-by', default='lineno', choices=['lineno', 'filename', 'traceback'])
+        parser.add_argument('--from', dest='start', type=int, default=0, help='Index du snapshot de depart')
+        parser.add_argument('--to', dest='end', type=int, default=-1, help="Index du snapshot d'arrivee")
+        parser.add_argument('--prune', action='store_true', help='Supprime les repertoires des workers termines')
+
+    def handle(self, *args, **options):
+        if not memory.MEMORY_DIR.exists():
+            raise CommandError(f'{memory.MEMORY_DIR} absent : lancer les workers avec MEMORY_TRACE')
+        directories = sorted(d for d in memory.MEMORY_DIR.iterdir() if d.name.isdigit())
+        if options['pid']:
+            directories = [d for d in directories if int(d.name) in options['pid']]
+
+        if options['prune']:
+            for directory in directories:
+                if not _alive(int(directory.name)):
+                    shutil.rmtree(directory)
+                    self.stdout.write(f'{directory} : supprime')
+            return
+
+        for directory in directories:
+            self.report(directory, options)
+
+    def report(self, directory, options):
+        pid = int(directory.name)
+        history = memory.rss_history(directory)
+        state = 'actif' if _alive(pid) else 'termine'
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\nWorker {pid} ({state})'))
+        if history:
+            first, last = history[0], history[-1]
+            hours = (last['time'] - first['time']) / 3600
+            # Pente seulement sur une duree qui a un sens
+            rate = f"{(last['rss'] - first['rss']) / MB / hours:+.1f} Mo/h, " if hours >= 0.1 else ''
+            self.stdout.write(
+                f"  RSS {first['rss'] / MB:.0f} Mo ({datetime.fromtimestamp(first['time']):%d/%m %H:%M}) -> "
+                f"{last['rss'] / MB:.0f} Mo ({datetime.fromtimestamp(last['time']):%d/%m %H:%M}), "
+                f"{rate}traced {last['traced'] / MB:.1f} Mo"
+            )
+
+        snapshots = memory.list_snapshots(directory)
+        if len(snapshots) < 2:
+            self.stdout.write('  moins de deux snapshots, rien a comparer')
+            return
+        try:
+            old_path, new_path = snapshots[options['start']], snapshots[options['end']]
+        except IndexError:
+            raise CommandError(f'{len(snapshots)} snapshots pour le worker {pid}')
+        old = tracemalloc.Snapshot.load(str(old_path))
+        new = tracemalloc.Snapshot.load(str(new_path))
+        self.stdout.write(
+            f'  {datetime.fromtimestamp(int(old_path.stem)):%d/%m %H:%M} -> '
+            f'{datetime.fromtimestamp(int(new_path.stem)):%d/%m %H:%M}, par {options["group_by"]} :'
+        )
+        for row in memory.top_growth(new, old, options['group_by'], options['top']):
+            self.stdout.write(
+                f"  {row['size_diff'] / 1024:+10.1f} Ko {row['count_diff']:+8d} blocs  {row['site']}"
+                + (f"\n{'':33}{row['line'][:100]}" if row['line'] else '')
+            )
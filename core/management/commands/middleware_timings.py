@@ -0,0 +1,97 @@
+"""
+Temps passe dans chaque middleware, pour quelques chemins representatifs.
+
+Chaque requete (RequestFactory, en process, sans serveur) traverse deux
+piles construites a partir des settings :
+
+  - "complete" : MIDDLEWARE + FULL_ONLY_MIDDLEWARE, la pile d'avant le
+    dispatcher, appliquee a toutes les requetes ;
+  - "effective" : ce que le dispatcher applique reellement a ce chemin
+    (voir core/middleware.py).
+
+Le rapport donne, par couche, le temps propre median et p95 (hors couches
+internes) en microsecondes ; la ligne "view" inclut la resolution d'URL.
+Le throttling DRF est desactive pendant la mesure.
+
+Usage :
+    python manage.py middleware_timings
+    python manage.py middleware_timings --path /api/products/ --path /admin/login/ -n 500
+"""
+import statistics
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+
+from core.middleware import StackHandler, uses_full_stack
+
+DISPATCHER = 'core.middleware.PathMiddlewareDispatcher'
+DEFAULT_PATHS = ['/api/products/homepage/', '/api/products/', '/admin/login/']
+
+
+def _pct(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+class Command(BaseCommand):
+    help = "Rapport du temps passe dans chaque middleware (pile complete vs pile effective)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', action='append', dest='paths', help='Chemin a mesurer (repetable)')
+        parser.add_argument('-n', '--requests', type=int, default=200, help='Requetes par chemin et par pile')
+        parser.add_argument('--authorization', default='', help='En-tete Authorization (ex. "Bearer <jwt>")')
+
+    def handle(self, *args, **options):
+        common = [m for m in settings.MIDDLEWARE if m != DISPATCHER]
+        factory = RequestFactory()
+        headers = {'HTTP_AUTHORIZATION': options['authorization']} if options['authorization'] else {}
+        # Sans throttling : la mesure enchaine des centaines de requetes
+        rest_framework = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_CLASSES': []}
+
+        with override_settings(REST_FRAMEWORK=rest_framework):
+            for path in options['paths'] or DEFAULT_PATHS:
+                stacks = {
+                    'complete': common + settings.FULL_ONLY_MIDDLEWARE,
+                    'effective': common + (settings.FULL_ONLY_MIDDLEWARE if uses_full_stack(path) else []),
+                }
+                self._report(path, stacks, factory, headers, options['requests'])
+
+    def _report(self, path, stacks, factory, headers, count):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n{path}'))
+        runs = {}
+        for name, middleware in stacks.items():
+            timings = {}
+            layers = middleware + [StackHandler.VIEW]
+            runs[name] = (StackHandler(middleware, timings=timings), timings, layers, {l: [] for l in layers})
+
+        # Piles alternees requete par requete : meme bruit de fond pour les deux
+        statuses = {}
+        for i in range(count + 1):
+            for name, (handler, timings, layers, self_times) in runs.items():
+                timings.clear()
+                statuses[name] = handler._middleware_chain(factory.get(path, **headers)).status_code
+                if i == 0:
+                    continue  # premiere requete : imports et caches froids
+                cumulative = [timings.get(layer, [0.0])[0] for layer in layers]
+                for j, layer in enumerate(layers):
+                    inner = cumulative[j + 1] if j + 1 < len(layers) else 0.0
+                    self_times[layer].append(max(cumulative[j] - inner, 0.0))
+
+        middleware_total = {}
+        for name, (handler, timings, layers, self_times) in runs.items():
+            self.stdout.write(f'  pile {name} (HTTP {statuses[name]}) :')
+            for layer in layers:
+                values = self_times[layer]
+                self.stdout.write(
+                    f'    {layer:<60} median {statistics.median(values) * 1e6:8.1f} us'
+                    f'   p95 {_pct(values, 95) * 1e6:8.1f} us'
+                )
+            middleware_total[name] = sum(
+                statistics.median(self_times[layer]) for layer in layers if layer != StackHandler.VIEW
+            )
+        saved = (middleware_total['complete'] - middleware_total['effective']) * 1e6
+        self.stdout.write(self.style.SUCCESS(
+            f'  middlewares (median) : complete {middleware_total["complete"] * 1e6:.1f} us, '
+            f'effective {middleware_total["effective"] * 1e6:.1f} us, gain {saved:.1f} us par requete'
+        ))
@@ -0,0 +1,176 @@
+"""Worker memory: RSS, tracemalloc snapshots and a memory ceiling.
+
+Started in each gunicorn worker right after the fork (gunicorn.conf.py,
+post_fork), from environment variables:
+
+    MEMORY_TRACE=25              tracemalloc with 25 frames per allocation
+                                 (0: off; roughly +30 % CPU and memory)
+    MEMORY_SNAPSHOT_INTERVAL=600 a snapshot every 10 min while tracing
+    MEMORY_DIR=/tmp/erols-memory snapshots, MEMORY_DIR/<pid>/
+    MEMORY_CEILING_MB=400        recycle the worker above this RSS (0: off)
+
+Only allocations made after the fork are traced: what a leak adds over
+days, not the application loaded by the master. Each worker keeps its first
+snapshot (the baseline) and the last MEMORY_SNAPSHOT_KEEP, plus an RSS
+history (rss.jsonl). `manage.py memory_report` compares them per worker, and
+/api/memory/ (staff) does it live for the worker that serves the request.
+
+The ceiling watchdog checks RSS every MEMORY_CHECK_INTERVAL seconds. Above
+the ceiling (with a few percent of jitter, so the workers don't all restart
+together), the worker sends itself SIGTERM: it finishes its requests within
+the graceful timeout and the master starts a fresh one. This replaces a
+max_requests recycling: a worker restarts when it is too big, not after an
+arbitrary number of requests.
+
+Stdlib only: with preload_app off, post_fork runs before Django is loaded.
+"""
+import json
+import linecache
+import logging
+import os
+import random
+import signal
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+MEMORY_DIR = Path(os.environ.get('MEMORY_DIR', '/tmp/erols-memory'))
+SNAPSHOT_KEEP = int(os.environ.get('MEMORY_SNAPSHOT_KEEP', '10'))
+SNAPSHOT_SUFFIX = '.tracemalloc'
+
+_page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def rss_bytes() -> int:
+    try:
+        with open('/proc/self/statm', 'rb') as statm:
+            return int(statm.read().split()[1]) * _page_size
+    except OSError:
+        # Hors Linux : pic de RSS seulement (ko sous Linux/BSD, octets sous macOS)
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def worker_dir(pid=None) -> Path:
+    return MEMORY_DIR / str(pid or os.getpid())
+
+
+def _filtered(snapshot):
+    return snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, linecache.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        tracemalloc.Filter(False, '<unknown>'),
+    ))
+
+
+def take_snapshot():
+    return _filtered(tracemalloc.take_snapshot())
+
+
+def record(snapshot=None) -> Path:
+    """Writes a snapshot (taken now if not given) and an RSS line for this
+    worker; keeps the first snapshot and the last SNAPSHOT_KEEP."""
+    directory = worker_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    now = time.time()
+    traced, peak = tracemalloc.get_traced_memory()
+    with open(directory / 'rss.jsonl', 'a') as history:
+        history.write(json.dumps({'time': round(now), 'rss': rss_bytes(), 'traced': traced, 'peak': peak}) + '\n')
+    if snapshot is None:
+        snapshot = take_snapshot()
+    path = directory / f'{now:.0f}{SNAPSHOT_SUFFIX}'
+    snapshot.dump(str(path))
+    snapshots = list_snapshots(directory)
+    for old in snapshots[1:-SNAPSHOT_KEEP]:
+        old.unlink(missing_ok=True)
+    return path
+
+
+def list_snapshots(directory) -> list:
+    return sorted(Path(directory).glob(f'*{SNAPSHOT_SUFFIX}'), key=lambda p: int(p.stem))
+
+
+def rss_history(directory) -> list:
+    path = Path(directory) / 'rss.jsonl'
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text().splitlines() if line]
+
+
+def top_growth(new, old, group_by='lineno', limit=20) -> list:
+    """Allocation sites that grew the most from old to new."""
+    stats = new.compare_to(old, group_by)
+    rows = []
+    for stat in stats[:limit]:
+        frame = stat.traceback[0]
+        rows.append({
+            'site': f'{frame.filename}:{frame.lineno}',
+            'size_diff': stat.size_diff,
+            'size': stat.size,
+            'count_diff': stat.count_diff,
+            'count': stat.count,
+            'line': linecache.getline(frame.filename, frame.lineno).strip(),
+        })
+    return rows
+
+
+def _every(interval, func, name):
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                func()
+            except Exception:
+                logger.exception('%s', name)
+
+    threading.Thread(target=loop, name=name, daemon=True).start()
+
+
+class CeilingWatchdog:
+    """Recycles the worker above ceiling bytes of RSS. The first check comes
+    after the application is loaded; a worker already near the ceiling then
+    disables it (otherwise every new worker would be recycled at once)."""
+
+    def __init__(self, ceiling):
+        self.ceiling = ceiling
+        self.checked = False
+
+    def __call__(self):
+        rss = rss_bytes()
+        if not self.checked:
+            self.checked = True
+            if rss > self.ceiling * 0.9:
+                logger.error(
+                    'Plafond memoire %.0f Mo trop bas : le worker %s occupe deja %.0f Mo, plafond ignore',
+                    self.ceiling / 2**20, os.getpid(), rss / 2**20,
+                )
+                raise SystemExit  # fin du thread de surveillance
+        if rss > self.ceiling:
+            logger.warning(
+                'Worker %s : RSS %.0f Mo au-dela du plafond %.0f Mo, recyclage',
+                os.getpid(), rss / 2**20, self.ceiling / 2**20,
+            )
+            os.kill(os.getpid(), signal.SIGTERM)
+            raise SystemExit
+
+
+def start_worker(environ=os.environ):
+    """post_fork: tracing, periodic snapshots and the memory ceiling."""
+    frames = int(environ.get('MEMORY_TRACE', '0'))
+    if frames:
+        tracemalloc.start(frames)
+        record()  # reference du worker
+        interval = int(environ.get('MEMORY_SNAPSHOT_INTERVAL', '600'))
+        if interval:
+            _every(interval, record, 'memory-snapshots')
+
+    ceiling_mb = float(environ.get('MEMORY_CEILING_MB', '0'))
+    if ceiling_mb:
+        watchdog = CeilingWatchdog(ceiling_mb * 2**20 * random.uniform(0.95, 1.05))
+        _every(int(environ.get('MEMORY_CHECK_INTERVAL', '30')), watchdog, 'memory-ceiling')
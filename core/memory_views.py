@@ -0,0 +1,94 @@
+"""Staff endpoint /api/memory/ for the worker that serves the request
+(core/memory.py).
+
+GET: RSS, tracemalloc state, sizes of the in-process caches (LocMemCache)
+and, while tracing, the allocation sites that grew the most since the
+worker's first snapshot; plus the snapshots every worker wrote to
+MEMORY_DIR. Query parameters: top (20), group_by (lineno, filename,
+traceback).
+
+POST {"action": "start" | "snapshot" | "stop"}: starts tracing in this
+worker (frames: 25 by default), writes a snapshot now, or stops tracing.
+Requests land on any worker: repeat, or use MEMORY_TRACE to trace them all.
+"""
+import os
+import tracemalloc
+
+from django.core.cache.backends import locmem
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import memory
+
+GROUP_BY = ('lineno', 'filename', 'traceback')
+MB = 2**20
+
+
+def _locmem_usage():
+    # Les valeurs de LocMemCache sont stockees picklees : len() = octets
+    return {
+        name: {'entries': len(entries), 'bytes': sum(len(value) for value in list(entries.values()))}
+        for name, entries in list(locmem._caches.items())
+    }
+
+
+def _workers():
+    workers = []
+    if not memory.MEMORY_DIR.exists():
+        return workers
+    for directory in sorted(memory.MEMORY_DIR.iterdir()):
+        history = memory.rss_history(directory)
+        if not history:
+            continue
+        workers.append({
+            'pid': int(directory.name),
+            'snapshots': len(memory.list_snapshots(directory)),
+            'first': history[0],
+            'last': history[-1],
+        })
+    return workers
+
+
+class MemoryView(APIView):
+    permission_classes = [IsAdminUser]
+    swagger_schema = None
+
+    def get(self, request):
+        top = int(request.query_params.get('top', 20))
+        group_by = request.query_params.get('group_by', 'lineno')
+        if group_by not in GROUP_BY:
+            return Response({'group_by': f'Valeurs possibles : {", ".join(GROUP_BY)}'}, status=400)
+
+        data = {
+            'pid': os.getpid(),
+            'rss_mb': round(memory.rss_bytes() / MB, 1),
+            'tracing': tracemalloc.is_tracing(),
+            'caches': _locmem_usage(),
+            'workers': _workers(),
+        }
+        if tracemalloc.is_tracing():
+            traced, peak = tracemalloc.get_traced_memory()
+            data.update(traced_mb=round(traced / MB, 1), traced_peak_mb=round(peak / MB, 1))
+            snapshots = memory.list_snapshots(memory.worker_dir())
+            if snapshots:
+                baseline = tracemalloc.Snapshot.load(str(snapshots[0]))
+                data['since_baseline'] = memory.top_growth(memory.take_snapshot(), baseline, group_by, top)
+        return Response(data)
+
+    def post(self, request):
+        action = request.data.get('action')
+        if action == 'start':
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(int(request.data.get('frames', 25)))
+                memory.record()
+        elif action == 'snapshot':
+            if not tracemalloc.is_tracing():
+                return Response({'detail': 'tracemalloc inactif dans ce worker'}, status=status.HTTP_409_CONFLICT)
+            memory.record()
+        elif action == 'stop':
+            tracemalloc.stop()
+        else:
+            return Response({'action': 'start, snapshot ou stop'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'pid': os.getpid(), 'tracing': tracemalloc.is_tracing()})
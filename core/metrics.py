@@ -0,0 +1,162 @@
+"""Prometheus metrics, aggregated across gunicorn workers.
+
+Each worker records its own values; /metrics (metrics_view) serves the sum
+over all workers in the Prometheus text format. Metrics recorded for every
+request (RequestStatsMiddleware):
+
+    http_request_duration_seconds{view,method}       histogram
+    http_responses_total{view,method,status}         counter
+    http_request_db_seconds{view}                    histogram
+    http_db_queries_total{view}                      counter
+    versioned_cache_requests_total{namespace,result} counter, hit/miss per
+        request for the versioned catalog keys (products:homepage,
+        product:detail...), see core/instrumentation.py
+
+and, where they happen, products_cache_bumps_total (apps/products/cache.py)
+and image_job_duration_seconds{job} (apps/products/image_utils.py).
+Gauges read at scrape time (callback_gauge()) give the current
+products:cache_version; delta(products_cache_version[1h]) counts every bump,
+including those made by management commands outside the web workers.
+
+Multiprocess: gunicorn.conf.py sets PROMETHEUS_MULTIPROC_DIR before the
+application is loaded, empties it when gunicorn starts and marks dead
+workers. prometheus_client then writes each worker's values to mmap'ed
+files in that directory, and the scrape merges them. Without the variable
+(runserver, shell), the values stay in the process.
+
+prometheus_client is optional: without it, metrics record nothing and
+/metrics answers 404.
+
+/metrics requires "Authorization: Bearer <METRICS_TOKEN>"; without a token
+it is only open in DEBUG.
+"""
+import os
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_safe
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:  # pragma: no cover - dependance optionnelle
+    prometheus_client = None
+
+UNRESOLVED = '<unresolved>'
+
+
+class _NoMetric:
+    """Same calls as a prometheus_client metric, recording nothing."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def observe(self, amount):
+        pass
+
+    def time(self):
+        return _NoTimer()
+
+
+class _NoTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+def counter(name, documentation, labelnames=()):
+    if prometheus_client is None:
+        return _NoMetric()
+    return prometheus_client.Counter(name, documentation, labelnames)
+
+
+def histogram(name, documentation, labelnames=(), buckets=None):
+    if prometheus_client is None:
+        return _NoMetric()
+    if buckets is None:
+        buckets = prometheus_client.Histogram.DEFAULT_BUCKETS
+    return prometheus_client.Histogram(name, documentation, labelnames, buckets=buckets)
+
+
+_callback_gauges = []
+
+
+def callback_gauge(name, documentation, func):
+    """Gauge computed at scrape time by func() (once, not per worker)."""
+    _callback_gauges.append((name, documentation, func))
+
+
+class _CallbackCollector:
+    def collect(self):
+        for name, documentation, func in _callback_gauges:
+            gauge = GaugeMetricFamily(name, documentation)
+            gauge.add_metric([], func())
+            yield gauge
+
+
+REQUEST_SECONDS = histogram(
+    'http_request_duration_seconds', 'Duree des requetes, par vue', ['view', 'method'],
+)
+RESPONSES = counter('http_responses_total', 'Reponses, par vue et statut', ['view', 'method', 'status'])
+DB_SECONDS = histogram(
+    'http_request_db_seconds', 'Temps SQL par requete, par vue', ['view'],
+    buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5),
+)
+DB_QUERIES = counter('http_db_queries_total', 'Requetes SQL, par vue', ['view'])
+VERSIONED_CACHE = counter(
+    'versioned_cache_requests_total', 'Requetes servies (hit) ou non (miss) par le cache versionne',
+    ['namespace', 'result'],
+)
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNRESOLVED
+    return match.view_name or match.route
+
+
+def observe_request(request, response, stats):
+    view = view_label(request)
+    REQUEST_SECONDS.labels(view, request.method).observe(stats.duration)
+    RESPONSES.labels(view, request.method, response.status_code).inc()
+    DB_SECONDS.labels(view).observe(stats.time['db'])
+    if stats.count['db']:
+        DB_QUERIES.labels(view).inc(stats.count['db'])
+    for namespace, hit in stats.cache_namespaces.items():
+        VERSIONED_CACHE.labels(namespace, 'hit' if hit else 'miss').inc()
+
+
+def render_metrics() -> bytes:
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    callbacks = prometheus_client.CollectorRegistry()
+    callbacks.register(_CallbackCollector())
+    return prometheus_client.generate_latest(registry) + prometheus_client.generate_latest(callbacks)
+
+
+def _authorized(request):
+    token = settings.METRICS_TOKEN
+    if not token:
+        return settings.DEBUG
+    scheme, _, value = request.headers.get('Authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and constant_time_compare(value, token)
+
+
+@require_safe
+def metrics_view(request):
+    if prometheus_client is None or not _authorized(request):
+        raise Http404
+    response = HttpResponse(render_metrics(), content_type=prometheus_client.CONTENT_TYPE_LATEST)
+    response['Cache-Control'] = 'no-store'
+    return response
@@ -0,0 +1,278 @@
+"""Path-based middleware stacks.
+
+The API is JWT-only: sessions, CSRF, Django's session authentication,
+messages, X-Frame-Options and allauth's AccountMiddleware only matter for
+the browser-facing parts (admin, allauth flows, API docs). Running them on
+every /api/ request is pure overhead (session cookie parsing, lazy user,
+message storage setup).
+
+settings.MIDDLEWARE keeps the layers every request needs and ends with
+PathMiddlewareDispatcher. The dispatcher sends LIGHT_MIDDLEWARE_PATHS
+(except FULL_MIDDLEWARE_PATHS) straight to the view, and every other request
+through the extra layers of FULL_ONLY_MIDDLEWARE. Those are loaded into a
+small BaseHandler of their own, so their process_view hooks (CSRF) work
+as usual.
+
+build_chain(..., timings=...) also serves the middleware_timings command,
+which reports the time spent in each layer.
+
+ThresholdGZipMiddleware replaces Django's GZipMiddleware: cached catalog
+reads arrive already compressed (core/compression.py), and small bodies
+aren't worth compressing at request time.
+
+RequestStatsMiddleware counts the SQL queries, cache calls and storage calls
+of each request (core/instrumentation.py), and reports them in a
+Server-Timing header (always with SERVER_TIMING, which defaults to DEBUG,
+otherwise only for staff users), a "core.requests" log line and the
+Prometheus metrics (core/metrics.py).
+
+ProfilingMiddleware profiles a request for a staff user who asks for it,
+or 1 request in N per route (core/profiling.py).
+"""
+import logging
+import os
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.exception import convert_exception_to_response
+from django.middleware.gzip import GZipMiddleware
+from django.utils.functional import SimpleLazyObject, empty
+from django.utils.module_loading import import_string
+
+from . import metrics, profiling
+from .instrumentation import collect, current_stats
+
+request_logger = logging.getLogger('core.requests')
+
+
+def _timed(name, handler, is_async, timings):
+    """Adds the time spent in handler (this layer and everything below it)
+    to timings[name]."""
+    if is_async:
+        async def timed(request):
+            start = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                timings.setdefault(name, []).append(time.perf_counter() - start)
+    else:
+        def timed(request):
+            start = time.perf_counter()
+            try:
+                return handler(request)
+            finally:
+                timings.setdefault(name, []).append(time.perf_counter() - start)
+    return timed
+
+
+class StackHandler(BaseHandler):
+    """A BaseHandler whose middleware list is given explicitly instead of
+    read from settings.MIDDLEWARE. Mirrors BaseHandler.load_middleware()."""
+
+    VIEW = 'view'
+
+    def __init__(self, middleware, is_async=False, timings=None):
+        self.middleware = list(middleware)
+        self.build_chain(is_async, timings)
+
+    def build_chain(self, is_async, timings=None):
+        self._view_middleware = []
+        self._template_response_middleware = []
+        self._exception_middleware = []
+
+        get_response = self._get_response_async if is_async else self._get_response
+        handler = convert_exception_to_response(get_response)
+        if timings is not None:
+            handler = _timed(self.VIEW, handler, is_async, timings)
+        handler_is_async = is_async
+        for middleware_path in reversed(self.middleware):
+            middleware = import_string(middleware_path)
+            if not handler_is_async and getattr(middleware, 'sync_capable', True):
+                middleware_is_async = False
+            else:
+                middleware_is_async = getattr(middleware, 'async_capable', False)
+            try:
+                adapted_handler = self.adapt_method_mode(
+                    middleware_is_async, handler, handler_is_async,
+                    debug=settings.DEBUG, name=f'middleware {middleware_path}',
+                )
+                mw_instance = middleware(adapted_handler)
+            except MiddlewareNotUsed:
+                continue
+            handler = adapted_handler
+
+            if hasattr(mw_instance, 'process_view'):
+                self._view_middleware.insert(0, self.adapt_method_mode(is_async, mw_instance.process_view))
+            if hasattr(mw_instance, 'process_template_response'):
+                self._template_response_middleware.append(
+                    self.adapt_method_mode(is_async, mw_instance.process_template_response)
+                )
+            if hasattr(mw_instance, 'process_exception'):
+                self._exception_middleware.append(self.adapt_method_mode(False, mw_instance.process_exception))
+
+            handler = convert_exception_to_response(mw_instance)
+            handler_is_async = middleware_is_async
+            if timings is not None:
+                handler = _timed(middleware_path, handler, handler_is_async, timings)
+
+        self._middleware_chain = self.adapt_method_mode(is_async, handler, handler_is_async)
+
+
+def uses_full_stack(path) -> bool:
+    if any(path.startswith(prefix) for prefix in getattr(settings, 'FULL_MIDDLEWARE_PATHS', ())):
+        return True
+    return not any(path.startswith(prefix) for prefix in getattr(settings, 'LIGHT_MIDDLEWARE_PATHS', ()))
+
+
+class PathMiddlewareDispatcher:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        # get_response : la suite de settings.MIDDLEWARE, c'est-a-dire la vue
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        self.full_stack = StackHandler(settings.FULL_ONLY_MIDDLEWARE, is_async=self.is_async)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if uses_full_stack(request.path_info):
+            return self.full_stack._middleware_chain(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if uses_full_stack(request.path_info):
+            return await self.full_stack._middleware_chain(request)
+        return await self.get_response(request)
+
+
+class ThresholdGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware for the responses nobody compressed beforehand: those
+    with a Content-Encoding already pass through (GZipMiddleware checks it),
+    and bodies under GZIP_MIN_LENGTH bytes are sent as is."""
+
+    def process_response(self, request, response):
+        if not response.streaming and len(response.content) < settings.GZIP_MIN_LENGTH:
+            return response
+        return super().process_response(request, response)
+
+
+def _is_staff(request) -> bool:
+    # Apres la vue : utilisateur pose par DRF (JWT) ou par AuthenticationMiddleware.
+    # Un utilisateur paresseux que la vue n'a pas lu n'est pas charge ici (pas
+    # de requete SQL en plus, ni d'appel synchrone sous ASGI)
+    user = getattr(request, 'user', None)
+    if user is None or (isinstance(user, SimpleLazyObject) and user._wrapped is empty):
+        return False
+    return bool(user.is_staff)
+
+
+class RequestStatsMiddleware:
+    """First in settings.MIDDLEWARE, so the total covers every layer."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        with collect() as stats:
+            response = self.get_response(request)
+        return self.report(request, response, stats)
+
+    async def __acall__(self, request):
+        with collect() as stats:
+            response = await self.get_response(request)
+        return self.report(request, response, stats)
+
+    def report(self, request, response, stats):
+        metrics.observe_request(request, response, stats)
+        if settings.SERVER_TIMING or _is_staff(request):
+            response['Server-Timing'] = stats.server_timing()
+        if request_logger.isEnabledFor(logging.INFO):
+            data = stats.as_dict()
+            request_logger.info(
+                '%s %s %s %s', request.method, request.path, response.status_code,
+                ' '.join(f'{key}={value}' for key, value in data.items()),
+                extra={'request_stats': data},
+            )
+        return response
+
+
+class ProfilingMiddleware:
+    """Right after RequestStatsMiddleware: the profile covers every other
+    layer, and its metadata includes the request's counters."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        self.route_sampler = profiling.RouteSampler(settings.PROFILE_SAMPLE)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def requested(request):
+        return request.headers.get(profiling.PROFILE_HEADER, '').lower() in ('1', 'true', 'yes')
+
+    def sampled_route(self, request):
+        return self.route_sampler.should_sample(request.path_info) if self.route_sampler else None
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        on_demand = self.requested(request) and profiling.is_staff_request(request)
+        route = None if on_demand else self.sampled_route(request)
+        if not (on_demand or route):
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        with profiling.StackSampler(settings.PROFILE_INTERVAL, {threading.get_ident()}) as sampler:
+            response = self.get_response(request)
+        return self.save(request, response, sampler, time.perf_counter() - start, route)
+
+    async def __acall__(self, request):
+        on_demand = self.requested(request) and await sync_to_async(profiling.is_staff_request)(request)
+        route = None if on_demand else self.sampled_route(request)
+        if not (on_demand or route):
+            return await self.get_response(request)
+
+        start = time.perf_counter()
+        # Boucle d'evenements et threads de sync_to_async : tous les threads
+        with profiling.StackSampler(settings.PROFILE_INTERVAL) as sampler:
+            response = await self.get_response(request)
+        return await sync_to_async(self.save)(request, response, sampler, time.perf_counter() - start, route)
+
+    def save(self, request, response, sampler, duration, route):
+        stats = current_stats()
+        meta = {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'route': route or metrics.view_label(request),
+            'sampled': bool(route),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'pid': os.getpid(),
+        }
+        if stats is not None:
+            meta.update({key: value for key, value in stats.as_dict().items() if key != 'duration_ms'})
+        profile_id = profiling.save_profile(sampler, meta, sampled=bool(route))
+        if not route:
+            response['X-Profile-Id'] = profile_id
+        return response
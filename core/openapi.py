@@ -0,0 +1,134 @@
+"""Precomputed OpenAPI schema.
+
+drf_yasg introspects every viewset and serializer each time it renders the
+spec. The spec only changes when the code does, so it is generated once by
+`python manage.py generate_openapi_schema` into static/openapi/ (committed,
+so schema changes show up in review) and served from there:
+
+- /swagger.json and /swagger.yaml return the file's bytes, with an ETag;
+- the Swagger UI and ReDoc load it from spec_url(), which carries the
+  content hash (?v=...): that URL changes with the schema and can be cached
+  for a year.
+
+If the artifact is missing (fresh checkout, command not run yet), the schema
+is generated on the first request and kept in memory for the process.
+
+The output does not depend on the local database: integer fields get their
+minimum/maximum from the backend (none on SQLite), so generation always
+uses the PostgreSQL ranges of production.
+"""
+import hashlib
+import logging
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection, models
+from django.db.backends.base.operations import BaseDatabaseOperations
+from django.http import HttpResponse, HttpResponseNotFound, HttpResponseNotModified
+from django.test import RequestFactory
+from django.urls import reverse
+from django.views.decorators.http import require_safe
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.generators import OpenAPISchemaGenerator
+from rest_framework.request import Request
+
+logger = logging.getLogger(__name__)
+
+API_INFO = openapi.Info(
+    title="EROLS EasyBuy API",
+    default_version='v1',
+    description="API pour la plateforme EROLS EasyBuy - Plateforme e-commerce camerounaise",
+    terms_of_service="https://www.erols.cm/terms/",
+    contact=openapi.Contact(email="contact@erols.cm"),
+    license=openapi.License(name="Proprietary"),
+)
+
+SCHEMA_DIR = settings.BASE_DIR / 'static' / 'openapi'
+# format d'URL (swagger<format>/) -> (fichier, type MIME)
+FORMATS = {
+    '.json': ('schema.json', 'application/json'),
+    '.yaml': ('schema.yaml', 'application/yaml'),
+}
+LONG_MAX_AGE = 60 * 60 * 24 * 365
+SHORT_MAX_AGE = 60 * 5
+
+
+@contextmanager
+def _postgresql_integer_ranges():
+    """Integer bounds of PostgreSQL (the base ranges, which it doesn't
+    override) for the model fields, whatever the current backend."""
+    fields = [
+        field for model in apps.get_models() for field in model._meta.fields
+        if isinstance(field, models.IntegerField)
+    ]
+
+    def forget_validators():
+        # IntegerField.validators est mis en cache par champ
+        for field in fields:
+            field.__dict__.pop('validators', None)
+
+    forget_validators()
+    connection.ops.integer_field_range = BaseDatabaseOperations.integer_field_ranges.__getitem__
+    try:
+        yield
+    finally:
+        del connection.ops.integer_field_range
+        forget_validators()
+
+
+def generate_schema():
+    """Returns {format: bytes}. Deterministic: an anonymous GET request as
+    the live views used to see, no host (url=''), the endpoints in URLconf
+    order, PostgreSQL integer bounds."""
+    request = Request(RequestFactory().get('/swagger.json'))
+    request.user = AnonymousUser()
+    generator = OpenAPISchemaGenerator(info=API_INFO, url='')
+    with _postgresql_integer_ranges():
+        schema = generator.get_schema(request=request, public=True)
+    return {
+        '.json': OpenAPICodecJson(validators=[], pretty=True).encode(schema),
+        '.yaml': OpenAPICodecYaml(validators=[]).encode(schema),
+    }
+
+
+@lru_cache(maxsize=None)
+def _load():
+    """{format: (bytes, content hash)}, read once per process."""
+    try:
+        contents = {fmt: (SCHEMA_DIR / filename).read_bytes() for fmt, (filename, _) in FORMATS.items()}
+    except FileNotFoundError:
+        logger.warning("Schema OpenAPI absent de %s : generation a la volee (lancer generate_openapi_schema)", SCHEMA_DIR)
+        contents = generate_schema()
+    return {fmt: (content, hashlib.sha256(content).hexdigest()[:16]) for fmt, content in contents.items()}
+
+
+def schema_version():
+    return _load()['.json'][1]
+
+
+def spec_url():
+    """URL versionnee du schema, pour SPEC_URL de la Swagger UI et de ReDoc."""
+    return f"{reverse('schema-json', kwargs={'format': '.json'})}?v={schema_version()}"
+
+
+@require_safe
+def schema_file_view(request, format):
+    if format not in FORMATS:
+        return HttpResponseNotFound()
+    content, digest = _load()[format]
+    etag = f'"{digest}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content, content_type=FORMATS[format][1])
+    response['ETag'] = etag
+    if request.GET.get('v') == digest:
+        # URL versionnee : le contenu ne changera jamais
+        response['Cache-Control'] = f'public, max-age={LONG_MAX_AGE}, immutable'
+    else:
+        response['Cache-Control'] = f'public, max-age={SHORT_MAX_AGE}'
+    return response
@@ -0,0 +1,21 @@
+from rest_framework.pagination import CursorPagination
+
+
+class OrderHistoryCursorPagination(CursorPagination):
+    """Pagination par curseur pour l'historique des commandes.
+
+    Contrairement a PageNumberPagination (OFFSET n), chaque page reprend
+    apres le dernier created_at vu (created_at < curseur, via l'index
+    order_user_created_idx) : le cout d'une page ne croit pas avec le nombre
+    de commandes du revendeur.
+
+    CursorPagination ne se positionne que sur ordering[0] : le curseur n'est
+    pas un couple (created_at, id). Les commandes de meme created_at sont
+    departagees par -id (ordre stable) et le curseur saute celles deja vues
+    avec un decalage ; le cout supplementaire se limite donc aux ex aequo,
+    rares a la microseconde pres.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
@@ -0,0 +1,247 @@
+"""Sampling profiler for single production requests.
+
+Two ways to profile a request (ProfilingMiddleware, core/middleware.py):
+
+- on demand: a staff user (JWT, is_staff) sends "X-Profile: 1". The
+  response carries "X-Profile-Id: <id>", and the profile is downloaded from
+  /api/profiles/<id>/ (staff only);
+- sampling: PROFILE_SAMPLE="product-list:100,*:1000" profiles 1 request in
+  N per URL name ("*": every other route), in each worker. These profiles
+  go to PROFILE_DIR/sampled/, which keeps the last PROFILE_SAMPLE_KEEP.
+
+Both directories are rotating buffers: PROFILE_DIR keeps the last
+PROFILE_KEEP on-demand profiles. The sampling decision is taken before the
+view runs (the profile has to cover it), so the URL name of each path is
+resolved once and kept in a bounded per-worker cache.
+
+A profiler thread reads the stack of the request's thread every
+PROFILE_INTERVAL seconds (sys._current_frames()), which costs nothing to
+the code being profiled. While a profile runs, the interpreter's switch
+interval is lowered to PROFILE_INTERVAL too, otherwise a CPU-bound request
+would keep the GIL for 5 ms between two samples. Under ASGI a request runs
+on the event loop and in sync_to_async threads, so every thread is sampled
+except the idle ones, and other concurrent requests of the same worker may
+appear.
+
+A profile is two files: <id>.folded, in the folded-stack format read
+directly by flamegraph.pl, speedscope and inferno (one line per stack,
+"thread;outer;...;inner <samples>"), and <id>.json with the request, its
+duration and its counters (core/instrumentation.py):
+
+    curl -H "Authorization: Bearer $TOKEN" -H "X-Profile: 1" -D - https://.../api/products/?search=tv
+    curl -H "Authorization: Bearer $TOKEN" https://.../api/profiles/<id>/ -o req.folded
+    flamegraph.pl req.folded > req.svg     # ou : glisser req.folded dans speedscope.app
+"""
+import functools
+import itertools
+import json
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.http import FileResponse, Http404
+from django.urls import Resolver404, resolve
+from rest_framework import exceptions
+from rest_framework.permissions import IsAdminUser
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_ID = re.compile(r'^(sampled/)?\d{8}T\d{6}-[0-9a-f]{8}$')
+
+# Chemins distincts dont la route est gardee (slugs, 404 : borne)
+ROUTE_CACHE_SIZE = 1024
+
+# Feuilles d'une pile de thread en attente (pool, boucle d'evenements)
+IDLE_LEAVES = {
+    ('threading.py', 'wait'),
+    ('selectors.py', 'select'),
+    ('thread.py', '_worker'),
+    ('queue.py', 'get'),
+    ('base_events.py', '_run_once'),
+}
+
+_prefixes = None
+
+_switch_lock = threading.Lock()
+_switch_users = 0
+_switch_saved = None
+
+
+def _short_path(filename):
+    global _prefixes
+    if _prefixes is None:
+        _prefixes = sorted(
+            {str(settings.BASE_DIR) + os.sep, *(p + os.sep for p in sys.path if p and p != '.')},
+            key=len, reverse=True,
+        )
+    for prefix in _prefixes:
+        if filename.startswith(prefix):
+            return filename[len(prefix):]
+    return filename
+
+
+def fold(frame):
+    """Folded stack of frame (outermost first), or None for an idle thread."""
+    code = frame.f_code
+    if (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES:
+        return None
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    def __init__(self, interval, thread_ids=None):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def __enter__(self):
+        global _switch_users, _switch_saved
+        with _switch_lock:
+            if not _switch_users:
+                _switch_saved = sys.getswitchinterval()
+                sys.setswitchinterval(min(_switch_saved, self.interval))
+            _switch_users += 1
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        global _switch_users
+        self._stop.set()
+        self._thread.join()
+        with _switch_lock:
+            _switch_users -= 1
+            if not _switch_users:
+                sys.setswitchinterval(_switch_saved)
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                    continue
+                stack = fold(frame)
+                if stack is None:
+                    continue
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                self.stacks[f'{names.get(thread_id, thread_id)};{stack}'] += 1
+
+
+def profile_dir() -> Path:
+    return Path(settings.PROFILE_DIR)
+
+
+def save_profile(sampler, meta, sampled=False) -> str:
+    directory = profile_dir() / 'sampled' if sampled else profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{secrets.token_hex(4)}"
+    folded = ''.join(f'{stack} {count}\n' for stack, count in sampler.stacks.most_common())
+    (directory / f'{profile_id}.folded').write_text(folded)
+    meta = {**meta, 'id': profile_id, 'samples': sampler.samples, 'interval_s': sampler.interval}
+    (directory / f'{profile_id}.json').write_text(json.dumps(meta, indent=2))
+    # Tampon tournant : les plus anciens partent (l'id commence par la date,
+    # a la seconde : jamais celui qui vient d'etre ecrit)
+    keep = settings.PROFILE_SAMPLE_KEEP if sampled else settings.PROFILE_KEEP
+    others = sorted(path for path in directory.glob('*.json') if path.stem != profile_id)
+    for old in others[:max(len(others) - keep + 1, 0)]:
+        old.unlink(missing_ok=True)
+        old.with_suffix('.folded').unlink(missing_ok=True)
+    return f'sampled/{profile_id}' if sampled else profile_id
+
+
+def is_staff_request(request) -> bool:
+    """JWT authentication as DRF does it, only for requests that ask to be
+    profiled (the middleware runs before the view)."""
+    authenticators = [auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    try:
+        user = Request(request, authenticators=authenticators).user
+    except exceptions.APIException:
+        return False
+    return bool(user and user.is_staff)
+
+
+def _parse_sample_rates(value):
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        name, _, every = item.rpartition(':')
+        rates[name] = int(every)
+    return rates
+
+
+class RouteSampler:
+    """1 request in N per URL name, counted in this worker."""
+
+    def __init__(self, value):
+        self.rates = _parse_sample_rates(value)
+        self.counters = {}
+        self.route = functools.lru_cache(maxsize=ROUTE_CACHE_SIZE)(self._resolve)
+
+    def __bool__(self):
+        return bool(self.rates)
+
+    @staticmethod
+    def _resolve(path):
+        try:
+            return resolve(path).view_name
+        except Resolver404:
+            return None
+
+    def should_sample(self, path):
+        route = self.route(path)
+        every = self.rates.get(route, self.rates.get('*'))
+        if not every:
+            return None
+        counter = self.counters.get(route)
+        if counter is None:
+            counter = self.counters.setdefault(route, itertools.count(1))
+        return route if next(counter) % every == 0 else None
+
+
+class ProfileListView(APIView):
+    """Derniers profils (a la demande et echantillonnes)."""
+
+    permission_classes = [IsAdminUser]
+    swagger_schema = None
+
+    def get(self, request):
+        paths = sorted(profile_dir().glob('*.json'), reverse=True)[:50]
+        sampled = sorted((profile_dir() / 'sampled').glob('*.json'), reverse=True)[:50]
+        return Response({
+            'on_demand': [json.loads(path.read_text()) for path in paths],
+            'sampled': [json.loads(path.read_text()) for path in sampled],
+        })
+
+
+class ProfileFileView(APIView):
+    """Fichier .folded d'un profil."""
+
+    permission_classes = [IsAdminUser]
+    swagger_schema = None
+
+    def get(self, request, profile_id):
+        if not PROFILE_ID.match(profile_id):
+            raise Http404
+        path = profile_dir() / f'{profile_id}.folded'
+        if not path.exists():
+            raise Http404
+        return FileResponse(path.open('rb'), content_type='text/plain; charset=utf-8',
+                            as_attachment=True, filename=f'{path.stem}.folded')
@@ -0,0 +1,33 @@
+"""Shared raw Redis client for features that need more than get/set
+(sorted sets, atomic counters, Lua scripts).
+
+Django's cache API only exposes key/value operations, so the few places that
+need native Redis structures use this client instead. It points at the same
+REDIS_URL as the cache. Keys are prefixed with CACHE_KEY_PREFIX so they live
+next to the cache keys without ever colliding with them.
+
+When REDIS_URL isn't set (DEBUG without Redis, see settings.py),
+get_redis() returns None and every caller falls back to a database or
+in-process path.
+"""
+from django.conf import settings
+
+_client = None
+
+
+def get_redis():
+    global _client
+    if _client is None and settings.REDIS_URL:
+        import redis
+
+        _client = redis.Redis.from_url(
+            settings.REDIS_URL,
+            socket_timeout=0.5,
+            socket_connect_timeout=0.5,
+            health_check_interval=30,
+        )
+    return _client
+
+
+def redis_key(*parts) -> str:
+    return ':'.join([settings.CACHE_KEY_PREFIX, *map(str, parts)])
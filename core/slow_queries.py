@@ -0,0 +1,201 @@
+"""Slow query log: SQL queries above SLOW_QUERY_MS, with their plan.
+
+An execute_wrapper on every connection (installed from CoreConfig.ready())
+times each query. Above the threshold, a "core.slow_queries" log line
+records:
+
+    sql         the normalized SQL (literals and placeholders -> ?, IN
+                lists -> IN (...)), which groups the same query whatever
+                its parameters
+    params      the actual parameters (repr, truncated)
+    duration_ms
+    caller      the first frame of the project's own code (view, serializer,
+                command) that ran the query
+    plan        the EXPLAIN output, for SELECT queries: EXPLAIN (ANALYZE,
+                BUFFERS) on PostgreSQL, EXPLAIN QUERY PLAN on SQLite
+
+EXPLAIN ANALYZE runs the query a second time. So a given normalized query
+is explained at most once per SLOW_QUERY_EXPLAIN_INTERVAL seconds in each
+worker (the next occurrences are logged without a plan), and
+SLOW_QUERY_ANALYZE=False falls back to a plain EXPLAIN. The EXPLAIN itself
+runs in a savepoint inside a transaction, is not counted in the request's counters
+(core/instrumentation.py) and is never logged as slow.
+
+explain() and plan_issues() also serve the index_advisor command
+(apps/products), which replays the catalog filters.
+"""
+import logging
+import os
+import re
+import sys
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.backends.signals import connection_created
+
+from . import instrumentation
+
+logger = logging.getLogger(__name__)
+
+PARAM_MAX_LENGTH = 200
+EXPLAINED_MAX = 1000
+
+IN_LIST = re.compile(r'\bIN \((?:\s*(?:%s|\?)\s*,)*\s*(?:%s|\?)\s*\)', re.IGNORECASE)
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'(?<![\w."])-?\d+(?:\.\d+)?\b')
+PLACEHOLDER = re.compile(r'%s')
+SPACES = re.compile(r'\s+')
+SELECT = re.compile(r'^\s*(?:SELECT|WITH)\b', re.IGNORECASE)
+
+# Lignes de plan qui signalent un parcours complet ou un tri sans index
+SEQ_SCAN = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'^SCAN (\w+)\b(?! USING)'),
+}
+SORT = {
+    'postgresql': re.compile(r'(?:Incremental )?Sort(?:  \(| Key:)'),
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR (?:ORDER BY|RIGHT PART OF ORDER BY)'),
+}
+
+_threshold = 0.0
+_explained = {}
+# Pas de mesure pendant notre propre EXPLAIN
+_explaining = ContextVar('slow_query_explaining', default=False)
+
+
+def normalize(sql):
+    sql = IN_LIST.sub('IN (...)', sql)
+    sql = STRING_LITERAL.sub('?', sql)
+    sql = NUMBER_LITERAL.sub('?', sql)
+    sql = PLACEHOLDER.sub('?', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+def _param(value):
+    text = repr(value)
+    return text if len(text) <= PARAM_MAX_LENGTH else text[:PARAM_MAX_LENGTH] + '...'
+
+
+def _caller():
+    """file:line (function) of the first project frame outside core/."""
+    base = str(settings.BASE_DIR) + os.sep
+    core_dir = os.path.dirname(__file__) + os.sep
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        relative = filename[len(base):] if filename.startswith(base) else ''
+        # Code des applications, pas manage.py ni les dependances installees
+        if os.sep in relative and not filename.startswith(core_dir) and 'site-packages' not in relative:
+            return f'{relative}:{frame.f_lineno} ({frame.f_code.co_name})'
+        frame = frame.f_back
+    return None
+
+
+def _sqlite_plan(rows):
+    # (id, parent, notused, detail) : indentation selon la profondeur
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node_id] + detail)
+    return lines
+
+
+def explain(connection, sql, params, analyze=True):
+    """Plan of a query, one string per line."""
+    vendor = connection.vendor
+    if vendor == 'postgresql':
+        prefix = 'EXPLAIN (ANALYZE, BUFFERS) ' if analyze else 'EXPLAIN '
+    elif vendor == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    else:
+        prefix = 'EXPLAIN '
+    # Dans une transaction, un savepoint : un EXPLAIN en erreur ne doit pas
+    # l'annuler (PostgreSQL)
+    savepoint = transaction.atomic(using=connection.alias) if connection.in_atomic_block else nullcontext()
+    token = _explaining.set(True)
+    try:
+        with instrumentation.paused(), savepoint, connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            rows = cursor.fetchall()
+    finally:
+        _explaining.reset(token)
+    if vendor == 'sqlite':
+        return _sqlite_plan(rows)
+    return [' | '.join(str(column) for column in row) for row in rows]
+
+
+def plan_issues(plan, vendor):
+    """(tables read by a full scan, sort without an index) of a plan."""
+    seq_scan, sort = SEQ_SCAN.get(vendor), SORT.get(vendor)
+    tables, sorted_in_memory = [], False
+    for line in plan:
+        line = line.strip().lstrip('-> ').strip()
+        match = seq_scan.search(line) if seq_scan else None
+        if match and match.group(1) not in tables:
+            tables.append(match.group(1))
+        if sort and sort.search(line):
+            sorted_in_memory = True
+    return tables, sorted_in_memory
+
+
+def _should_explain(fingerprint):
+    now = time.monotonic()
+    last = _explained.get(fingerprint)
+    if last is not None and now - last < settings.SLOW_QUERY_EXPLAIN_INTERVAL:
+        return False
+    if len(_explained) >= EXPLAINED_MAX:
+        _explained.clear()
+    _explained[fingerprint] = now
+    return True
+
+
+def _report(connection, sql, params, many, duration):
+    fingerprint = normalize(sql)
+    data = {
+        'sql': fingerprint,
+        'params': [_param(value) for value in params] if params and not many else [],
+        'duration_ms': round(duration * 1000, 2),
+        'caller': _caller(),
+        'vendor': connection.vendor,
+        'plan': None,
+    }
+    if not many and SELECT.match(sql) and _should_explain(fingerprint):
+        try:
+            data['plan'] = explain(connection, sql, params, analyze=settings.SLOW_QUERY_ANALYZE)
+        except DatabaseError as exc:
+            data['plan'] = [f'EXPLAIN impossible : {exc}']
+    message = f"Requete lente {data['duration_ms']} ms ({data['caller'] or '?'}) : {fingerprint}"
+    if data['plan']:
+        message += '\n    ' + '\n    '.join(data['plan'])
+    logger.warning(message, extra={'slow_query': data})
+
+
+def _slow_query_wrapper(execute, sql, params, many, context):
+    if _explaining.get():
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration = time.perf_counter() - start
+    if duration >= _threshold:
+        try:
+            _report(context['connection'], sql, params, many, duration)
+        except Exception:
+            logger.exception('Journal des requetes lentes')
+    return result
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    if _slow_query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_slow_query_wrapper)
+
+
+def install():
+    global _threshold
+    if not settings.SLOW_QUERY_MS:
+        return
+    _threshold = settings.SLOW_QUERY_MS / 1000
+    connection_created.connect(_on_connection_created, dispatch_uid='core.slow_queries')
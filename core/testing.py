@@ -0,0 +1,52 @@
+"""Query budgets for tests.
+
+An endpoint's budget is the number of SQL queries (and, optionally, cache
+and storage calls) a request to it may make. Going over it fails the test
+with the SQL that was run, so an N+1 shows up in review instead of in
+production:
+
+    class ProductBudgetTests(QueryBudgetMixin, TestCase):
+        def test_homepage(self):
+            self.assertBudget('/api/products/homepage/', db=6, storage=0)
+            # Deuxieme appel : servi par le cache
+            self.assertBudget('/api/products/homepage/', db=0, cache=1)
+
+        def test_initiate_cart(self):
+            with query_budget(db=12):
+                self.client.post(url, data, content_type='application/json')
+
+The counts come from core/instrumentation.py, like the Server-Timing header.
+"""
+from contextlib import contextmanager
+
+from .instrumentation import collect
+
+
+def _over_budget(stats, budgets):
+    return [
+        f'{kind}: {stats.count[kind]} > {limit}'
+        for kind, limit in budgets.items()
+        if limit is not None and stats.count[kind] > limit
+    ]
+
+
+@contextmanager
+def query_budget(db=None, cache=None, storage=None):
+    """Fails with AssertionError if the block makes more calls than allowed
+    (None: not checked)."""
+    with collect(record_sql=True) as stats:
+        yield stats
+    problems = _over_budget(stats, {'db': db, 'cache': cache, 'storage': storage})
+    if problems:
+        queries = '\n'.join(f'  {i}. {sql}' for i, sql in enumerate(stats.sql, 1))
+        raise AssertionError(f"Budget depasse ({', '.join(problems)}) :\n{queries}")
+
+
+class QueryBudgetMixin:
+    """For django.test.TestCase (uses self.client)."""
+
+    def assertBudget(self, path, method='get', db=None, cache=None, storage=None, status=200, **kwargs):
+        with query_budget(db=db, cache=cache, storage=storage):
+            response = getattr(self.client, method)(path, **kwargs)
+        self.assertEqual(response.status_code, status, getattr(response, 'content', b'')[:500])
+        return response
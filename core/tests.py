@@ -0,0 +1,151 @@
+import json
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import fakeredis
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from . import openapi, profiling, throttling
+from .utils import looks_like_phone, normalize_email, normalize_phone
+
+
+class NormalizeIdentifiersTests(SimpleTestCase):
+    """Formes canoniques des identifiants de connexion (email_normalized,
+    phone_e164)."""
+
+    def test_normalize_email(self):
+        self.assertEqual(normalize_email('  John.Doe@Example.COM '), 'john.doe@example.com')
+        self.assertIsNone(normalize_email(''))
+        self.assertIsNone(normalize_email('   '))
+        self.assertIsNone(normalize_email(None))
+
+    def test_normalize_phone_formats_of_the_same_number(self):
+        for value in ('+237 690 00 00 00', '237690000000', '00237690000000', '690000000', '690-00.00/00', '(690) 000000'):
+            with self.subTest(value=value):
+                self.assertEqual(normalize_phone(value), '+237690000000')
+
+    def test_normalize_phone_other_country(self):
+        self.assertEqual(normalize_phone('+33 6 12 34 56 78'), '+33612345678')
+        self.assertEqual(normalize_phone('0033612345678'), '+33612345678')
+
+    def test_normalize_phone_rejects_non_numbers(self):
+        for value in ('', None, 'john_doe', '690abc000', '+', '1234567', '+1234567890123456'):
+            with self.subTest(value=value):
+                self.assertIsNone(normalize_phone(value))
+
+    def test_looks_like_phone(self):
+        for value in ('+237690000000', '690 00 00 00', ' 690000000 ', '(690) 00-00-00'):
+            with self.subTest(value=value):
+                self.assertTrue(looks_like_phone(value))
+        for value in ('', None, 'john_doe', 'john@example.com', '1234567', '690000000a'):
+            with self.subTest(value=value):
+                self.assertFalse(looks_like_phone(value))
+
+
+class ThreePerMinute(throttling.AnonRateThrottle):
+    rate = '3/min'
+
+
+class SlidingWindowThrottleTests(SimpleTestCase):
+    """Fenetre glissante Lua (fakeredis) et repli sur le cache sans Redis."""
+
+    def setUp(self):
+        cache.clear()
+        self.server = fakeredis.FakeServer()
+        redis = mock.patch.object(throttling, 'get_redis', return_value=fakeredis.FakeRedis(server=self.server))
+        self.get_redis = redis.start()
+        self.addCleanup(redis.stop)
+        clock = mock.patch.object(throttling, 'time')
+        self.clock = clock.start()
+        self.addCleanup(clock.stop)
+        self.request = RequestFactory().get('/api/products/', REMOTE_ADDR='10.0.0.1')
+        self.request.user = AnonymousUser()
+
+    def hit(self, at):
+        """(requete acceptee, wait()) a l'instant at (secondes)."""
+        self.clock.time.return_value = at
+        throttle = ThreePerMinute()
+        return throttle.allow_request(self.request, None), throttle.wait()
+
+    def test_limit_within_a_window(self):
+        for at in (600, 601, 602):
+            self.assertEqual(self.hit(at), (True, None))
+        allowed, wait = self.hit(610)
+        self.assertFalse(allowed)
+        # Fenetre precedente vide : attendre la fin de la fenetre courante
+        self.assertAlmostEqual(wait, 50, places=2)
+
+    def test_previous_window_is_weighted(self):
+        for at in (630, 640, 650):
+            self.assertEqual(self.hit(at)[0], True)
+        # Fenetre suivante, a mi-parcours : 3 * 0.5 + courant
+        self.assertEqual(self.hit(690)[0], True)   # 1.5
+        self.assertEqual(self.hit(690)[0], True)   # 2.5
+        allowed, wait = self.hit(690)              # 3.5
+        self.assertFalse(allowed)
+        # 3 * (60 - e) / 60 + 2 < 3 des que e > 40, soit 10 s plus tard
+        self.assertAlmostEqual(wait, 10, places=2)
+        self.assertFalse(self.hit(690 + wait - 0.5)[0])
+        self.assertTrue(self.hit(690 + wait + 0.01)[0])
+
+    def test_fallback_without_redis(self):
+        self.get_redis.return_value = None
+        with mock.patch.object(ThreePerMinute, 'timer', return_value=600):
+            for _ in range(3):
+                self.assertTrue(self.hit(600)[0])
+            allowed, wait = self.hit(600)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 60)
+
+    def test_fallback_when_redis_fails(self):
+        self.server.connected = False
+        with mock.patch.object(ThreePerMinute, 'timer', return_value=600), \
+                self.assertLogs('core.throttling', 'WARNING'):
+            results = [self.hit(600)[0] for _ in range(4)]
+        self.assertEqual(results, [True, True, True, False])
+        # Historique DRF dans le cache
+        self.assertEqual(len(cache.get(ThreePerMinute().get_cache_key(self.request, None))), 3)
+
+
+class ProfilingTests(SimpleTestCase):
+    """Profils tournants et choix de la route echantillonnee."""
+
+    def test_on_demand_profiles_rotate(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(PROFILE_DIR=directory, PROFILE_KEEP=3, PROFILE_SAMPLE_KEEP=2):
+            for sampled in (False, True):
+                ids = [profiling.save_profile(profiling.StackSampler(0.001), {}, sampled=sampled) for _ in range(5)]
+                folder = Path(directory) / 'sampled' if sampled else Path(directory)
+                with self.subTest(sampled=sampled):
+                    self.assertEqual(len(list(folder.glob('*.json'))), 2 if sampled else 3)
+                    self.assertEqual(len(list(folder.glob('*.folded'))), 2 if sampled else 3)
+                    self.assertTrue((Path(directory) / f'{ids[-1]}.folded').exists())
+
+    def test_route_resolved_once_per_path(self):
+        sampler = profiling.RouteSampler('product-list:2,*:1000')
+        with mock.patch.object(profiling, 'resolve', wraps=profiling.resolve) as resolve:
+            picked = [sampler.should_sample('/api/products/') for _ in range(4)]
+            sampler.should_sample('/introuvable/')
+            sampler.should_sample('/introuvable/')
+        self.assertEqual(picked, [None, 'product-list', None, 'product-list'])
+        self.assertEqual([call.args[0] for call in resolve.call_args_list], ['/api/products/', '/introuvable/'])
+
+
+class OpenAPISchemaTests(SimpleTestCase):
+    """Schema identique quel que soit le moteur de base (SQLite ici)."""
+
+    def test_integer_bounds_of_postgresql(self):
+        from apps.orders.models import City
+
+        field = City._meta.get_field('display_order')
+        before = field.validators
+        schema = json.loads(openapi.generate_schema()['.json'])
+        self.assertEqual(
+            {name: schema['definitions']['City']['properties']['display_order'][name] for name in ('minimum', 'maximum')},
+            {'minimum': -2147483648, 'maximum': 2147483647},
+        )
+        # Validateurs du moteur courant rendus au modele
+        self.assertEqual(field.validators, before)
@@ -0,0 +1,107 @@
+"""Rate limiting with one atomic Redis call per request.
+
+DRF's SimpleRateThrottle keeps every request timestamp of a client in a
+cached list: a GET, a trim in Python and a SET, i.e. up to 1000 pickled
+floats per client at 1000/hour, and two workers can both read the list
+before either writes it back.
+
+Here each client has two integer counters, one for the current fixed window
+and one for the previous. The sliding-window estimate is
+
+    previous * (share of the previous window still inside the sliding window)
+    + current
+
+and the Lua script reads it and increments it in a single round trip. That
+is O(1) memory per client, and there are no races between workers. Rates
+still come from DEFAULT_THROTTLE_RATES.
+
+Without Redis (DEBUG, see core/redis.py), or if Redis fails, the throttle
+falls back to DRF's cache-based implementation.
+"""
+import logging
+import time
+
+from rest_framework import throttling
+
+from .redis import get_redis, redis_key
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1] = fenetre courante, KEYS[2] = fenetre precedente
+# ARGV = limite, duree (s), secondes ecoulees dans la fenetre courante
+# Retourne 0 si la requete passe, sinon le temps d'attente en millisecondes.
+SLIDING_WINDOW_LUA = """
+local limit = tonumber(ARGV[1])
+local duration = tonumber(ARGV[2])
+local elapsed = tonumber(ARGV[3])
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+local estimate = previous * (duration - elapsed) / duration + current
+if estimate >= limit then
+    local wait = duration - elapsed
+    if current < limit and previous > 0 then
+        wait = wait - (limit - current) * duration / previous
+    end
+    return math.max(math.ceil(wait * 1000), 1)
+end
+redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], duration * 2)
+return 0
+"""
+
+_scripts = {}
+
+
+def _script(client):
+    script = _scripts.get(id(client))
+    if script is None:
+        script = _scripts[id(client)] = client.register_script(SLIDING_WINDOW_LUA)
+    return script
+
+
+class RedisSlidingWindowMixin:
+    """Replaces SimpleRateThrottle's history list by a Redis sliding-window
+    counter. Works with any SimpleRateThrottle subclass (same scopes, rates
+    and cache keys)."""
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        client = get_redis()
+        if client is None:
+            return super().allow_request(request, view)
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        now = time.time()
+        window = int(now // self.duration)
+        elapsed = now - window * self.duration
+        try:
+            wait_ms = _script(client)(
+                keys=[
+                    redis_key(self.key, window),
+                    redis_key(self.key, window - 1),
+                ],
+                args=[self.num_requests, self.duration, elapsed],
+            )
+        except Exception:
+            logger.warning("Redis indisponible pour le throttling, repli sur le cache", exc_info=True)
+            return super().allow_request(request, view)
+
+        self._wait = wait_ms / 1000 if wait_ms else None
+        return not wait_ms
+
+    def wait(self):
+        if get_redis() is None or not hasattr(self, '_wait'):
+            return super().wait()
+        return self._wait
+
+
+class AnonRateThrottle(RedisSlidingWindowMixin, throttling.AnonRateThrottle):
+    pass
+
+
+class UserRateThrottle(RedisSlidingWindowMixin, throttling.UserRateThrottle):
+    pass
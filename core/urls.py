@@ -0,0 +1,25 @@
+"""URLconf helpers.
+
+lazy_include() is path(route, include(module)) without the import: the
+module is only imported when a URL under route is resolved, or on the first
+reverse() (which needs every name). Modules that are heavy to import and
+rarely hit - the API docs (drf_yasg, jsonschema, yaml) and social login
+(allauth's Google provider, dj_rest_auth) - are thus never imported by a
+worker that doesn't serve them. See `manage.py import_profile`.
+"""
+import re
+
+from django.urls import URLResolver
+from django.urls.resolvers import RegexPattern, RoutePattern
+
+
+def lazy_include(route, urlconf_module):
+    return URLResolver(RoutePattern(route, is_endpoint=False), urlconf_module)
+
+
+def lazy_include_prefixes(prefixes, urlconf_module):
+    """Same, for a module whose routes share no path segment (swagger/,
+    redoc/): the lookahead selects them without consuming the path, so the
+    module's own routes stay complete."""
+    pattern = RegexPattern('^(?=%s)' % '|'.join(re.escape(prefix) for prefix in prefixes))
+    return URLResolver(pattern, urlconf_module)
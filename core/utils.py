@@ -0,0 +1,42 @@
+import re
+
+DEFAULT_COUNTRY_CODE = '237'  # Cameroun
+LOCAL_NUMBER_LENGTH = 9       # 6XXXXXXXX / 2XXXXXXXX
+
+_PHONE_SEPARATORS = re.compile(r'[\s().\-/]')
+_PHONE_SHAPE = re.compile(r'^\+?[\d\s().\-/]{8,}$')
+
+
+def normalize_email(value):
+    """Forme canonique d'un email pour la recherche/unicite (minuscules)."""
+    value = (value or '').strip().lower()
+    return value or None
+
+
+def normalize_phone(value):
+    """Numero au format E.164 (+237XXXXXXXXX), pour que "+237 690 00 00 00",
+    "237690000000", "00237690000000" et "690000000" designent le meme compte.
+    Retourne None si la valeur ne ressemble pas a un numero."""
+    value = _PHONE_SEPARATORS.sub('', value or '')
+    if value.startswith('00'):
+        value = '+' + value[2:]
+    digits = value.lstrip('+')
+    if not digits.isdigit():
+        return None
+    if not value.startswith('+') and len(digits) == LOCAL_NUMBER_LENGTH:
+        digits = DEFAULT_COUNTRY_CODE + digits
+    if not 8 <= len(digits) <= 15:
+        return None
+    return '+' + digits
+
+
+def looks_like_phone(value) -> bool:
+    return bool(_PHONE_SHAPE.match((value or '').strip()))
+
+
+def csrf_exempt_async(view_func):
+    """csrf_exempt pour une vue async : sous Django 4.2, le decorateur
+    standard enveloppe la vue dans une fonction sync, ce qui la ferait
+    executer comme une vue synchrone. On pose simplement l'attribut."""
+    view_func.csrf_exempt = True
+    return view_func
@@ -3,16 +3,20 @@
 # Script de démarrage pour Render
 set -e
 
-echo "🔄 Running database migrations..."
-python manage.py migrate --noinput
+# Migrations : une fois par deploiement suffit ; RUN_MIGRATIONS=0 pour les
+# redemarrages et les instances ajoutees par l'autoscaling
+if [ "${RUN_MIGRATIONS:-1}" = "1" ]; then
+    echo "🔄 Running database migrations..."
+    python manage.py migrate --noinput
+fi
 
-echo "📦 Collecting static files..."
-python manage.py collectstatic --noinput
+# Statiques et schema OpenAPI : generes au build de l'image (Dockerfile).
+# COLLECTSTATIC_ON_START=1 quand staticfiles/ est un volume (docker-compose.prod.yml)
+if [ "${COLLECTSTATIC_ON_START:-0}" = "1" ]; then
+    echo "📦 Collecting static files..."
+    python manage.py collectstatic --noinput
+fi
 
 echo "🚀 Starting Gunicorn..."
-exec gunicorn config.wsgi:application \
-    --bind 0.0.0.0:$PORT \
-    --workers 2 \
-    --timeout 120 \
-    --access-logfile - \
-    --error-logfile -
\ No newline at end of file
+# Réglages dans config/gunicorn.conf.py (PORT, WEB_CONCURRENCY, mode ASGI optionnel)
+exec gunicorn "${GUNICORN_APP:-config.wsgi:application}" -c config/gunicorn.conf.py
\ No newline at end of file